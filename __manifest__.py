@@ -2,16 +2,31 @@
 {
     "name": "Contract Management",
     "summary": "Manage sales contracts, appendices, and quotations for hospital equipment",
-    "version": "18.0.1.0.0",
+    "version": "18.0.1.1.0",
     "category": "Sales",
     "depends": ["base", "sale", "product", "crm"],
     "data": [
         "security/ir.model.access.csv",
         "data/sequence.xml",
+        "data/ir_cron.xml",
+        "data/mail_activity_type.xml",
         "views/contract_views.xml",
         "views/contract_appendix_views.xml",
         "views/quotation_views.xml",
+        "views/contract_import_views.xml",
+        "report/contract_report_views.xml",
+        "report/contract_document_templates.xml",
+        "views/contract_export_views.xml",
+        "views/contract_kpi_views.xml",
+        "views/contract_effective_line_views.xml",
+        "views/contract_compute_profile_views.xml",
+        "views/contract_job_views.xml",
     ],
+    "assets": {
+        "web.assets_backend": [
+            "contract_mgmt/static/src/fields/*",
+        ],
+    },
     "application": True,
     "installable": True,
     "license": "LGPL-3",
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+from . import main
+from . import metrics
+from . import export
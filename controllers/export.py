@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from odoo import api, http
+from odoo.http import content_disposition, request
+
+CONTENT_TYPES = {
+    'csv': 'text/csv;charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+class ContractExportController(http.Controller):
+
+    @http.route('/contract_mgmt/export/<int:wizard_id>', type='http', auth='user', methods=['GET'])
+    def export_contract_lines(self, wizard_id, **kwargs):
+        """Stream the finance export configured by a ``contract.export.wizard``"""
+        wizard = request.env['contract.export.wizard'].browse(wizard_id).exists()
+        if not wizard:
+            raise request.not_found()
+        wizard.check_access('read')
+
+        # The body is produced after the request cursor is closed: read the
+        # rows from a cursor of our own, as the same user and context
+        registry, uid, context = request.env.registry, request.env.uid, dict(request.env.context)
+
+        def generate():
+            with registry.cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                yield from env['contract.export.wizard'].browse(wizard_id)._stream_export()
+
+        return request.make_response(generate(), headers=[
+            ('Content-Type', CONTENT_TYPES[wizard.file_format]),
+            ('Content-Disposition', content_disposition(wizard._export_filename())),
+        ])
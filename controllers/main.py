@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import _, http
+from odoo.exceptions import AccessError, UserError
+from odoo.http import request
+
+from ..models.contract_document import DOCUMENT_MODELS
+
+_logger = logging.getLogger(__name__)
+
+
+class ContractDocumentController(http.Controller):
+
+    @http.route('/contract_mgmt/upload_attachment', type='http', auth='user', methods=['POST'])
+    def upload_attachment(self, model, id, ufile, **kwargs):
+        """Streaming, deduplicating counterpart of ``/web/binary/upload_attachment``
+        used by the document fields of contracts and appendices
+        """
+        if model not in DOCUMENT_MODELS:
+            raise request.not_found()
+        res_id = int(id or 0)
+        Model = request.env[model]
+        if res_id:
+            Model.browse(res_id).check_access('write')
+        else:
+            Model.check_access('create')
+
+        result = []
+        for ufile in request.httprequest.files.getlist('ufile'):
+            try:
+                attachment = Model._store_document(
+                    ufile.filename, ufile.stream, ufile.content_type, res_id,
+                )
+            except (AccessError, UserError) as e:
+                result.append({'error': str(e)})
+                continue
+            except Exception:
+                _logger.exception("Failed to upload contract document %s", ufile.filename)
+                result.append({'error': _("Something horrible happened")})
+                continue
+            result.append({
+                'filename': ufile.filename,
+                'mimetype': attachment.mimetype,
+                'id': attachment.id,
+                'size': attachment.file_size,
+            })
+        return request.make_json_response(result)
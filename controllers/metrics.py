@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+import hmac
+
+from odoo import http
+from odoo.http import request
+from odoo.tools import config
+
+from ..tools.metrics import collect, render
+
+
+class ContractMetricsController(http.Controller):
+
+    @http.route('/contract_mgmt/metrics', type='http', auth='none', methods=['GET'], save_session=False)
+    def metrics(self, token=None, **kwargs):
+        """Prometheus scrape endpoint, protected by ``contract_metrics_token``
+        from odoo.conf (bearer header or ``token`` parameter)
+        """
+        expected = config.get('contract_metrics_token')
+        if not expected:
+            raise request.not_found()
+        header = request.httprequest.headers.get('Authorization', '')
+        given = header[7:] if header.startswith('Bearer ') else token or ''
+        if not hmac.compare_digest(given.encode(), expected.encode()):
+            return request.make_response('Forbidden', status=403)
+        return request.make_response(
+            render(collect(config.get('contract_metrics_dir'))),
+            headers=[('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')],
+        )
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+from odoo import SUPERUSER_ID, api
+
+
+def migrate(cr, version):
+    """Start the per-contract appendix counters after the numbers already used
+    and recompute the appendix totals, which now count adjustments as a
+    difference
+    """
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    # archived (liquidated) contracts get their counter too
+    contracts = env['contract.contract'].with_context(active_test=False).search([])
+    contracts._sync_next_appendix_seq()
+    # values assigned by a compute do not trigger their dependents
+    for fname in ('amount_appendix_total', 'amount_effective'):
+        env.add_to_compute(contracts._fields[fname], contracts)
+    env.flush_all()
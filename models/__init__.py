@@ -1,7 +1,17 @@
 # -*- coding: utf-8 -*-
+from . import contract_document
+from . import contract_printable
 from . import contract
 from . import contract_line
 from . import contract_appendix
 from . import contract_appendix_line
+from . import contract_effective_line
+from . import contract_compute_profile
+from . import contract_partner_refresh
+from . import contract_job
+from . import contract_export
+from . import contract_kpi
+from . import res_partner
 from . import quotation
 
+from . import contract_import
@@ -1,14 +1,45 @@
 # -*- coding: utf-8 -*-
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from markupsafe import Markup
+
 from odoo import api, fields, models, _
 from odoo.exceptions import ValidationError
-from datetime import datetime
+from odoo.tools import SQL, split_every
+from odoo.tools.sql import create_index, drop_index
+
+from ..tools import CompanyRates, instrumented, profiled
 
 
 class Contract(models.Model):
     _name = "contract.contract"
     _description = "Sales Contract"
     _order = "contract_date desc, id desc"
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = [
+        'mail.thread', 'mail.activity.mixin', 'contract.document.mixin', 'contract.printable.mixin',
+    ]
+    _document_fields = (
+        'attachment_ids', 'handover_attachment_ids', 'acceptance_attachment_ids',
+        'liquidation_attachment_ids',
+    )
+    _document_report = 'contract_mgmt.action_report_contract'
+    _document_number_field = 'contract_number'
+    _document_depends = (
+        'contract_number', 'name', 'contract_date', 'start_date', 'end_date', 'effective_end_date',
+        'service_category', 'tender_code', 'bid_notice_no', 'company_id', 'company_id.name',
+        'company_signatory_id', 'company_signatory_id.name', 'partner_company_id',
+        'partner_company_id.name', 'partner_department_id', 'partner_department_id.name',
+        'department_representative', 'investor_id', 'investor_id.name', 'investor_representative',
+        'investor_position', 'currency_id', 'warranty_months', 'amount_effective',
+        'contract_line_ids', 'contract_line_ids.sequence', 'contract_line_ids.product_id',
+        'contract_line_ids.product_id.default_code', 'contract_line_ids.name', 'contract_line_ids.uom_id',
+        'contract_line_ids.uom_id.name', 'contract_line_ids.quantity', 'contract_line_ids.price_unit',
+        'appendix_ids', 'appendix_ids.state', 'appendix_ids.appendix_number', 'appendix_ids.name',
+        'appendix_ids.appendix_type', 'appendix_ids.effective_date', 'appendix_ids.amount_appendix',
+        'appendix_ids.affects_contract_total',
+    )
 
     # Thông tin chung
     contract_number = fields.Char(
@@ -17,7 +48,8 @@ class Contract(models.Model):
         copy=False,
         readonly=True,
         default=lambda self: _('New'),
-        tracking=True
+        tracking=True,
+        index=True
     )
     name = fields.Char(
         string="Tên hợp đồng",
@@ -37,7 +69,8 @@ class Contract(models.Model):
     end_date = fields.Date(
         string="Ngày kết thúc",
         required=True,
-        tracking=True
+        tracking=True,
+        index=True
     )
     service_category = fields.Selection(
         [
@@ -52,8 +85,14 @@ class Contract(models.Model):
     )
 
     # Hồ sơ thầu
-    tender_code = fields.Char(string="Mã thầu")
-    bid_notice_no = fields.Char(string="Số TBMT")
+    tender_code = fields.Char(string="Mã thầu", index='btree_not_null')
+    bid_notice_no = fields.Char(string="Số TBMT", index='btree_not_null')
+    search_text = fields.Char(
+        string="Tìm kiếm",
+        compute='_compute_search_text',
+        store=True,
+        index='trigram'
+    )
 
     # Pháp nhân (bên bán)
     company_id = fields.Many2one(
@@ -89,7 +128,8 @@ class Contract(models.Model):
         'res.partner',
         string="Khoa / Phòng",
         domain="[('parent_id', '=', partner_company_id)]",
-        tracking=True
+        tracking=True,
+        index='btree_not_null'
     )
     department_representative = fields.Char(
         string="Người đại diện khoa",
@@ -138,6 +178,30 @@ class Contract(models.Model):
         currency_field='currency_id',
         tracking=True
     )
+    company_currency_id = fields.Many2one(
+        related='company_id.currency_id',
+        string="Tiền tệ công ty"
+    )
+    amount_total_company = fields.Monetary(
+        string="Tổng giá trị HĐ (tiền tệ công ty)",
+        compute='_compute_amount_total_company',
+        store=True,
+        currency_field='company_currency_id',
+        help="Tổng giá trị hợp đồng quy đổi theo tỷ giá ngày ký."
+    )
+    amount_appendix_total = fields.Monetary(
+        string="Giá trị phụ lục hiệu lực",
+        compute='_compute_amount_appendix_total',
+        store=True,
+        currency_field='currency_id'
+    )
+    amount_effective = fields.Monetary(
+        string="Giá trị hợp đồng hiệu lực",
+        compute='_compute_amount_effective',
+        store=True,
+        currency_field='currency_id',
+        tracking=True
+    )
     duration_days = fields.Integer(
         string="Thời hạn (ngày)",
         compute='_compute_duration_days',
@@ -147,19 +211,26 @@ class Contract(models.Model):
         string="Gia hạn hợp đồng (ngày)",
         default=0
     )
+    effective_end_date = fields.Date(
+        string="Ngày kết thúc (gồm gia hạn)",
+        compute='_compute_effective_end_date',
+        store=True
+    )
 
     # Tab Sản phẩm
     contract_line_ids = fields.One2many(
         'contract.line',
         'contract_id',
-        string="Chi tiết sản phẩm"
+        string="Chi tiết sản phẩm",
+        context={'active_test': False}
     )
 
     # Tab Đơn bán & liên kết
     sale_order_id = fields.Many2one(
         'sale.order',
         string="Mã đơn bán (SO)",
-        tracking=True
+        tracking=True,
+        index='btree_not_null'
     )
     sale_order_ids = fields.Many2many(
         'sale.order',
@@ -295,31 +366,130 @@ class Contract(models.Model):
         string="Trạng thái hợp đồng",
         default='draft',
         required=True,
-        tracking=True
+        tracking=True,
+        index=True
+    )
+    active = fields.Boolean(
+        string="Đang dùng",
+        default=True,
+        tracking=True,
+        help="Hợp đồng đã thanh lý được lưu trữ để danh sách và tìm kiếm chỉ xét hợp đồng đang dùng."
+    )
+    appendix_ids = fields.One2many(
+        'contract.appendix',
+        'contract_id',
+        string="Phụ lục"
     )
     appendix_count = fields.Integer(
         string="Số lượng phụ lục",
         compute='_compute_appendix_count',
         store=True
     )
+    next_appendix_seq = fields.Integer(
+        string="STT phụ lục kế tiếp",
+        default=1,
+        copy=False,
+        readonly=True
+    )
+    effective_line_ids = fields.One2many(
+        'contract.effective.line',
+        'contract_id',
+        string="Hàng hóa hiệu lực",
+        readonly=True
+    )
+    effective_lines_dirty = fields.Boolean(
+        string="Cần tính lại hàng hóa hiệu lực",
+        compute='_compute_effective_lines_dirty',
+        store=True,
+        readonly=False,
+        copy=False
+    )
     private_note = fields.Text(string="Ghi chú nội bộ")
 
+    def init(self):
+        # Default list order; archived contracts are out of every default
+        # search, keep them out of the index
+        drop_index(self.env.cr, 'contract_contract_contract_date_id_index', self._table)
+        create_index(
+            self.env.cr,
+            'contract_contract_active_contract_date_id_index',
+            self._table,
+            ['contract_date DESC', 'id DESC'],
+            where="active",
+        )
+        # "Của tôi" and hospital filters, usually combined with a state filter
+        # or a group by state; they also serve the single-column lookups
+        create_index(
+            self.env.cr,
+            'contract_contract_responsible_user_state_index',
+            self._table,
+            ['responsible_user_id', 'state'],
+        )
+        create_index(
+            self.env.cr,
+            'contract_contract_partner_company_state_index',
+            self._table,
+            ['partner_company_id', 'state'],
+        )
+        # Serves the nightly expiry search, which only looks at active contracts
+        create_index(
+            self.env.cr,
+            'contract_contract_active_effective_end_date_index',
+            self._table,
+            ['effective_end_date'],
+            where="state = 'active'",
+        )
+        # Milestone reminders: delivered but not accepted, accepted but not
+        # liquidated
+        create_index(
+            self.env.cr,
+            'contract_contract_pending_acceptance_index',
+            self._table,
+            ['delivery_date'],
+            where="delivery_date IS NOT NULL AND acceptance_date IS NULL",
+        )
+        create_index(
+            self.env.cr,
+            'contract_contract_pending_liquidation_index',
+            self._table,
+            ['acceptance_date'],
+            where="acceptance_date IS NOT NULL AND liquidation_date IS NULL",
+        )
+        # Archiving job: liquidated contracts not archived yet
+        create_index(
+            self.env.cr,
+            'contract_contract_archivable_index',
+            self._table,
+            ['liquidation_date'],
+            where="active AND liquidation_date IS NOT NULL",
+        )
+
     # Computed methods
+    # Changes on the partners themselves are propagated in batches through
+    # contract.partner.refresh, see res.partner.write
     @api.depends('partner_department_id')
+    @profiled
     def _compute_department_representative(self):
         """Get the name of the department contact/representative"""
+        departments = self.partner_department_id
+        representatives = {}
+        if departments:
+            # One query for all departments, keeping the first contact of each
+            contacts = self.env['res.partner'].search_fetch([
+                ('parent_id', 'in', departments.ids),
+                ('type', '=', 'contact'),
+            ], ['parent_id', 'name'])
+            for contact in contacts:
+                representatives.setdefault(contact.parent_id.id, contact.name)
         for rec in self:
-            if rec.partner_department_id:
-                # Try to find a contact person for the department
-                contacts = self.env['res.partner'].search([
-                    ('parent_id', '=', rec.partner_department_id.id),
-                    ('type', '=', 'contact')
-                ], limit=1)
-                rec.department_representative = contacts.name if contacts else rec.partner_department_id.name
+            department = rec.partner_department_id
+            if department:
+                rec.department_representative = representatives.get(department.id, department.name)
             else:
                 rec.department_representative = False
 
     @api.depends('partner_department_id', 'partner_company_id')
+    @profiled
     def _compute_partner_contact(self):
         for rec in self:
             if rec.partner_department_id:
@@ -332,12 +502,63 @@ class Contract(models.Model):
                 rec.partner_phone = False
                 rec.partner_email = False
 
+    @api.depends('end_date', 'extension_days')
+    @profiled
+    def _compute_effective_end_date(self):
+        for rec in self:
+            if rec.end_date:
+                rec.effective_end_date = rec.end_date + timedelta(days=rec.extension_days)
+            else:
+                rec.effective_end_date = False
+
     @api.depends('contract_line_ids.price_subtotal')
+    @profiled
     def _compute_amount_total(self):
         for rec in self:
             rec.amount_total = sum(rec.contract_line_ids.mapped('price_subtotal'))
 
+    @api.depends('amount_total', 'currency_id', 'company_id', 'contract_date')
+    @profiled
+    def _compute_amount_total_company(self):
+        rates = CompanyRates(self.env)
+        rates.prefetch((rec.currency_id, rec.company_id, rec.contract_date) for rec in self)
+        for rec in self:
+            rec.amount_total_company = rates.convert(
+                rec.amount_total, rec.currency_id, rec.company_id, rec.contract_date,
+            )
+
+    @api.depends(
+        'appendix_ids.state',
+        'appendix_ids.affects_contract_total',
+        'appendix_ids.amount_effect',
+    )
+    @profiled
+    def _compute_amount_appendix_total(self):
+        # Sum the stored appendix effects only, never the contract lines: an
+        # adjustment counts as the difference with what it replaces
+        totals = {
+            contract.id: amount
+            for contract, amount in self.env['contract.appendix']._read_group(
+                [
+                    ('contract_id', 'in', self.ids),
+                    ('state', '=', 'active'),
+                    ('affects_contract_total', '=', True),
+                ],
+                ['contract_id'],
+                ['amount_effect:sum'],
+            )
+        }
+        for rec in self:
+            rec.amount_appendix_total = totals.get(rec._origin.id, 0.0)
+
+    @api.depends('amount_total', 'amount_appendix_total')
+    @profiled
+    def _compute_amount_effective(self):
+        for rec in self:
+            rec.amount_effective = rec.amount_total + rec.amount_appendix_total
+
     @api.depends('start_date', 'end_date')
+    @profiled
     def _compute_duration_days(self):
         for rec in self:
             if rec.start_date and rec.end_date:
@@ -346,39 +567,97 @@ class Contract(models.Model):
             else:
                 rec.duration_days = 0
 
-    @api.depends('contract_line_ids')
+    # hospital renames are applied by the partner refresh queue, not by a cascade
+    @api.depends('contract_number', 'name', 'tender_code', 'bid_notice_no', 'partner_company_id')
+    @profiled
+    def _compute_search_text(self):
+        for rec in self:
+            rec.search_text = ' '.join(filter(None, [
+                rec.contract_number, rec.name, rec.tender_code, rec.bid_notice_no,
+                rec.partner_company_id.name,
+            ]))
+
+    @api.depends('appendix_ids')
+    @profiled
     def _compute_appendix_count(self):
+        counts = {
+            contract.id: count
+            for contract, count in self.env['contract.appendix']._read_group(
+                [('contract_id', 'in', self.ids)], ['contract_id'], ['__count'],
+            )
+        }
         for rec in self:
-            rec.appendix_count = self.env['contract.appendix'].search_count([
-                ('contract_id', '=', rec.id)
-            ])
+            rec.appendix_count = counts.get(rec._origin.id, 0)
+
+    @api.depends(
+        'contract_line_ids', 'contract_line_ids.sequence', 'contract_line_ids.product_id',
+        'contract_line_ids.name', 'contract_line_ids.uom_id', 'contract_line_ids.quantity',
+        'contract_line_ids.price_unit',
+        'appendix_ids', 'appendix_ids.state', 'appendix_ids.effective_date',
+        'appendix_ids.appendix_line_ids', 'appendix_ids.appendix_line_ids.sequence',
+        'appendix_ids.appendix_line_ids.change_action',
+        'appendix_ids.appendix_line_ids.ref_contract_line_id',
+        'appendix_ids.appendix_line_ids.product_id', 'appendix_ids.appendix_line_ids.description',
+        'appendix_ids.appendix_line_ids.uom_id', 'appendix_ids.appendix_line_ids.quantity',
+        'appendix_ids.appendix_line_ids.price_unit',
+    )
+    @profiled
+    def _compute_effective_lines_dirty(self):
+        """Invalidate the effective line set of the contracts that changed"""
+        self.effective_lines_dirty = True
+
+    def _document_payload(self):
+        """Values printed by the contract report, related records by their
+        printed names; draft and cancelled appendices are not printed
+        """
+        self.ensure_one()
+        header = [
+            self.contract_number, self.name, self.contract_date, self.start_date, self.end_date,
+            self.effective_end_date, self.service_category, self.tender_code, self.bid_notice_no,
+            self.company_id.name, self.company_signatory_id.name, self.partner_company_id.name,
+            self.partner_department_id.name, self.department_representative, self.investor_id.name,
+            self.investor_representative, self.investor_position, self.currency_id.id,
+            self.warranty_months, self.amount_effective,
+        ]
+        lines = [
+            [
+                line.sequence, line.product_id.default_code, line.name, line.uom_id.name, line.quantity,
+                line.price_unit,
+            ]
+            for line in self.contract_line_ids
+        ]
+        appendices = [
+            [
+                appendix.appendix_number, appendix.name, appendix.appendix_type, appendix.effective_date,
+                appendix.amount_appendix, appendix.affects_contract_total,
+            ]
+            for appendix in self.appendix_ids.filtered(lambda a: a.state == 'active')
+        ]
+        return [header, lines, appendices]
+
+    @api.model
+    def _search_display_name(self, operator, value):
+        """Match fragments of number, name, tender codes and hospital through
+        the trigram-indexed ``search_text`` (Many2one dropdowns, name_search)
+        """
+        if operator == 'ilike' and value:
+            return [('search_text', 'ilike', value)]
+        return super()._search_display_name(operator, value)
 
     # Onchange methods
     @api.onchange('sale_order_id')
+    @instrumented
     def _onchange_sale_order_id(self):
-        """Load product lines from selected sale order"""
-        if self.sale_order_id:
-            # Clear existing lines
-            self.contract_line_ids = [(5, 0, 0)]
-
-            # Create new lines from SO
-            lines = []
-            for line in self.sale_order_id.order_line:
-                lines.append((0, 0, {
-                    'product_id': line.product_id.id,
-                    'name': line.name,
-                    'uom_id': line.product_uom.id,
-                    'quantity': line.product_uom_qty,
-                    'price_unit': line.price_unit,
-                    'sale_order_line_id': line.id,
-                }))
-            self.contract_line_ids = lines
+        """Auto-fill customer info from the selected sale order.
 
-            # Auto-fill customer info
-            if self.sale_order_id.partner_id:
-                self.partner_company_id = self.sale_order_id.partner_id
+        Product lines are imported server-side with
+        ``action_import_sale_order_lines`` once the contract is saved.
+        """
+        if self.sale_order_id.partner_id:
+            self.partner_company_id = self.sale_order_id.partner_id
 
     @api.onchange('partner_company_id')
+    @instrumented
     def _onchange_partner_company_id(self):
         """Clear department when company changes"""
         if self.partner_company_id:
@@ -386,19 +665,28 @@ class Contract(models.Model):
 
     # CRUD overrides
     @api.model_create_multi
+    @instrumented
     def create(self, vals_list):
-        for vals in vals_list:
-            if vals.get('contract_number', _('New')) == _('New'):
-                vals['contract_number'] = self.env['ir.sequence'].next_by_code(
-                    'contract.contract'
-                ) or _('New')
-        return super().create(vals_list)
+        to_number = [
+            vals for vals in vals_list
+            if vals.get('contract_number', _('New')) == _('New')
+        ]
+        numbers = self._reserve_contract_numbers(len(to_number))
+        for vals, number in zip(to_number, numbers):
+            vals['contract_number'] = number
+        contracts = super().create(vals_list)
+        self.env['contract.kpi']._mark_dirty(self._name, contracts.ids)
+        return contracts
 
+    @instrumented
     def write(self, vals):
-        # Update last_update_date and updated_by
-        vals['last_update_date'] = fields.Date.today()
-        vals['updated_by'] = self.env.user.id
-        return super().write(vals)
+        # Update last_update_date and updated_by, except for system writes (crons)
+        if not self.env.context.get('contract_system_write'):
+            vals['last_update_date'] = fields.Date.today()
+            vals['updated_by'] = self.env.user.id
+        res = super().write(vals)
+        self.env['contract.kpi']._mark_dirty(self._name, self.ids)
+        return res
 
     def unlink(self):
         """Prevent deletion if contract has appendices or linked SOs"""
@@ -411,8 +699,224 @@ class Contract(models.Model):
                 raise ValidationError(_(
                     'Không thể xóa hợp đồng "%s" vì đã liên kết với đơn bán hàng.'
                 ) % rec.name)
+        self.env['contract.kpi']._mark_dirty(self._name, self.ids)
         return super().unlink()
 
+    # Business methods
+    @api.model
+    def _reserve_contract_numbers(self, count):
+        """Draw ``count`` contract numbers from the sequence in one query.
+
+        Falls back to one ``next_by_code`` per number when the sequence is not
+        a plain PostgreSQL sequence (no-gap or per date range).
+        """
+        if not count:
+            return []
+        sequence = self.env['ir.sequence'].sudo().search([
+            ('code', '=', 'contract.contract'),
+            ('company_id', 'in', [self.env.company.id, False]),
+        ], order='company_id', limit=1)
+        if not sequence or sequence.implementation != 'standard' or sequence.use_date_range:
+            return [
+                self.env['ir.sequence'].next_by_code('contract.contract') or _('New')
+                for _i in range(count)
+            ]
+        self.env.cr.execute(SQL(
+            "SELECT nextval(%s) FROM generate_series(1, %s) ORDER BY 1",
+            'ir_sequence_%03d' % sequence.id, count,
+        ))
+        return [sequence.get_next_char(number) for number, in self.env.cr.fetchall()]
+
+    @api.model
+    def _reserve_appendix_numbers(self, counts):
+        """Reserve consecutive appendix sequence numbers per contract.
+
+        All counters are bumped by one UPDATE, which holds a single row lock
+        per contract until commit: concurrent transactions wait on it (and get
+        retried on serialization failure) instead of reusing a number.
+
+        :param counts: dict {contract_id: number of appendices to create}
+        :return: dict {contract_id: first reserved sequence number}
+        """
+        if not counts:
+            return {}
+        contracts = self.browse(list(counts))
+        contracts.flush_recordset(['next_appendix_seq'])
+        self.env.cr.execute(SQL(
+            """
+            UPDATE contract_contract AS c
+               SET next_appendix_seq = c.next_appendix_seq + v.cnt
+              FROM (VALUES %s) AS v(id, cnt)
+             WHERE c.id = v.id
+         RETURNING c.id, c.next_appendix_seq - v.cnt
+            """,
+            SQL(", ").join(SQL("(%s, %s)", cid, cnt) for cid, cnt in counts.items()),
+        ))
+        reserved = dict(self.env.cr.fetchall())
+        contracts.invalidate_recordset(['next_appendix_seq'])
+        return reserved
+
+    def _sync_next_appendix_seq(self):
+        """Move appendix counters past the numbers already used.
+
+        Needed when appendices are created with explicit numbers (migration,
+        historical imports), which bypass ``_reserve_appendix_numbers``.
+        """
+        if not self:
+            return
+        self.env['contract.appendix'].flush_model(['contract_id', 'appendix_number'])
+        self.flush_recordset(['next_appendix_seq'])
+        self.env.cr.execute(SQL(
+            r"""
+            UPDATE contract_contract AS c
+               SET next_appendix_seq = sub.last_seq + 1
+              FROM (
+                    SELECT contract_id,
+                           GREATEST(
+                               count(*),
+                               max(COALESCE(substring(appendix_number FROM '(\d+)$'), '0')::integer)
+                           ) AS last_seq
+                      FROM contract_appendix
+                     WHERE contract_id IN %s
+                  GROUP BY contract_id
+              ) AS sub
+             WHERE c.id = sub.contract_id
+               AND c.next_appendix_seq <= sub.last_seq
+            """,
+            tuple(self.ids),
+        ))
+        self.invalidate_recordset(['next_appendix_seq'])
+
+    def _replay_appendices(self):
+        """Replay the appendix lines of the contracts onto their contract lines.
+
+        Contract lines are the starting point; the lines of active appendices
+        are then applied in ``effective_date`` order:
+
+        - ``add`` increases the referenced line, or adds a new line
+        - ``adjust`` replaces quantity, unit and price of the referenced line
+        - ``remove`` decreases the referenced line and drops it at zero
+
+        Without ``ref_contract_line_id``, adjust and remove apply to the first
+        line of the same product. Lines of other appendices are evaluated at
+        their place in that order without being applied.
+
+        :return: ``(line_sets, effects)``: the effective line values of each
+            contract id, and the ``(quantity, amount)`` change made by each
+            appendix line, i.e. the difference with what it replaces
+        """
+        line_sets = {}
+        effects = {}
+        for rec in self.with_context(active_test=False):
+            line_set = line_sets[rec.id] = {}
+            for line in rec.contract_line_ids:
+                line_set[('contract', line.id)] = {
+                    'contract_id': rec.id,
+                    'sequence': line.sequence,
+                    'product_id': line.product_id.id,
+                    'name': line.name,
+                    'uom_id': line.uom_id.id,
+                    'quantity': line.quantity,
+                    'price_unit': line.price_unit,
+                    'contract_line_id': line.id,
+                    'appendix_id': False,
+                }
+            appendix_lines = rec.appendix_ids.appendix_line_ids.sorted(lambda line: (
+                line.appendix_id.effective_date or date.min, line.appendix_id._origin.id or 0,
+                line.sequence, line._origin.id or 0,
+            ))
+            for line in appendix_lines:
+                appendix = line.appendix_id
+                applied = appendix.state == 'active'
+                if line.ref_contract_line_id:
+                    key = ('contract', line.ref_contract_line_id.id)
+                else:
+                    key = next((
+                        key for key, vals in line_set.items()
+                        if vals['product_id'] == line.product_id.id
+                    ), None) if line.change_action != 'add' else None
+                vals = line_set.get(key)
+                if vals is None:
+                    if line.change_action == 'remove':
+                        effects[line] = (0.0, 0.0)
+                        continue
+                    effects[line] = (line.quantity, line.quantity * line.price_unit)
+                    if applied:
+                        line_set[('appendix', line.id)] = {
+                            'contract_id': rec.id,
+                            'sequence': 10000 + len(line_set),
+                            'product_id': line.product_id.id,
+                            'name': line.description or line.product_id.display_name,
+                            'uom_id': line.uom_id.id,
+                            'quantity': line.quantity,
+                            'price_unit': line.price_unit,
+                            'contract_line_id': False,
+                            'appendix_id': appendix.id,
+                        }
+                    continue
+                if line.change_action == 'add':
+                    new_vals = dict(vals, quantity=vals['quantity'] + line.quantity)
+                elif line.change_action == 'adjust':
+                    new_vals = dict(
+                        vals,
+                        quantity=line.quantity,
+                        price_unit=line.price_unit,
+                        uom_id=line.uom_id.id or vals['uom_id'],
+                    )
+                else:
+                    new_vals = dict(vals, quantity=max(vals['quantity'] - line.quantity, 0.0))
+                effects[line] = (
+                    new_vals['quantity'] - vals['quantity'],
+                    new_vals['quantity'] * new_vals['price_unit'] - vals['quantity'] * vals['price_unit'],
+                )
+                if not applied:
+                    continue
+                new_vals['appendix_id'] = appendix.id
+                if line.change_action == 'remove' and new_vals['quantity'] <= 0:
+                    del line_set[key]
+                else:
+                    line_set[key] = new_vals
+        return line_sets, effects
+
+    def _refresh_effective_lines(self):
+        """Rebuild the effective line set of the contracts that changed, see
+        ``_replay_appendices``.
+        """
+        dirty = self.filtered('effective_lines_dirty')
+        if not dirty:
+            return
+        line_sets = dirty._replay_appendices()[0]
+
+        vals_list = [
+            dict(vals, price_subtotal=vals['quantity'] * vals['price_unit'])
+            for line_set in line_sets.values()
+            for vals in line_set.values()
+        ]
+        EffectiveLine = self.env['contract.effective.line'].sudo()
+        EffectiveLine.search([('contract_id', 'in', dirty.ids)]).unlink()
+        EffectiveLine.create(vals_list)
+        # not a user change: no write() stamp, no KPI refresh; a pending
+        # recomputed value must be flushed first, not over the UPDATE
+        dirty.flush_recordset(['effective_lines_dirty'])
+        self.env.cr.execute(SQL(
+            "UPDATE contract_contract SET effective_lines_dirty = FALSE WHERE id IN %s",
+            tuple(dirty.ids),
+        ))
+        dirty.invalidate_recordset(['effective_lines_dirty'], flush=False)
+
+    def get_effective_lines(self):
+        """Return the effective line set of the contracts.
+
+        :return: list of dicts with ``contract_id``, ``product_id``, ``name``,
+            ``uom_id``, ``quantity``, ``price_unit`` and ``price_subtotal``
+        """
+        self._refresh_effective_lines()
+        return self.env['contract.effective.line'].search_read(
+            [('contract_id', 'in', self.ids)],
+            ['contract_id', 'product_id', 'name', 'uom_id', 'quantity', 'price_unit', 'price_subtotal'],
+            load=None,
+        )
+
     # Constraint methods
     @api.constrains('partner_department_id', 'partner_company_id')
     def _check_department_belongs_to_company(self):
@@ -444,15 +948,279 @@ class Contract(models.Model):
             'context': {'default_contract_id': self.id},
         }
 
+    @api.model
+    def action_open_effective_lines(self):
+        """Menu action of the effective lines: rebuild the changed contracts
+        first, in a background job when there are many of them
+        """
+        action = self.env['ir.actions.act_window']._for_xml_id('contract_mgmt.action_contract_effective_line')
+        dirty = self.search([('effective_lines_dirty', '=', True)])
+        Job = self.env['contract.job']
+        if not Job._should_enqueue(dirty):
+            dirty._refresh_effective_lines()
+            return action
+        notification = Job._enqueue(
+            dirty, '_refresh_effective_lines', _('Tính lại hàng hóa hiệu lực'),
+        )._notification_action()
+        notification['params']['next'] = action
+        return notification
+
+    def action_view_effective_lines(self):
+        """Show the consolidated lines of the contracts, rebuilt if needed"""
+        self._refresh_effective_lines()
+        return {
+            'name': _('Hàng hóa hiệu lực'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'contract.effective.line',
+            'view_mode': 'list',
+            'domain': [('contract_id', 'in', self.ids)],
+            'context': {'group_by': ['contract_id']} if len(self) > 1 else {},
+        }
+
+    def action_import_sale_order_lines(self):
+        """Import the lines of all linked sale orders not imported yet.
+
+        With ``merge_sale_order_lines`` in the context, lines sharing product,
+        unit and price are merged, into the matching contract line when there
+        is one.
+        """
+        merge = bool(self.env.context.get('merge_sale_order_lines'))
+        if self.env['contract.job']._should_enqueue(self):
+            return self._enqueue_job('_import_sale_order_lines', _('Nhập dòng từ đơn bán'), merge=merge)
+        self._import_sale_order_lines(merge=merge)
+
+    def _import_sale_order_lines(self, merge=False):
+        """Create contract lines from ``sale_order_id`` and ``sale_order_ids``.
+
+        Order lines of every order are read in one query and all contract lines
+        are created by a single ``create``; merged lines already on the
+        contract get the quantity and the order lines added.
+        """
+        orders_by_contract = {rec: rec.sale_order_id | rec.sale_order_ids for rec in self}
+        orders = self.env['sale.order'].union(*orders_by_contract.values())
+        if not orders:
+            return self.env['contract.line']
+
+        order_lines = self.env['sale.order.line'].search_fetch(
+            [('order_id', 'in', orders.ids), ('display_type', '=', False)],
+            ['order_id', 'product_id', 'name', 'product_uom', 'product_uom_qty', 'price_unit'],
+            order='order_id, sequence, id',
+        )
+        lines_by_order = defaultdict(list)
+        for line in order_lines:
+            lines_by_order[line.order_id.id].append(line)
+
+        existing = self.env['contract.line'].with_context(active_test=False).search_fetch(
+            [('contract_id', 'in', self.ids)],
+            ['contract_id', 'sale_order_line_id', 'sale_order_line_ids', 'product_id', 'uom_id', 'quantity',
+             'price_unit'],
+        )
+        # merged lines keep all their source order lines in sale_order_line_ids
+        imported = {
+            (line.contract_id.id, order_line.id)
+            for line in existing
+            for order_line in line.sale_order_line_id | line.sale_order_line_ids
+        }
+        existing_by_key = {}
+        for line in existing:
+            existing_by_key.setdefault(
+                (line.contract_id.id, line.product_id.id, line.uom_id.id, line.price_unit), line,
+            )
+
+        vals_list = []
+        updates = defaultdict(lambda: {'quantity': 0.0, 'sale_order_line_ids': []})
+        for rec, rec_orders in orders_by_contract.items():
+            merged = {}
+            for order in rec_orders:
+                for line in lines_by_order[order.id]:
+                    if (rec.id, line.id) in imported:
+                        continue
+                    vals = line._prepare_contract_line_vals(rec)
+                    if merge:
+                        key = (line.product_id.id, line.product_uom.id, line.price_unit)
+                        if (rec.id, *key) in existing_by_key:
+                            update = updates[existing_by_key[rec.id, *key]]
+                            update['quantity'] += vals['quantity']
+                            update['sale_order_line_ids'] += vals['sale_order_line_ids']
+                            continue
+                        if key in merged:
+                            merged[key]['quantity'] += vals['quantity']
+                            merged[key]['sale_order_line_ids'] += vals['sale_order_line_ids']
+                            continue
+                        merged[key] = vals
+                    vals_list.append(vals)
+        for line, update in updates.items():
+            line.write(dict(update, quantity=line.quantity + update['quantity']))
+        return self.env['contract.line'].create(vals_list)
+
+    def _enqueue_job(self, method, name, **kwargs):
+        """Run ``method`` on the contracts in a background job"""
+        job = self.env['contract.job']._enqueue(self, method, name, kwargs=kwargs)
+        return job._notification_action()
+
     def action_set_active(self):
         """Set contract to active state"""
+        if self.env['contract.job']._should_enqueue(self):
+            return self._enqueue_job('action_set_active', _('Kích hoạt hợp đồng'))
         self.write({'state': 'active'})
 
     def action_set_expired(self):
         """Set contract to expired state"""
+        if self.env['contract.job']._should_enqueue(self):
+            return self._enqueue_job('action_set_expired', _('Chuyển hợp đồng sang Hết hạn'))
         self.write({'state': 'expired'})
 
     def action_cancel(self):
         """Cancel contract"""
+        if self.env['contract.job']._should_enqueue(self):
+            return self._enqueue_job('action_cancel', _('Hủy hợp đồng'))
         self.write({'state': 'cancelled'})
 
+    @api.model
+    def _cron_expire_contracts(self):
+        """Expire active contracts whose end date, extensions included, has passed.
+
+        Contracts are written in chunks of ``contract_mgmt.expiry_batch_size``
+        (system parameter) with field tracking disabled; each chunk gets its
+        chatter notes from one batched message creation and is committed.
+        """
+        batch_size = int(self.env['ir.config_parameter'].sudo().get_param(
+            'contract_mgmt.expiry_batch_size', 1000
+        ))
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        contracts = self.search([
+            ('state', '=', 'active'),
+            ('effective_end_date', '<', fields.Date.context_today(self)),
+        ], order='id')
+        body = Markup('<p>%s</p>') % _('Hợp đồng tự động chuyển sang trạng thái Hết hạn.')
+        for ids in split_every(batch_size, contracts.ids):
+            batch = self.browse(ids).with_context(tracking_disable=True, contract_system_write=True)
+            batch.write({'state': 'expired'})
+            batch._message_log_batch(bodies=dict.fromkeys(batch.ids, body))
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+        return len(contracts)
+
+    @api.model
+    def _cron_archive_contracts(self):
+        """Archive expired or cancelled contracts liquidated more than
+        ``contract_mgmt.archive_after_days`` (system parameter) days ago.
+
+        Contracts are archived in chunks of ``contract_mgmt.archive_batch_size``
+        with field tracking disabled; each chunk gets its chatter notes from
+        one batched message creation and is committed. Their lines follow
+        through the stored ``contract.line.active``.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        batch_size = int(ICP.get_param('contract_mgmt.archive_batch_size', 1000))
+        days = int(ICP.get_param('contract_mgmt.archive_after_days', 90))
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        contracts = self.search([
+            ('liquidation_date', '<=', fields.Date.context_today(self) - timedelta(days=days)),
+            ('state', 'in', ['expired', 'cancelled']),
+        ], order='id')
+        body = Markup('<p>%s</p>') % _('Hợp đồng đã thanh lý được tự động lưu trữ.')
+        for ids in split_every(batch_size, contracts.ids):
+            batch = self.browse(ids).with_context(tracking_disable=True, contract_system_write=True)
+            batch.action_archive()
+            batch._message_log_batch(bodies=dict.fromkeys(batch.ids, body))
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+        return len(contracts)
+
+    @api.model
+    def _reminder_rules(self, today):
+        """(activity type, lead time parameter, default days, candidate
+        condition for a lead time, deadline for a lead time) of the reminders
+        """
+        return [
+            (
+                'contract_mgmt.mail_activity_contract_expiry', 'contract_mgmt.reminder_expiry_days', 30,
+                lambda days: SQL(
+                    "c.state = 'active' AND c.effective_end_date BETWEEN %s AND %s",
+                    today, today + timedelta(days=days),
+                ),
+                lambda days: SQL("c.effective_end_date"),
+            ),
+            (
+                'contract_mgmt.mail_activity_contract_acceptance', 'contract_mgmt.reminder_acceptance_days', 14,
+                lambda days: SQL(
+                    "c.delivery_date IS NOT NULL AND c.acceptance_date IS NULL"
+                    " AND c.delivery_date <= %s AND c.state != 'cancelled'",
+                    today - timedelta(days=days),
+                ),
+                lambda days: SQL("c.delivery_date + %s", days),
+            ),
+            (
+                'contract_mgmt.mail_activity_contract_liquidation', 'contract_mgmt.reminder_liquidation_days', 30,
+                lambda days: SQL(
+                    "c.acceptance_date IS NOT NULL AND c.liquidation_date IS NULL"
+                    " AND c.acceptance_date <= %s AND c.state != 'cancelled'",
+                    today - timedelta(days=days),
+                ),
+                lambda days: SQL("c.acceptance_date + %s", days),
+            ),
+        ]
+
+    @api.model
+    def _cron_schedule_reminders(self):
+        """Create reminder activities for expiring contracts and for pending
+        acceptance and liquidation.
+
+        Each rule finds its candidates in one query served by a partial index.
+        Contracts with an open reminder of the same type, or a done one for
+        the same deadline, are skipped. Activities are created
+        ``contract_mgmt.reminder_batch_size`` (system parameter) at a time
+        without assignment notifications, each batch committed.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        batch_size = int(ICP.get_param('contract_mgmt.reminder_batch_size', 1000))
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        model_id = self.env['ir.model']._get_id(self._name)
+        Activity = self.env['mail.activity'].with_context(mail_activity_quick_update=True)
+        self.env.flush_all()
+        created = 0
+        for xmlid, param, default_days, condition, deadline in self._reminder_rules(
+            fields.Date.context_today(self)
+        ):
+            activity_type = self.env.ref(xmlid, raise_if_not_found=False)
+            if not activity_type:
+                continue
+            days = int(ICP.get_param(param, default_days))
+            self.env.cr.execute(SQL(
+                """
+                SELECT c.id, %(deadline)s, COALESCE(c.responsible_user_id, c.company_signatory_id)
+                  FROM contract_contract c
+                 WHERE %(condition)s
+                   AND NOT EXISTS (
+                       SELECT 1
+                         FROM mail_activity a
+                        WHERE a.res_model = %(model)s
+                          AND a.res_id = c.id
+                          AND a.activity_type_id = %(activity_type)s
+                          AND (a.active OR a.date_deadline = %(deadline)s)
+                   )
+              ORDER BY c.id
+                """,
+                deadline=deadline(days),
+                condition=condition(days),
+                model=self._name,
+                activity_type=activity_type.id,
+            ))
+            rows = self.env.cr.fetchall()
+            for chunk in split_every(batch_size, rows):
+                Activity.create([{
+                    'res_model_id': model_id,
+                    'res_id': res_id,
+                    'activity_type_id': activity_type.id,
+                    'summary': activity_type.summary,
+                    'date_deadline': date_deadline,
+                    'user_id': user_id,
+                } for res_id, date_deadline, user_id in chunk])
+                if auto_commit:
+                    self.env.cr.commit()
+                self.env.invalidate_all()
+            created += len(rows)
+        return created
@@ -1,13 +1,37 @@
 # -*- coding: utf-8 -*-
+from collections import Counter
+
 from odoo import api, fields, models, _
 from odoo.exceptions import ValidationError
+from odoo.tools.sql import create_index
+
+from ..tools import CompanyRates, instrumented, profiled
 
 
 class ContractAppendix(models.Model):
     _name = "contract.appendix"
     _description = "Contract Appendix"
     _order = "effective_date desc, id desc"
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = [
+        'mail.thread', 'mail.activity.mixin', 'contract.document.mixin', 'contract.printable.mixin',
+    ]
+    _document_fields = ('attachment_ids',)
+    _document_report = 'contract_mgmt.action_report_appendix'
+    _document_number_field = 'appendix_number'
+    _document_depends = (
+        'appendix_number', 'name', 'contract_id', 'contract_id.contract_number', 'contract_id.name',
+        'contract_id.contract_date', 'contract_id.partner_company_id',
+        'contract_id.partner_company_id.name', 'appendix_type', 'appendix_scope', 'clause_reference',
+        'effective_date', 'end_date', 'amount_note',
+        'appendix_line_ids', 'appendix_line_ids.sequence', 'appendix_line_ids.product_id',
+        'appendix_line_ids.product_id.default_code', 'appendix_line_ids.product_id.name',
+        'appendix_line_ids.description', 'appendix_line_ids.uom_id', 'appendix_line_ids.uom_id.name',
+        'appendix_line_ids.quantity', 'appendix_line_ids.price_unit', 'appendix_line_ids.change_action',
+    )
+    _sql_constraints = [
+        ('appendix_number_contract_uniq', 'unique(contract_id, appendix_number)',
+         'Số phụ lục phải là duy nhất trong mỗi hợp đồng.'),
+    ]
 
     # Định danh
     appendix_number = fields.Char(
@@ -36,6 +60,12 @@ class ContractAppendix(models.Model):
         related='contract_id.contract_number',
         readonly=True
     )
+    search_text = fields.Char(
+        string="Tìm kiếm",
+        compute='_compute_search_text',
+        store=True,
+        index='trigram'
+    )
 
     # Phân loại PL
     appendix_type = fields.Selection(
@@ -77,7 +107,8 @@ class ContractAppendix(models.Model):
     sale_order_id = fields.Many2one(
         'sale.order',
         string="Mã Đơn bán (SO)",
-        tracking=True
+        tracking=True,
+        index='btree_not_null'
     )
 
     # Chi tiết sản phẩm
@@ -100,6 +131,31 @@ class ContractAppendix(models.Model):
         store=True,
         currency_field='currency_id'
     )
+    company_currency_id = fields.Many2one(
+        related='contract_id.company_id.currency_id',
+        string="Tiền tệ công ty"
+    )
+    amount_appendix_company = fields.Monetary(
+        string="Giá trị PL (tiền tệ công ty)",
+        compute='_compute_amount_appendix_company',
+        store=True,
+        currency_field='company_currency_id',
+        help="Giá trị phụ lục quy đổi theo tỷ giá ngày hiệu lực."
+    )
+    amount_effect = fields.Monetary(
+        string="Giá trị thay đổi",
+        compute='_compute_amount_effect',
+        store=True,
+        currency_field='currency_id',
+        help="Thay đổi của phụ lục trên giá trị hợp đồng: điều chỉnh chỉ tính "
+             "phần chênh lệch với giá trị được thay thế."
+    )
+    amount_effect_company = fields.Monetary(
+        string="Giá trị thay đổi (tiền tệ công ty)",
+        compute='_compute_amount_appendix_company',
+        store=True,
+        currency_field='company_currency_id'
+    )
     affects_contract_total = fields.Boolean(
         string="Ảnh hưởng giá trị HĐ",
         default=True
@@ -130,7 +186,8 @@ class ContractAppendix(models.Model):
         string="Trạng thái",
         default='draft',
         required=True,
-        tracking=True
+        tracking=True,
+        index=True
     )
     owner_id = fields.Many2one(
         'res.users',
@@ -142,8 +199,20 @@ class ContractAppendix(models.Model):
         readonly=True
     )
 
+    def init(self):
+        # contract_id lookups are served by the (contract_id, appendix_number)
+        # unique index; this one backs the effective value of contracts
+        create_index(
+            self.env.cr,
+            'contract_appendix_active_total_contract_id_index',
+            self._table,
+            ['contract_id'],
+            where="state = 'active' AND affects_contract_total",
+        )
+
     # Computed methods
     @api.depends('effective_date', 'end_date')
+    @profiled
     def _compute_duration_days(self):
         for rec in self:
             if rec.effective_date and rec.end_date:
@@ -153,12 +222,78 @@ class ContractAppendix(models.Model):
                 rec.duration_days = 0
 
     @api.depends('appendix_line_ids.price_subtotal')
+    @profiled
     def _compute_amount_appendix(self):
         for rec in self:
             rec.amount_appendix = sum(rec.appendix_line_ids.mapped('price_subtotal'))
 
+    @api.depends('appendix_line_ids.price_subtotal_effect')
+    @profiled
+    def _compute_amount_effect(self):
+        for rec in self:
+            rec.amount_effect = sum(rec.appendix_line_ids.mapped('price_subtotal_effect'))
+
+    @api.depends(
+        'amount_appendix', 'amount_effect', 'contract_id.currency_id', 'contract_id.company_id',
+        'effective_date',
+    )
+    @profiled
+    def _compute_amount_appendix_company(self):
+        rates = CompanyRates(self.env)
+        rates.prefetch(
+            (rec.contract_id.currency_id, rec.contract_id.company_id, rec.effective_date) for rec in self
+        )
+        for rec in self:
+            rec.amount_appendix_company = rates.convert(
+                rec.amount_appendix, rec.contract_id.currency_id, rec.contract_id.company_id,
+                rec.effective_date,
+            )
+            rec.amount_effect_company = rates.convert(
+                rec.amount_effect, rec.contract_id.currency_id, rec.contract_id.company_id,
+                rec.effective_date,
+            )
+
+    @api.depends('appendix_number', 'name', 'contract_id.search_text')
+    @profiled
+    def _compute_search_text(self):
+        for rec in self:
+            rec.search_text = ' '.join(filter(None, [
+                rec.appendix_number, rec.name, rec.contract_id.search_text,
+            ]))
+
+    def _document_payload(self):
+        """Values printed by the appendix report, related records by their
+        printed names
+        """
+        self.ensure_one()
+        contract = self.contract_id
+        header = [
+            self.appendix_number, self.name, contract.contract_number, contract.name,
+            contract.contract_date, contract.partner_company_id.name, self.appendix_type,
+            self.appendix_scope, self.clause_reference, self.effective_date, self.end_date,
+            self.amount_note,
+        ]
+        lines = [
+            [
+                line.sequence, line.product_id.default_code, line.product_id.name, line.description,
+                line.uom_id.name, line.quantity, line.price_unit, line.change_action,
+            ]
+            for line in self.appendix_line_ids
+        ]
+        return [header, lines]
+
+    @api.model
+    def _search_display_name(self, operator, value):
+        """Match fragments of the appendix and contract identifiers through
+        the trigram-indexed ``search_text``
+        """
+        if operator == 'ilike' and value:
+            return [('search_text', 'ilike', value)]
+        return super()._search_display_name(operator, value)
+
     # Onchange methods
     @api.onchange('sale_order_id')
+    @instrumented
     def _onchange_sale_order_id(self):
         """Load product lines from selected sale order"""
         if self.sale_order_id:
@@ -181,36 +316,43 @@ class ContractAppendix(models.Model):
 
     # CRUD overrides
     @api.model_create_multi
+    @instrumented
     def create(self, vals_list):
-        for vals in vals_list:
-            if vals.get('appendix_number', _('New')) == _('New'):
-                # Generate appendix number based on contract
-                contract = self.env['contract.contract'].browse(vals.get('contract_id'))
-                if contract:
-                    sequence = self.search_count([('contract_id', '=', contract.id)]) + 1
-                    vals['appendix_number'] = f"PL-{contract.contract_number}-{sequence:03d}"
-                else:
-                    vals['appendix_number'] = self.env['ir.sequence'].next_by_code(
-                        'contract.appendix'
-                    ) or _('New')
-        
-        records = super().create(vals_list)
-        
-        # Update contract appendix count
-        for record in records:
-            record.contract_id._compute_appendix_count()
+        # numbers are assigned per record: never write them in the caller's dicts
+        vals_list = [dict(vals) for vals in vals_list]
+        to_number = [
+            vals for vals in vals_list
+            if vals.get('appendix_number', _('New')) == _('New')
+        ]
+        # Reserve the numbers of every contract at once, one row lock each
+        counts = Counter(vals['contract_id'] for vals in to_number if vals.get('contract_id'))
+        next_seqs = self.env['contract.contract']._reserve_appendix_numbers(counts)
+        contract_numbers = {
+            contract.id: contract.contract_number
+            for contract in self.env['contract.contract'].browse(list(next_seqs))
+        }
+        for vals in to_number:
+            contract_id = vals.get('contract_id')
+            if contract_id in next_seqs:
+                sequence = next_seqs[contract_id]
+                next_seqs[contract_id] += 1
+                vals['appendix_number'] = f"PL-{contract_numbers[contract_id]}-{sequence:03d}"
+            else:
+                vals['appendix_number'] = self.env['ir.sequence'].next_by_code(
+                    'contract.appendix'
+                ) or _('New')
         
-        return records
+        appendices = super().create(vals_list)
+        appendices._mark_kpi_dirty()
+        return appendices
 
     def write(self, vals):
-        result = super().write(vals)
-        
-        # Update contract appendix count if state changed
-        if 'state' in vals:
-            for rec in self:
-                rec.contract_id._compute_appendix_count()
-        
-        return result
+        # moving an appendix changes the values of both contracts
+        if 'contract_id' in vals:
+            self._mark_kpi_dirty()
+        res = super().write(vals)
+        self._mark_kpi_dirty()
+        return res
 
     def unlink(self):
         """Prevent deletion if appendix is active"""
@@ -219,14 +361,13 @@ class ContractAppendix(models.Model):
                 raise ValidationError(_(
                     'Không thể xóa phụ lục "%s" khi đã ở trạng thái Hiệu lực.'
                 ) % rec.name)
-        
-        # Update contract appendix count
-        contracts = self.mapped('contract_id')
-        result = super().unlink()
-        for contract in contracts:
-            contract._compute_appendix_count()
-        
-        return result
+        self._mark_kpi_dirty()
+        return super().unlink()
+
+    def _mark_kpi_dirty(self):
+        Kpi = self.env['contract.kpi']
+        Kpi._mark_dirty(self._name, self.ids)
+        Kpi._mark_dirty('contract.contract', self.contract_id.ids)
 
     # Constraint methods
     @api.constrains('effective_date', 'end_date')
@@ -238,17 +379,13 @@ class ContractAppendix(models.Model):
                 ))
 
     # Action methods
+    @instrumented
     def action_activate(self):
         """Activate appendix"""
         self.write({
             'state': 'active',
             'activated_date': fields.Date.today()
         })
-        
-        # Update contract total if affects_contract_total is True
-        for rec in self:
-            if rec.affects_contract_total:
-                rec.contract_id._compute_amount_total()
 
     def action_cancel(self):
         """Cancel appendix"""
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from odoo import api, fields, models
 
+from ..tools import instrumented, profiled
+
 
 class ContractAppendixLine(models.Model):
     _name = "contract.appendix.line"
@@ -13,7 +15,8 @@ class ContractAppendixLine(models.Model):
         'contract.appendix',
         string="Phụ lục",
         required=True,
-        ondelete='cascade'
+        ondelete='cascade',
+        index=True
     )
     
     product_id = fields.Many2one(
@@ -55,6 +58,23 @@ class ContractAppendixLine(models.Model):
         currency_field='currency_id'
     )
     
+    quantity_effect = fields.Float(
+        string="Số lượng thay đổi",
+        compute='_compute_effect',
+        store=True,
+        digits='Product Unit of Measure',
+        help="Chênh lệch số lượng so với dòng hợp đồng mà dòng này thay đổi."
+    )
+    
+    price_subtotal_effect = fields.Monetary(
+        string="Giá trị thay đổi",
+        compute='_compute_effect',
+        store=True,
+        currency_field='currency_id',
+        help="Chênh lệch giá trị so với dòng hợp đồng mà dòng này thay đổi: "
+             "điều chỉnh chỉ tính phần chênh lệch với giá trị được thay thế."
+    )
+    
     change_action = fields.Selection(
         [
             ('add', 'Bổ sung'),
@@ -69,16 +89,19 @@ class ContractAppendixLine(models.Model):
     ref_contract_line_id = fields.Many2one(
         'contract.line',
         string="Dòng HĐ tham chiếu",
-        ondelete='set null'
+        ondelete='set null',
+        index='btree_not_null'
     )
     
     sale_order_line_id = fields.Many2one(
         'sale.order.line',
         string="Dòng SO tham chiếu",
-        ondelete='set null'
+        ondelete='set null',
+        index='btree_not_null'
     )
 
     @api.depends('quantity', 'price_unit', 'change_action')
+    @profiled
     def _compute_price_subtotal(self):
         for line in self:
             subtotal = line.quantity * line.price_unit
@@ -87,7 +110,34 @@ class ContractAppendixLine(models.Model):
                 subtotal = -abs(subtotal)
             line.price_subtotal = subtotal
 
+    # an effect depends on the lines replayed before it, on the whole contract
+    @api.depends(
+        'appendix_id.contract_id.contract_line_ids', 'appendix_id.contract_id.contract_line_ids.sequence',
+        'appendix_id.contract_id.contract_line_ids.product_id',
+        'appendix_id.contract_id.contract_line_ids.quantity',
+        'appendix_id.contract_id.contract_line_ids.price_unit',
+        'appendix_id.contract_id.appendix_ids', 'appendix_id.contract_id.appendix_ids.state',
+        'appendix_id.contract_id.appendix_ids.effective_date',
+        'appendix_id.contract_id.appendix_ids.appendix_line_ids',
+        'appendix_id.contract_id.appendix_ids.appendix_line_ids.sequence',
+        'appendix_id.contract_id.appendix_ids.appendix_line_ids.change_action',
+        'appendix_id.contract_id.appendix_ids.appendix_line_ids.ref_contract_line_id',
+        'appendix_id.contract_id.appendix_ids.appendix_line_ids.product_id',
+        'appendix_id.contract_id.appendix_ids.appendix_line_ids.quantity',
+        'appendix_id.contract_id.appendix_ids.appendix_line_ids.price_unit',
+    )
+    @profiled
+    def _compute_effect(self):
+        effects = self.appendix_id.contract_id._replay_appendices()[1]
+        for line in self:
+            # lines not replayed yet (new records) count at face value
+            line.quantity_effect, line.price_subtotal_effect = effects.get(line, (
+                -line.quantity if line.change_action == 'remove' else line.quantity,
+                line.price_subtotal,
+            ))
+
     @api.onchange('product_id')
+    @instrumented
     def _onchange_product_id(self):
         if self.product_id:
             self.description = self.product_id.display_name
@@ -95,6 +145,7 @@ class ContractAppendixLine(models.Model):
             self.price_unit = self.product_id.list_price
 
     @api.onchange('ref_contract_line_id')
+    @instrumented
     def _onchange_ref_contract_line_id(self):
         """Auto-fill from referenced contract line"""
         if self.ref_contract_line_id:
@@ -104,3 +155,25 @@ class ContractAppendixLine(models.Model):
             self.quantity = self.ref_contract_line_id.quantity
             self.price_unit = self.ref_contract_line_id.price_unit
 
+    # CRUD overrides
+    def _mark_kpi_dirty(self):
+        Kpi = self.env['contract.kpi']
+        Kpi._mark_dirty('contract.appendix', self.appendix_id.ids)
+        Kpi._mark_dirty('contract.contract', self.appendix_id.contract_id.ids)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        lines._mark_kpi_dirty()
+        return lines
+
+    def write(self, vals):
+        self._mark_kpi_dirty()
+        res = super().write(vals)
+        self._mark_kpi_dirty()
+        return res
+
+    def unlink(self):
+        self._mark_kpi_dirty()
+        return super().unlink()
+
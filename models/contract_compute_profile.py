@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger('odoo.addons.contract_mgmt.profile')
+
+
+class ContractComputeProfile(models.Model):
+    """Cost of the profiled compute methods in one committed transaction.
+
+    See ``contract_mgmt.tools.profiling`` for how profiling is enabled.
+    """
+    _name = "contract.compute.profile"
+    _description = "Contract Compute Profile"
+    _order = "create_date desc, duration_ms desc, id"
+    _rec_name = 'method'
+
+    origin = fields.Char(string="Nguồn (request/cron)", readonly=True)
+    model = fields.Char(string="Model", readonly=True, index=True)
+    method = fields.Char(string="Phương thức", readonly=True, index=True)
+    calls = fields.Integer(string="Số lần gọi", readonly=True, aggregator='sum')
+    records = fields.Integer(string="Số bản ghi", readonly=True, aggregator='sum')
+    queries = fields.Integer(string="Số truy vấn SQL", readonly=True, aggregator='sum')
+    duration_ms = fields.Float(string="Thời gian (ms)", readonly=True, digits=(16, 2), aggregator='sum')
+
+    @api.model
+    def _record(self, origin, stats):
+        """Store and log the stats of a transaction.
+
+        :param stats: dict {(model, method): [calls, records, queries, ms]}
+        """
+        if not stats:
+            return self.browse()
+        vals_list = [{
+            'origin': origin,
+            'model': model,
+            'method': method,
+            'calls': calls,
+            'records': records,
+            'queries': queries,
+            'duration_ms': duration,
+        } for (model, method), (calls, records, queries, duration) in sorted(
+            stats.items(), key=lambda item: -item[1][3],
+        )]
+        _logger.info("%s", json.dumps({
+            'origin': origin,
+            'computes': [
+                {key: vals[key] for key in ('model', 'method', 'calls', 'records', 'queries')}
+                | {'ms': round(vals['duration_ms'], 2)}
+                for vals in vals_list
+            ],
+        }))
+        return self.create(vals_list)
+
+    @api.autovacuum
+    def _gc_profiles(self):
+        """Keep one week of measures"""
+        self.search([('create_date', '<', fields.Datetime.now() - timedelta(days=7))]).unlink()
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import os
+import tempfile
+
+from odoo import api, fields, models, _
+from odoo.tools import SQL
+from odoo.tools.mimetypes import guess_mimetype
+
+from ..tools import profiled
+
+# Models whose attachments may be shared between documents
+DOCUMENT_MODELS = ('contract.contract', 'contract.appendix')
+CHUNK_SIZE = 1024 * 1024
+
+
+class ContractDocumentMixin(models.AbstractModel):
+    """Document fields (Many2many to ir.attachment) shared by contracts and
+    appendices.
+
+    Uploads go through ``_store_document``: the file is streamed to the
+    filestore and an attachment with the same content is reused instead of
+    creating a new one. A shared attachment stays owned (``res_model``,
+    ``res_id``) by one record; when that record is deleted, ownership moves
+    to another record still linking it.
+    """
+    _name = "contract.document.mixin"
+    _description = "Contract Document Mixin"
+
+    # Many2many ir.attachment fields holding the documents of the record
+    _document_fields = ()
+
+    document_count = fields.Integer(
+        string="Số tài liệu",
+        compute='_compute_document_count'
+    )
+
+    def _document_attachment_rows(self):
+        """(record id, attachment id) of all document fields, read from the
+        relation tables only
+        """
+        ids = tuple(rec._origin.id for rec in self if rec._origin.id)
+        if not ids or not self._document_fields:
+            return []
+        queries = []
+        for name in self._document_fields:
+            field = self._fields[name]
+            queries.append(SQL(
+                "SELECT %s, %s FROM %s WHERE %s IN %s",
+                SQL.identifier(field.column1),
+                SQL.identifier(field.column2),
+                SQL.identifier(field.relation),
+                SQL.identifier(field.column1),
+                ids,
+            ))
+        self.env.cr.execute(SQL(" UNION ").join(queries))
+        return self.env.cr.fetchall()
+
+    @profiled
+    def _compute_document_count(self):
+        self.flush_recordset(list(self._document_fields))
+        counts = {}
+        for res_id, _attachment_id in self._document_attachment_rows():
+            counts[res_id] = counts.get(res_id, 0) + 1
+        for rec in self:
+            rec.document_count = counts.get(rec._origin.id, 0)
+
+    @api.model
+    def _find_document(self, checksum, file_size):
+        return self.env['ir.attachment'].search([
+            ('checksum', '=', checksum),
+            ('file_size', '=', file_size),
+            ('res_model', 'in', DOCUMENT_MODELS),
+        ], order='id', limit=1)
+
+    @api.model
+    def _store_document(self, name, stream, mimetype=None, res_id=0):
+        """Return an attachment holding the content of ``stream``.
+
+        The content is copied in chunks to a temporary file of the filestore
+        while its SHA-1 is computed, then moved to its content-addressed
+        location. An existing document attachment with the same checksum is
+        returned as is, so a blob uploaded again is stored and indexed once.
+        """
+        Attachment = self.env['ir.attachment']
+        if Attachment._storage() != 'file':
+            raw = stream.read()
+            checksum = Attachment._compute_checksum(raw)
+            return self._find_document(checksum, len(raw)) or Attachment.create({
+                'name': name,
+                'raw': raw,
+                'mimetype': mimetype,
+                'res_model': self._name,
+                'res_id': res_id,
+            })
+
+        filestore = Attachment._filestore()
+        os.makedirs(filestore, exist_ok=True)
+        sha, size, head = hashlib.sha1(), 0, b''
+        fd, tmp_path = tempfile.mkstemp(dir=filestore, prefix='upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while chunk := stream.read(CHUNK_SIZE):
+                    if not head:
+                        head = chunk[:1024]
+                    sha.update(chunk)
+                    size += len(chunk)
+                    tmp.write(chunk)
+            checksum = sha.hexdigest()
+            existing = self._find_document(checksum, size)
+            if existing:
+                return existing
+
+            fname = f"{checksum[:2]}/{checksum}"
+            full_path = Attachment._full_path(fname)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            if not os.path.exists(full_path):
+                os.replace(tmp_path, full_path)
+            # removed by the garbage collector if the transaction is rolled back
+            Attachment._mark_for_gc(fname)
+            # create() drops the file columns: point the record to the blob afterwards
+            attachment = Attachment.create({
+                'name': name,
+                'mimetype': mimetype or guess_mimetype(head),
+                'res_model': self._name,
+                'res_id': res_id,
+            })
+            attachment.flush_recordset()
+            self.env.cr.execute(SQL(
+                """
+                UPDATE ir_attachment
+                   SET store_fname = %s, file_size = %s, checksum = %s, db_datas = NULL
+                 WHERE id = %s
+                """,
+                fname, size, checksum, attachment.id,
+            ))
+            attachment.invalidate_recordset(['store_fname', 'file_size', 'checksum', 'db_datas', 'raw', 'datas'])
+            return attachment
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def _transfer_shared_documents(self):
+        """Give the attachments owned by ``self`` and still linked by other
+        document records to one of those records, so that deleting ``self``
+        does not delete them
+        """
+        if not self.ids:
+            return
+        self.env['ir.attachment'].flush_model(['res_model', 'res_id'])
+        self.env.cr.execute(SQL(
+            "SELECT id FROM ir_attachment WHERE res_model = %s AND res_id IN %s",
+            self._name, tuple(self.ids),
+        ))
+        attachment_ids = tuple(row[0] for row in self.env.cr.fetchall())
+        if not attachment_ids:
+            return
+        queries = []
+        for model_name in DOCUMENT_MODELS:
+            Model = self.env[model_name]
+            Model.flush_model(list(Model._document_fields))
+            for name in Model._document_fields:
+                field = Model._fields[name]
+                query = SQL(
+                    "SELECT %s AS attachment_id, %s AS res_model, %s AS res_id FROM %s WHERE %s IN %s",
+                    SQL.identifier(field.column2),
+                    model_name,
+                    SQL.identifier(field.column1),
+                    SQL.identifier(field.relation),
+                    SQL.identifier(field.column2),
+                    attachment_ids,
+                )
+                if model_name == self._name:
+                    query = SQL("%s AND %s NOT IN %s", query, SQL.identifier(field.column1), tuple(self.ids))
+                queries.append(query)
+        self.env.cr.execute(SQL(
+            """
+            UPDATE ir_attachment a
+               SET res_model = r.res_model, res_id = r.res_id
+              FROM (SELECT DISTINCT ON (attachment_id) attachment_id, res_model, res_id
+                      FROM (%s) refs
+                  ORDER BY attachment_id, res_model, res_id) r
+             WHERE a.id = r.attachment_id
+            """,
+            SQL(" UNION ALL ").join(queries),
+        ))
+        self.env['ir.attachment'].browse(attachment_ids).invalidate_recordset(['res_model', 'res_id'])
+
+    def unlink(self):
+        self._transfer_shared_documents()
+        return super().unlink()
+
+    def action_view_documents(self):
+        """Smart button action listing the documents of the record"""
+        self.ensure_one()
+        return {
+            'name': _('Tài liệu'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'ir.attachment',
+            'view_mode': 'kanban,list,form',
+            'domain': [('id', 'in', [row[1] for row in self._document_attachment_rows()])],
+            'context': {'create': False},
+        }
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from odoo import fields, models
+
+
+class ContractEffectiveLine(models.Model):
+    """Consolidated line set of a contract after its active appendices.
+
+    Rebuilt by ``contract.contract._refresh_effective_lines`` only for the
+    contracts whose lines or appendices changed since the last build.
+    """
+    _name = "contract.effective.line"
+    _description = "Contract Effective Line"
+    _order = "contract_id, sequence, id"
+
+    sequence = fields.Integer(string="Sequence", default=10)
+
+    contract_id = fields.Many2one(
+        'contract.contract',
+        string="Hợp đồng",
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+
+    product_id = fields.Many2one(
+        'product.product',
+        string="Sản phẩm/Dịch vụ",
+        index=True
+    )
+
+    name = fields.Text(
+        string="Mô tả"
+    )
+
+    uom_id = fields.Many2one(
+        'uom.uom',
+        string="Đơn vị tính"
+    )
+
+    quantity = fields.Float(
+        string="Số lượng",
+        digits='Product Unit of Measure'
+    )
+
+    currency_id = fields.Many2one(
+        'res.currency',
+        string="Tiền tệ",
+        related='contract_id.currency_id',
+        readonly=True
+    )
+
+    price_unit = fields.Monetary(
+        string="Đơn giá",
+        currency_field='currency_id'
+    )
+
+    price_subtotal = fields.Monetary(
+        string="Thành tiền",
+        currency_field='currency_id'
+    )
+
+    # Origin of the line
+    contract_line_id = fields.Many2one(
+        'contract.line',
+        string="Dòng HĐ gốc",
+        ondelete='set null'
+    )
+
+    appendix_id = fields.Many2one(
+        'contract.appendix',
+        string="Phụ lục thay đổi cuối",
+        ondelete='set null'
+    )
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+import codecs
+import csv
+import io
+import os
+import tempfile
+from datetime import date
+
+import xlsxwriter
+
+from odoo import fields, models
+from odoo.tools import SQL
+
+# Column layout of the finance export, loaded as is by the BI; only append
+COLUMNS = [
+    'contract_number', 'contract_name', 'contract_state', 'contract_date', 'start_date',
+    'effective_end_date', 'hospital', 'department', 'line_source', 'appendix_number',
+    'appendix_effective_date', 'change_action', 'product_code', 'product_name', 'hs_code',
+    'uom', 'quantity', 'price_unit', 'price_subtotal', 'currency',
+]
+# Rows fetched from the server-side cursor at once
+FETCH_SIZE = 2000
+# Size of the chunks streamed to the client
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class ContractExportWizard(models.TransientModel):
+    """Finance export of contract lines and active appendix lines.
+
+    Rows are read from a server-side cursor ``FETCH_SIZE`` at a time and
+    written straight to the response (CSV) or to a constant-memory XLSX
+    workbook on disk, so memory does not grow with the number of lines.
+    """
+    _name = "contract.export.wizard"
+    _description = "Contract Finance Export"
+
+    file_format = fields.Selection(
+        [
+            ('xlsx', 'XLSX'),
+            ('csv', 'CSV'),
+        ],
+        string="Định dạng",
+        required=True,
+        default='xlsx'
+    )
+    contract_state = fields.Selection(
+        [
+            ('active', 'Đang hiệu lực'),
+            ('all', 'Tất cả'),
+        ],
+        string="Hợp đồng",
+        required=True,
+        default='active'
+    )
+    partner_company_ids = fields.Many2many(
+        'res.partner',
+        string="Bệnh viện",
+        domain=[('is_company', '=', True)],
+        help="Để trống để xuất tất cả bệnh viện."
+    )
+    date_from = fields.Date(string="Ký từ ngày")
+    date_to = fields.Date(string="Ký đến ngày")
+    include_appendices = fields.Boolean(
+        string="Gồm phụ lục hiệu lực",
+        default=True
+    )
+
+    def action_export(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/contract_mgmt/export/%s' % self.id,
+            'target': 'download',
+        }
+
+    def _export_filename(self):
+        return 'contract_lines_%s.%s' % (fields.Date.context_today(self), self.file_format)
+
+    def _contract_domain(self):
+        domain = []
+        if self.contract_state == 'active':
+            domain.append(('state', '=', 'active'))
+        if self.partner_company_ids:
+            domain.append(('partner_company_id', 'in', self.partner_company_ids.ids))
+        if self.date_from:
+            domain.append(('contract_date', '>=', self.date_from))
+        if self.date_to:
+            domain.append(('contract_date', '<=', self.date_to))
+        return domain
+
+    def _export_query(self):
+        """Rows of ``COLUMNS``, contract by contract; contracts are filtered
+        through ``_search`` so that record rules apply
+        """
+        Contract = self.env['contract.contract']
+        if self.contract_state == 'all':
+            # liquidated contracts are archived: "all" includes them
+            Contract = Contract.with_context(active_test=False)
+        contracts = Contract._search(self._contract_domain()).subselect()
+        lang = self.env.lang or 'en_US'
+        queries = [SQL(
+            """
+            SELECT l.contract_id, 0 AS section, l.sequence, l.id AS line_id,
+                   'contract' AS line_source, NULL AS appendix_number,
+                   NULL::date AS appendix_effective_date, NULL AS change_action,
+                   l.product_id, l.name AS description, l.hs_code, l.uom_id,
+                   l.quantity, l.price_unit, l.price_subtotal
+              FROM contract_line l
+             WHERE l.contract_id IN %s
+            """,
+            contracts,
+        )]
+        if self.include_appendices:
+            queries.append(SQL(
+                """
+                SELECT a.contract_id, 1 AS section, al.sequence, al.id AS line_id,
+                       'appendix' AS line_source, a.appendix_number,
+                       a.effective_date AS appendix_effective_date, al.change_action,
+                       al.product_id, al.description, NULL AS hs_code, al.uom_id,
+                       al.quantity, al.price_unit, al.price_subtotal
+                  FROM contract_appendix_line al
+                  JOIN contract_appendix a ON a.id = al.appendix_id
+                 WHERE a.state = 'active' AND a.contract_id IN %s
+                """,
+                contracts,
+            ))
+        return SQL(
+            """
+            SELECT c.contract_number, c.name, c.state, c.contract_date, c.start_date,
+                   c.effective_end_date, hospital.name, department.name, r.line_source,
+                   r.appendix_number, r.appendix_effective_date, r.change_action,
+                   p.default_code, COALESCE(t.name->>%(lang)s, t.name->>'en_US', r.description),
+                   r.hs_code, COALESCE(u.name->>%(lang)s, u.name->>'en_US'),
+                   r.quantity, r.price_unit, r.price_subtotal, cur.name
+              FROM (%(lines)s) r
+              JOIN contract_contract c ON c.id = r.contract_id
+         LEFT JOIN res_partner hospital ON hospital.id = c.partner_company_id
+         LEFT JOIN res_partner department ON department.id = c.partner_department_id
+         LEFT JOIN product_product p ON p.id = r.product_id
+         LEFT JOIN product_template t ON t.id = p.product_tmpl_id
+         LEFT JOIN uom_uom u ON u.id = r.uom_id
+         LEFT JOIN res_currency cur ON cur.id = c.currency_id
+          ORDER BY c.contract_date, c.id, r.section, r.sequence, r.line_id
+            """,
+            lang=lang,
+            lines=SQL(" UNION ALL ").join(queries),
+        )
+
+    def _iter_rows(self):
+        """Yield lists of export rows read through a server-side cursor"""
+        self.ensure_one()
+        self.env['contract.line'].check_access('read')
+        self.env['contract.appendix.line'].check_access('read')
+        self.env.flush_all()
+        cr = self.env.cr
+        cr.execute(SQL("DECLARE contract_export NO SCROLL CURSOR FOR %s", self._export_query()))
+        try:
+            while True:
+                cr.execute(SQL("FETCH FORWARD %s FROM contract_export", FETCH_SIZE))
+                rows = cr.fetchall()
+                if not rows:
+                    break
+                yield [
+                    [value.isoformat() if isinstance(value, date) else value for value in row]
+                    for row in rows
+                ]
+        finally:
+            cr.execute("CLOSE contract_export")
+
+    def _stream_csv(self):
+        yield codecs.BOM_UTF8
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(COLUMNS)
+        for rows in self._iter_rows():
+            writer.writerows(rows)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue().encode()
+
+    def _stream_xlsx(self):
+        # constant_memory flushes every row to disk; the zip is built on close
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+            sheet = workbook.add_worksheet('contract_lines')
+            sheet.write_row(0, 0, COLUMNS)
+            index = 1
+            for rows in self._iter_rows():
+                for row in rows:
+                    sheet.write_row(index, 0, row)
+                    index += 1
+            workbook.close()
+            with open(path, 'rb') as f:
+                while chunk := f.read(STREAM_CHUNK_SIZE):
+                    yield chunk
+        finally:
+            os.unlink(path)
+
+    def _stream_export(self):
+        """Chunks of the export file"""
+        if self.file_format == 'csv':
+            return self._stream_csv()
+        return self._stream_xlsx()
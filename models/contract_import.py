@@ -0,0 +1,442 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import itertools
+import logging
+import threading
+import time
+from datetime import date, datetime
+
+import psycopg2
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import split_every
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+_logger = logging.getLogger(__name__)
+
+# Maximum number of rejected rows kept in the job log
+MAX_LOGGED_ERRORS = 200
+
+
+class ContractImportJob(models.Model):
+    _name = "contract.import.job"
+    _description = "Contract Bulk Import Job"
+    _order = "id desc"
+
+    name = fields.Char(
+        string="Tên đợt nhập",
+        required=True
+    )
+    import_type = fields.Selection(
+        [
+            ('contract', 'Hợp đồng'),
+            ('line', 'Chi tiết sản phẩm'),
+            ('appendix', 'Phụ lục'),
+            ('appendix_line', 'Chi tiết phụ lục'),
+        ],
+        string="Loại dữ liệu",
+        required=True,
+        default='contract'
+    )
+    file = fields.Binary(
+        string="File dữ liệu",
+        attachment=True,
+        required=True
+    )
+    file_name = fields.Char(string="Tên file")
+    file_type = fields.Selection(
+        [
+            ('csv', 'CSV'),
+            ('xlsx', 'XLSX'),
+        ],
+        string="Định dạng",
+        compute='_compute_file_type'
+    )
+    chunk_size = fields.Integer(
+        string="Số dòng mỗi đợt",
+        default=2000,
+        required=True
+    )
+
+    state = fields.Selection(
+        [
+            ('draft', 'Nháp'),
+            ('queued', 'Chờ chạy'),
+            ('running', 'Đang chạy'),
+            ('done', 'Hoàn thành'),
+            ('failed', 'Lỗi'),
+        ],
+        string="Trạng thái",
+        default='draft',
+        required=True,
+        readonly=True
+    )
+
+    # Checkpoint & thống kê
+    rows_done = fields.Integer(
+        string="Số dòng đã xử lý",
+        readonly=True,
+        help="Checkpoint: số dòng dữ liệu đã được commit, lần chạy sau tiếp tục từ đây."
+    )
+    rows_skipped = fields.Integer(
+        string="Số dòng bỏ qua",
+        readonly=True
+    )
+    records_created = fields.Integer(
+        string="Số bản ghi đã tạo",
+        readonly=True
+    )
+    duration = fields.Float(
+        string="Thời gian chạy (giây)",
+        readonly=True
+    )
+    rows_per_second = fields.Float(
+        string="Tốc độ (dòng/giây)",
+        readonly=True
+    )
+    started_at = fields.Datetime(string="Bắt đầu", readonly=True)
+    finished_at = fields.Datetime(string="Kết thúc", readonly=True)
+    error_log = fields.Text(string="Nhật ký lỗi", readonly=True)
+
+    @api.depends('file_name')
+    def _compute_file_type(self):
+        for job in self:
+            name = (job.file_name or '').lower()
+            job.file_type = 'xlsx' if name.endswith('.xlsx') else 'csv'
+
+    @api.constrains('chunk_size')
+    def _check_chunk_size(self):
+        for job in self:
+            if job.chunk_size <= 0:
+                raise ValidationError(_('Số dòng mỗi đợt phải lớn hơn 0.'))
+
+    # Action methods
+    def action_start(self):
+        """Queue the import; runs resume from the last committed checkpoint"""
+        self.filtered(lambda job: job.state in ('draft', 'failed')).write({'state': 'queued'})
+        self.env.ref('contract_mgmt.ir_cron_contract_import')._trigger()
+
+    def action_reset(self):
+        """Restart the import from the first row"""
+        self.write({
+            'state': 'draft',
+            'rows_done': 0,
+            'rows_skipped': 0,
+            'records_created': 0,
+            'duration': 0.0,
+            'rows_per_second': 0.0,
+            'error_log': False,
+        })
+
+    @api.model
+    def _cron_run_imports(self):
+        for job in self.search([('state', 'in', ('queued', 'running'))], order='id'):
+            job._run()
+
+    # Import engine
+    def _run(self):
+        """Stream the file chunk by chunk, committing after each chunk"""
+        self.ensure_one()
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        self.write({'state': 'running', 'started_at': fields.Datetime.now()})
+        if auto_commit:
+            self.env.cr.commit()
+
+        importer = self.with_context(
+            tracking_disable=True,
+            mail_create_nolog=True,
+            mail_create_nosubscribe=True,
+            mail_notrack=True,
+        )
+        lookups = importer._build_lookups()
+        started = time.perf_counter()
+        rows_run = 0
+        try:
+            with self._open_file() as stream:
+                rows = itertools.islice(self._iter_rows(stream), self.rows_done, None)
+                for chunk in split_every(self.chunk_size, rows):
+                    created, errors = importer._import_chunk(chunk, self.rows_done, lookups)
+                    rows_run += len(chunk)
+                    elapsed = time.perf_counter() - started
+                    self.write({
+                        'rows_done': self.rows_done + len(chunk),
+                        'rows_skipped': self.rows_skipped + len(errors),
+                        'records_created': self.records_created + created,
+                        'rows_per_second': rows_run / elapsed if elapsed else 0.0,
+                        'error_log': self._append_errors(errors),
+                    })
+                    _logger.info(
+                        "Contract import %s: %d rows done (%.0f rows/s)",
+                        self.name, self.rows_done, self.rows_per_second,
+                    )
+                    if auto_commit:
+                        self.env.cr.commit()
+                    # keep memory flat whatever the file size
+                    self.env.invalidate_all()
+        except Exception as e:
+            _logger.exception("Contract import %s failed", self.name)
+            if not auto_commit:
+                raise
+            self.env.cr.rollback()
+            self.write({
+                'state': 'failed',
+                'error_log': self._append_errors([str(e)]),
+                'duration': self.duration + time.perf_counter() - started,
+            })
+            self.env.cr.commit()
+            return
+
+        self.write({
+            'state': 'done',
+            'finished_at': fields.Datetime.now(),
+            'duration': self.duration + time.perf_counter() - started,
+        })
+        if auto_commit:
+            self.env.cr.commit()
+
+    def _append_errors(self, errors):
+        lines = (self.error_log or '').splitlines()
+        if errors and len(lines) < MAX_LOGGED_ERRORS:
+            lines += errors[:MAX_LOGGED_ERRORS - len(lines)]
+        return '\n'.join(lines) or False
+
+    def _open_file(self):
+        """Open the uploaded file without loading it in memory when possible"""
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', '=', self.id),
+            ('res_field', '=', 'file'),
+        ], limit=1)
+        if not attachment:
+            raise UserError(_('Chưa có file dữ liệu để nhập.'))
+        if attachment.store_fname:
+            return open(attachment._full_path(attachment.store_fname), 'rb')
+        return io.BytesIO(attachment.raw)
+
+    def _iter_rows(self, stream):
+        """Yield each data row as a dict keyed by the header row"""
+        if self.file_type == 'xlsx':
+            if openpyxl is None:
+                raise UserError(_('Cần cài thư viện openpyxl để nhập file XLSX.'))
+            workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+            rows = workbook.active.iter_rows(values_only=True)
+        else:
+            rows = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+        header = [str(cell or '').strip() for cell in next(rows, [])]
+        for row in rows:
+            if any(cell not in (None, '') for cell in row):
+                yield dict(zip(header, row))
+
+    def _build_lookups(self):
+        """Map the external references of the file to ids, once per run"""
+        def mapping(model, key, domain=()):
+            records = self.env[model].with_context(active_test=False).search_fetch(
+                [(key, '!=', False), *domain], [key],
+            )
+            return {record[key]: record.id for record in records}
+
+        return {
+            'partner': mapping('res.partner', 'ref'),
+            'user': mapping('res.users', 'login'),
+            'currency': mapping('res.currency', 'name'),
+            'product': mapping('product.product', 'default_code'),
+            'uom': mapping('uom.uom', 'name'),
+            'country': mapping('res.country', 'code'),
+        }
+
+    def _import_chunk(self, rows, offset, lookups):
+        """Create the records of one chunk in a single ``create``; when a
+        constraint fails, the rows are created one by one instead and the
+        failing ones are rejected
+
+        :return: (number of records created, list of error messages)
+        """
+        prepare = getattr(self, '_prepare_%s_vals' % self.import_type)
+        model_name = {
+            'contract': 'contract.contract',
+            'line': 'contract.line',
+            'appendix': 'contract.appendix',
+            'appendix_line': 'contract.appendix.line',
+        }[self.import_type]
+        prepared, errors = [], []
+        context = self._chunk_context(rows, lookups)
+        for index, row in enumerate(rows, start=offset + 2):
+            try:
+                vals = prepare(row, lookups, context)
+            except (ValueError, KeyError) as e:
+                errors.append(_('Dòng %(row)s: %(error)s', row=index, error=e))
+                continue
+            if vals:
+                prepared.append((index, vals))
+
+        Model = self.env[model_name]
+        try:
+            with self.env.cr.savepoint():
+                records = Model.create([vals for _index, vals in prepared])
+        except (UserError, ValueError, psycopg2.IntegrityError):
+            records = Model
+            for index, vals in prepared:
+                try:
+                    with self.env.cr.savepoint():
+                        records |= Model.create(vals)
+                except (UserError, ValueError, psycopg2.IntegrityError) as e:
+                    _logger.info("Contract import %s: row %s rejected: %s", self.name, index, e)
+                    errors.append(_('Dòng %(row)s: %(error)s', row=index, error=e))
+        if self.import_type == 'appendix':
+            records.contract_id._sync_next_appendix_seq()
+        return len(records), errors
+
+    def _chunk_context(self, rows, lookups):
+        """Per-chunk lookups of the contracts and appendices referenced"""
+        numbers = {_to_str(row.get('contract_number')) for row in rows} - {False}
+        # history imports also target archived contracts
+        contracts = self.env['contract.contract'].with_context(active_test=False).search_fetch(
+            [('contract_number', 'in', list(numbers))], ['contract_number'],
+        )
+        context = {'contract': {c.contract_number: c.id for c in contracts}}
+        if self.import_type == 'appendix_line':
+            appendices = self.env['contract.appendix'].search_fetch(
+                [('contract_id', 'in', contracts.ids)], ['contract_id', 'appendix_number'],
+            )
+            context['appendix'] = {
+                (a.contract_id.contract_number, a.appendix_number): a.id for a in appendices
+            }
+        if self.import_type == 'appendix':
+            appendices = self.env['contract.appendix'].search_fetch(
+                [('contract_id', 'in', contracts.ids)], ['contract_id', 'appendix_number'],
+            )
+            context['existing'] = {(a.contract_id.id, a.appendix_number) for a in appendices}
+        return context
+
+    def _prepare_contract_vals(self, row, lookups, context):
+        number = _required(row, 'contract_number')
+        if number in context['contract']:
+            # already imported: keep the import idempotent
+            return None
+        vals = {
+            'contract_number': number,
+            'name': _required(row, 'name'),
+            'contract_date': _to_date(_required(row, 'contract_date')),
+            'start_date': _to_date(row.get('start_date')),
+            'end_date': _to_date(_required(row, 'end_date')),
+            'service_category': _required(row, 'service_category'),
+            'state': _to_str(row.get('state')) or 'draft',
+            'partner_company_id': _lookup(lookups, 'partner', _required(row, 'hospital_ref')),
+            'tender_code': _to_str(row.get('tender_code')),
+            'bid_notice_no': _to_str(row.get('bid_notice_no')),
+            'extension_days': _to_int(row.get('extension_days')),
+            'delivery_date': _to_date(row.get('delivery_date')),
+            'acceptance_date': _to_date(row.get('acceptance_date')),
+            'liquidation_date': _to_date(row.get('liquidation_date')),
+            'warranty_months': _to_int(row.get('warranty_months')),
+            'invoice_number': _to_str(row.get('invoice_number')),
+            'invoice_issue_date': _to_date(row.get('invoice_issue_date')),
+            'company_signatory_id': _lookup(
+                lookups, 'user', _to_str(row.get('signatory_login')) or self.env.user.login
+            ),
+            'responsible_user_id': _lookup(
+                lookups, 'user', _to_str(row.get('responsible_login')) or self.env.user.login
+            ),
+        }
+        if _to_str(row.get('department_ref')):
+            vals['partner_department_id'] = _lookup(lookups, 'partner', _to_str(row['department_ref']))
+        if _to_str(row.get('currency')):
+            vals['currency_id'] = _lookup(lookups, 'currency', _to_str(row['currency']))
+        context['contract'][number] = True
+        return vals
+
+    def _prepare_line_vals(self, row, lookups, context):
+        product_code = _required(row, 'product_code')
+        vals = {
+            'contract_id': _lookup(context, 'contract', _required(row, 'contract_number')),
+            'product_id': _lookup(lookups, 'product', product_code),
+            'name': _to_str(row.get('name')) or product_code,
+            'uom_id': _lookup(lookups, 'uom', _required(row, 'uom')),
+            'quantity': _to_float(_required(row, 'quantity')),
+            'price_unit': _to_float(_required(row, 'price_unit')),
+            'hs_code': _to_str(row.get('hs_code')),
+        }
+        if _to_str(row.get('manufacturer_ref')):
+            vals['manufacturer_id'] = _lookup(lookups, 'partner', _to_str(row['manufacturer_ref']))
+        if _to_str(row.get('origin_country')):
+            vals['origin_country_id'] = _lookup(lookups, 'country', _to_str(row['origin_country']))
+        return vals
+
+    def _prepare_appendix_vals(self, row, lookups, context):
+        contract_id = _lookup(context, 'contract', _required(row, 'contract_number'))
+        number = _required(row, 'appendix_number')
+        if (contract_id, number) in context['existing']:
+            return None
+        context['existing'].add((contract_id, number))
+        return {
+            'contract_id': contract_id,
+            'appendix_number': number,
+            'name': _to_str(row.get('name')),
+            'appendix_type': _required(row, 'appendix_type'),
+            'appendix_scope': _required(row, 'appendix_scope'),
+            'effective_date': _to_date(_required(row, 'effective_date')),
+            'end_date': _to_date(row.get('end_date')),
+            'state': _to_str(row.get('state')) or 'draft',
+            'affects_contract_total': _to_str(row.get('affects_contract_total')) not in ('0', 'False', 'false'),
+            'amount_note': _to_str(row.get('amount_note')),
+        }
+
+    def _prepare_appendix_line_vals(self, row, lookups, context):
+        key = (_required(row, 'contract_number'), _required(row, 'appendix_number'))
+        product_code = _required(row, 'product_code')
+        return {
+            'appendix_id': _lookup(context, 'appendix', key),
+            'product_id': _lookup(lookups, 'product', product_code),
+            'description': _to_str(row.get('description')) or product_code,
+            'uom_id': _lookup(lookups, 'uom', _required(row, 'uom')),
+            'quantity': _to_float(_required(row, 'quantity')),
+            'price_unit': _to_float(_required(row, 'price_unit')),
+            'change_action': _to_str(row.get('change_action')) or 'add',
+        }
+
+
+def _to_str(value):
+    if value is None:
+        return False
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip() or False
+
+
+def _to_int(value):
+    return int(_to_float(value))
+
+
+def _to_float(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    return float(_to_str(value) or 0.0)
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    value = _to_str(value)
+    return fields.Date.to_date(value) if value else False
+
+
+def _required(row, column):
+    value = _to_str(row.get(column))
+    if not value:
+        raise ValueError(_('thiếu giá trị cột "%s"', column))
+    return value
+
+
+def _lookup(lookups, kind, key):
+    try:
+        return lookups[kind][key]
+    except KeyError:
+        raise ValueError(_('không tìm thấy %(kind)s "%(key)s"', kind=kind, key=key)) from None
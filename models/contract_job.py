@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from odoo import api, fields, models, _
+from odoo.exceptions import AccessError
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+# Seconds a cron run may spend on jobs before handing over to the next run
+DEFAULT_TIME_LIMIT = 240
+# (model, method) a job may call; anything else is refused, whatever is stored
+JOB_METHODS = {
+    ('contract.contract', 'action_set_active'),
+    ('contract.contract', 'action_set_expired'),
+    ('contract.contract', 'action_cancel'),
+    ('contract.contract', '_import_sale_order_lines'),
+    ('contract.contract', '_refresh_effective_lines'),
+    ('contract.contract', '_render_documents'),
+    ('contract.appendix', '_render_documents'),
+    ('sale.order', '_create_contracts'),
+}
+
+
+class ContractJob(models.Model):
+    """Heavy contract operation run in the background by a cron.
+
+    A job calls ``method`` on ``res_ids`` of ``model`` chunk by chunk, as the
+    user who enqueued it. Every chunk is committed with the progress
+    checkpoint (``done_count``), so a failed or interrupted job resumes from
+    the first unprocessed chunk. Failed chunks are retried with an
+    exponential backoff up to ``max_attempts`` times.
+
+    Only the (model, method) pairs of ``JOB_METHODS`` can be run, and jobs
+    are written by the server only (sudo): users can read them, retry or
+    cancel their own, and managers any of them.
+    """
+    _name = "contract.job"
+    _description = "Contract Background Job"
+    _order = "id desc"
+
+    name = fields.Char(string="Tác vụ", required=True, readonly=True)
+    model = fields.Char(string="Model", required=True, readonly=True)
+    method = fields.Char(string="Phương thức", required=True, readonly=True)
+    res_ids = fields.Json(string="Bản ghi", readonly=True)
+    kwargs = fields.Json(string="Tham số", readonly=True)
+    chunk_size = fields.Integer(string="Số bản ghi mỗi đợt", default=100, readonly=True)
+    user_id = fields.Many2one(
+        'res.users',
+        string="Người tạo",
+        required=True,
+        readonly=True,
+        default=lambda self: self.env.user
+    )
+    company_id = fields.Many2one(
+        'res.company',
+        string="Công ty",
+        required=True,
+        readonly=True,
+        default=lambda self: self.env.company
+    )
+
+    state = fields.Selection(
+        [
+            ('pending', 'Chờ chạy'),
+            ('running', 'Đang chạy'),
+            ('done', 'Hoàn thành'),
+            ('failed', 'Lỗi'),
+            ('cancelled', 'Hủy'),
+        ],
+        string="Trạng thái",
+        default='pending',
+        required=True,
+        readonly=True,
+        index=True
+    )
+    total_count = fields.Integer(string="Tổng số bản ghi", readonly=True)
+    done_count = fields.Integer(
+        string="Đã xử lý",
+        readonly=True,
+        help="Checkpoint: số bản ghi đã được commit, lần chạy sau tiếp tục từ đây."
+    )
+    progress = fields.Float(string="Tiến độ (%)", compute='_compute_progress')
+    attempts = fields.Integer(string="Số lần thử", readonly=True)
+    max_attempts = fields.Integer(string="Số lần thử tối đa", default=3, readonly=True)
+    next_attempt = fields.Datetime(string="Thử lại lúc", readonly=True)
+    started_at = fields.Datetime(string="Bắt đầu", readonly=True)
+    finished_at = fields.Datetime(string="Kết thúc", readonly=True)
+    duration = fields.Float(string="Thời gian chạy (giây)", readonly=True)
+    error = fields.Text(string="Lỗi", readonly=True)
+
+    @api.depends('done_count', 'total_count')
+    def _compute_progress(self):
+        for job in self:
+            job.progress = 100.0 * job.done_count / job.total_count if job.total_count else 0.0
+
+    # Enqueue API
+    @api.model
+    def _should_enqueue(self, records):
+        """Whether an action on ``records`` must run in the background.
+
+        Actions run inline inside a job, and for selections up to the
+        ``contract_mgmt.job_threshold`` system parameter (default 200).
+        """
+        if self.env.context.get('contract_job_id'):
+            return False
+        threshold = int(self.env['ir.config_parameter'].sudo().get_param(
+            'contract_mgmt.job_threshold', 200
+        ))
+        return len(records) > threshold
+
+    @api.model
+    def _enqueue(self, records, method, name, kwargs=None, chunk_size=100):
+        """Create a job calling ``records.<method>(**kwargs)`` chunk by chunk
+        and wake up the runner
+        """
+        if (records._name, method) not in JOB_METHODS:
+            raise ValueError("%s.%s cannot run as a contract job" % (records._name, method))
+        job = self.sudo().create({
+            'name': name,
+            'model': records._name,
+            'method': method,
+            'res_ids': records.ids,
+            'kwargs': kwargs or {},
+            'chunk_size': chunk_size,
+            'total_count': len(records),
+            'user_id': self.env.user.id,
+            'company_id': self.env.company.id,
+        })
+        self.env.ref('contract_mgmt.ir_cron_contract_job').sudo()._trigger()
+        return job
+
+    def _notification_action(self):
+        """Client action telling the user the work was queued"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': self.name,
+                'message': _('Đã đưa %s bản ghi vào hàng đợi xử lý nền.', self.total_count),
+                'type': 'info',
+                'sticky': False,
+            },
+        }
+
+    # Action methods
+    def _check_job_access(self):
+        """Jobs are changed by their user or by sales managers only"""
+        if self.env.is_superuser() or self.env.user.has_group('sales_team.group_sale_manager'):
+            return
+        if any(job.user_id != self.env.user for job in self):
+            raise AccessError(_('Bạn chỉ có thể thao tác trên tác vụ nền của mình.'))
+
+    def action_retry(self):
+        """Run failed or cancelled jobs again from their checkpoint"""
+        self._check_job_access()
+        self.sudo().filtered(lambda job: job.state in ('failed', 'cancelled')).write({
+            'state': 'pending',
+            'attempts': 0,
+            'next_attempt': False,
+            'error': False,
+        })
+        self.env.ref('contract_mgmt.ir_cron_contract_job').sudo()._trigger()
+
+    def action_cancel(self):
+        self._check_job_access()
+        self.sudo().filtered(lambda job: job.state == 'pending').write({'state': 'cancelled'})
+
+    # Runner
+    @api.model
+    def _cron_run_jobs(self):
+        """Run due jobs until ``contract_mgmt.job_time_limit`` seconds are spent"""
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        time_limit = int(self.env['ir.config_parameter'].sudo().get_param(
+            'contract_mgmt.job_time_limit', DEFAULT_TIME_LIMIT
+        ))
+        deadline = time.monotonic() + time_limit
+        # the cron never runs twice at once: running jobs were interrupted
+        self.search([('state', '=', 'running')]).write({'state': 'pending'})
+        while time.monotonic() < deadline:
+            self.env.cr.execute(SQL(
+                """
+                SELECT id FROM contract_job
+                 WHERE state = 'pending'
+                   AND (next_attempt IS NULL OR next_attempt <= (now() AT TIME ZONE 'UTC'))
+              ORDER BY id
+                 LIMIT 1
+                   FOR UPDATE SKIP LOCKED
+                """
+            ))
+            row = self.env.cr.fetchone()
+            if not row:
+                return
+            self.browse(row[0])._run(deadline, auto_commit)
+        # time is up with work left: continue in a new cron run
+        self.env.ref('contract_mgmt.ir_cron_contract_job')._trigger()
+
+    def _run(self, deadline, auto_commit=True):
+        self.ensure_one()
+        if (self.model, self.method) not in JOB_METHODS:
+            _logger.warning("Contract job %s refused: %s.%s is not a job method", self.id, self.model, self.method)
+            self.write({
+                'state': 'failed',
+                'finished_at': fields.Datetime.now(),
+                'error': _('%(model)s.%(method)s không được phép chạy nền.', model=self.model, method=self.method),
+            })
+            if auto_commit:
+                self.env.cr.commit()
+            return
+        self.write({
+            'state': 'running',
+            'started_at': self.started_at or fields.Datetime.now(),
+        })
+        if auto_commit:
+            self.env.cr.commit()
+
+        records = self.env[self.model].with_user(self.user_id).with_company(self.company_id).with_context(
+            lang=self.user_id.lang,
+            contract_job_id=self.id,
+        )
+        started = time.perf_counter()
+        while self.done_count < self.total_count:
+            chunk = self.res_ids[self.done_count:self.done_count + self.chunk_size]
+            try:
+                with self.env.cr.savepoint():
+                    getattr(records.browse(chunk).exists(), self.method)(**(self.kwargs or {}))
+                    self.env.flush_all()
+            except Exception as e:
+                _logger.warning("Contract job %s failed at record %s", self.id, self.done_count, exc_info=True)
+                self.env.invalidate_all()
+                attempts = self.attempts + 1
+                next_attempt = fields.Datetime.now() + timedelta(minutes=2 ** attempts)
+                self.write({
+                    'state': 'failed' if attempts >= self.max_attempts else 'pending',
+                    'attempts': attempts,
+                    'next_attempt': next_attempt,
+                    'error': str(e),
+                    'duration': self.duration + time.perf_counter() - started,
+                })
+                if self.state == 'pending':
+                    self.env.ref('contract_mgmt.ir_cron_contract_job')._trigger(at=next_attempt)
+                if auto_commit:
+                    self.env.cr.commit()
+                return
+            self.write({
+                'done_count': self.done_count + len(chunk),
+                'duration': self.duration + time.perf_counter() - started,
+            })
+            started = time.perf_counter()
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+            if time.monotonic() >= deadline and self.done_count < self.total_count:
+                self.write({'state': 'pending'})
+                return
+        self.write({'state': 'done', 'finished_at': fields.Datetime.now(), 'error': False})
+        if auto_commit:
+            self.env.cr.commit()
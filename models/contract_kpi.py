@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+import functools
+import json
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import api, fields, models, _
+from odoo.tools import SQL, split_every
+
+PENDING_KEY = 'contract_mgmt.kpi'
+# Contracts expiring within these numbers of days are counted (cumulative)
+EXPIRY_BUCKETS = (30, 60, 90)
+
+
+class ContractKpi(models.Model):
+    """Contract KPI snapshot read by the dashboard.
+
+    Every contract and appendix books its contributions (count and amount
+    per KPI key) in ``contract.kpi.ledger``. Records touched by a
+    transaction are collected by ``_mark_dirty``; before commit their current
+    contributions are compared with the booked ones and only the differences
+    are added to the snapshot rows. ``_cron_reconcile`` recomputes all
+    contributions daily (expiry windows move with the date) and rebuilds the
+    snapshot from the ledger. Amounts are booked in the company currency.
+    """
+    _name = "contract.kpi"
+    _description = "Contract KPI Snapshot"
+    _order = "kpi, amount desc, count desc, id"
+    _sql_constraints = [
+        ('kpi_key_uniq', 'unique(company_id, kpi, key)', 'Chỉ số đã tồn tại.'),
+    ]
+
+    company_id = fields.Many2one('res.company', string="Công ty", required=True, readonly=True)
+    kpi = fields.Selection(
+        [
+            ('state', 'Hợp đồng theo trạng thái'),
+            ('expiry', 'Hợp đồng sắp hết hạn'),
+            ('appendix', 'Phụ lục chờ hiệu lực'),
+            ('hospital', 'Bệnh viện (HĐ hiệu lực)'),
+        ],
+        string="Chỉ số",
+        required=True,
+        readonly=True
+    )
+    key = fields.Char(string="Khóa", required=True, readonly=True)
+    partner_id = fields.Many2one('res.partner', string="Bệnh viện", readonly=True)
+    name = fields.Char(string="Nhóm", compute='_compute_name')
+    count = fields.Integer(string="Số lượng", readonly=True)
+    currency_id = fields.Many2one(related='company_id.currency_id')
+    amount = fields.Monetary(string="Giá trị", currency_field='currency_id', readonly=True)
+
+    @api.depends('kpi', 'key', 'partner_id')
+    def _compute_name(self):
+        states = dict(self.env['contract.contract']._fields['state']._description_selection(self.env))
+        for rec in self:
+            if rec.kpi == 'state':
+                rec.name = states.get(rec.key, rec.key)
+            elif rec.kpi == 'expiry':
+                rec.name = _('Hết hạn trong %s ngày', rec.key)
+            elif rec.kpi == 'hospital':
+                rec.name = rec.partner_id.display_name
+            else:
+                rec.name = _('Chờ hiệu lực')
+
+    # Contributions
+    @api.model
+    def _contract_entries(self, ids):
+        """{contract id: [[company, kpi, key, count, amount]]}"""
+        today = fields.Date.today()
+        # effective value in company currency, each amount at its own date;
+        # appendix effects count adjustments as a difference, like amount_effective
+        self.env.cr.execute(SQL(
+            """
+            SELECT c.id, c.company_id, c.state, c.partner_company_id,
+                   COALESCE(c.amount_total_company, 0) + COALESCE((
+                       SELECT sum(a.amount_effect_company)
+                         FROM contract_appendix a
+                        WHERE a.contract_id = c.id AND a.state = 'active' AND a.affects_contract_total
+                   ), 0),
+                   c.effective_end_date
+              FROM contract_contract c
+             WHERE c.id IN %s
+            """,
+            tuple(ids),
+        ))
+        entries = {}
+        for res_id, company_id, state, partner_id, amount, end_date in self.env.cr.fetchall():
+            amount = amount or 0.0
+            rows = entries[res_id] = [[company_id, 'state', state, 1, amount]]
+            if state != 'active':
+                continue
+            if partner_id:
+                rows.append([company_id, 'hospital', str(partner_id), 1, amount])
+            if end_date and end_date >= today:
+                rows.extend(
+                    [company_id, 'expiry', str(days), 1, amount]
+                    for days in EXPIRY_BUCKETS
+                    if end_date <= today + timedelta(days=days)
+                )
+        return entries
+
+    @api.model
+    def _appendix_entries(self, ids):
+        """{appendix id: [[company, kpi, key, count, amount]]}"""
+        self.env.cr.execute(SQL(
+            """
+            SELECT a.id, c.company_id, a.amount_effect_company
+              FROM contract_appendix a
+              JOIN contract_contract c ON c.id = a.contract_id
+             WHERE a.id IN %s AND a.state = 'draft'
+            """,
+            tuple(ids),
+        ))
+        return {
+            res_id: [[company_id, 'appendix', 'draft', 1, amount or 0.0]]
+            for res_id, company_id, amount in self.env.cr.fetchall()
+        }
+
+    # Incremental refresh
+    @api.model
+    def _mark_dirty(self, model, ids):
+        """Refresh the contributions of ``ids`` before the transaction commits"""
+        ids = [res_id for res_id in ids if isinstance(res_id, int)]
+        if not ids:
+            return
+        cr = self.env.cr
+        pending = cr.precommit.data.get(PENDING_KEY)
+        if pending is None:
+            pending = cr.precommit.data[PENDING_KEY] = defaultdict(set)
+            cr.precommit.add(functools.partial(self.sudo()._apply_pending, pending))
+        pending[model].update(ids)
+
+    def _apply_pending(self, pending):
+        for model, ids in pending.items():
+            for chunk in split_every(1000, sorted(ids)):
+                self._apply(model, list(chunk))
+
+    @api.model
+    def _apply(self, model, ids):
+        """Add the contribution changes of records ``ids`` of ``model`` to the
+        snapshot and book their new contributions
+        """
+        cr = self.env.cr
+        if model == 'contract.contract':
+            new = self._contract_entries(ids)
+        else:
+            new = self._appendix_entries(ids)
+        cr.execute(SQL(
+            "SELECT res_id, entries FROM contract_kpi_ledger WHERE res_model = %s AND res_id IN %s",
+            model, tuple(ids),
+        ))
+        old = dict(cr.fetchall())
+
+        deltas = defaultdict(lambda: [0, 0.0])
+        for res_id in ids:
+            for sign, entries in ((-1, old.get(res_id)), (1, new.get(res_id))):
+                for company_id, kpi, key, count, amount in entries or ():
+                    delta = deltas[company_id, kpi, key]
+                    delta[0] += sign * count
+                    delta[1] += sign * amount
+        deltas = {group: delta for group, delta in deltas.items() if delta[0] or delta[1]}
+        if deltas:
+            # the snapshot first: concurrent transactions queue on its rows
+            cr.execute(SQL(
+                """
+                INSERT INTO contract_kpi (company_id, kpi, key, partner_id, count, amount, write_date)
+                VALUES %s
+                ON CONFLICT (company_id, kpi, key) DO UPDATE
+                   SET count = contract_kpi.count + EXCLUDED.count,
+                       amount = contract_kpi.amount + EXCLUDED.amount,
+                       write_date = EXCLUDED.write_date
+                """,
+                SQL(", ").join(
+                    SQL(
+                        "(%s, %s, %s, %s, %s, %s, now() AT TIME ZONE 'UTC')",
+                        company_id, kpi, key, int(key) if kpi == 'hospital' else None, count, amount,
+                    )
+                    for (company_id, kpi, key), (count, amount) in sorted(deltas.items())
+                ),
+            ))
+            cr.execute(SQL("DELETE FROM contract_kpi WHERE count = 0"))
+
+        changed = [res_id for res_id in ids if old.get(res_id) != new.get(res_id)]
+        booked = [res_id for res_id in changed if new.get(res_id)]
+        if booked:
+            cr.execute(SQL(
+                """
+                INSERT INTO contract_kpi_ledger (res_model, res_id, entries)
+                VALUES %s
+                ON CONFLICT (res_model, res_id) DO UPDATE SET entries = EXCLUDED.entries
+                """,
+                SQL(", ").join(
+                    SQL("(%s, %s, %s::jsonb)", model, res_id, json.dumps(new[res_id]))
+                    for res_id in booked
+                ),
+            ))
+        cleared = [res_id for res_id in changed if not new.get(res_id)]
+        if cleared:
+            cr.execute(SQL(
+                "DELETE FROM contract_kpi_ledger WHERE res_model = %s AND res_id IN %s",
+                model, tuple(cleared),
+            ))
+
+    # Full reconcile
+    @api.model
+    def _cron_reconcile(self):
+        """Recompute the contributions of all contracts and appendices, then
+        rebuild the snapshot from the ledger.
+
+        Records are processed in chunks of ``contract_mgmt.kpi_batch_size``
+        (system parameter), each chunk committed.
+        """
+        batch_size = int(self.env['ir.config_parameter'].sudo().get_param(
+            'contract_mgmt.kpi_batch_size', 1000
+        ))
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        cr = self.env.cr
+        self.env.flush_all()
+        for model, table in (('contract.contract', 'contract_contract'), ('contract.appendix', 'contract_appendix')):
+            # deleted records still booked in the ledger are cleared as well
+            cr.execute(SQL(
+                """
+                SELECT id FROM %s
+                 UNION
+                SELECT res_id FROM contract_kpi_ledger WHERE res_model = %s
+                 ORDER BY 1
+                """,
+                SQL.identifier(table), model,
+            ))
+            for ids in split_every(batch_size, [res_id for res_id, in cr.fetchall()]):
+                self._apply(model, list(ids))
+                if auto_commit:
+                    cr.commit()
+
+        # Writers wait on the snapshot while it is rebuilt from the ledger
+        cr.execute(SQL("LOCK TABLE contract_kpi IN EXCLUSIVE MODE"))
+        cr.execute(SQL("DELETE FROM contract_kpi"))
+        cr.execute(SQL(
+            """
+            INSERT INTO contract_kpi (company_id, kpi, key, partner_id, count, amount, write_date)
+            SELECT (e->>0)::int, e->>1, e->>2,
+                   CASE WHEN e->>1 = 'hospital' THEN (e->>2)::int END,
+                   sum((e->>3)::int), sum((e->>4)::numeric), now() AT TIME ZONE 'UTC'
+              FROM contract_kpi_ledger, jsonb_array_elements(entries) AS e
+          GROUP BY 1, 2, 3
+            HAVING sum((e->>3)::int) <> 0
+            """
+        ))
+        self.env.invalidate_all()
+
+
+class ContractKpiLedger(models.Model):
+    """KPI contributions booked for one contract or appendix"""
+    _name = "contract.kpi.ledger"
+    _description = "Contract KPI Ledger"
+    _log_access = False
+    _sql_constraints = [
+        ('record_uniq', 'unique(res_model, res_id)', 'Bản ghi đã có trong sổ chỉ số.'),
+    ]
+
+    res_model = fields.Char(string="Model", required=True)
+    res_id = fields.Many2oneReference(string="ID", model_field='res_model', required=True)
+    entries = fields.Json(string="Đóng góp")
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from odoo import api, fields, models
 
+from ..tools import CompanyRates, instrumented, profiled
+
 
 class ContractLine(models.Model):
     _name = "contract.line"
@@ -13,13 +15,20 @@ class ContractLine(models.Model):
         'contract.contract',
         string="Hợp đồng",
         required=True,
-        ondelete='cascade'
+        ondelete='cascade',
+        index=True
+    )
+    active = fields.Boolean(
+        related='contract_id.active',
+        store=True,
+        string="Đang dùng"
     )
     
     product_id = fields.Many2one(
         'product.product',
         string="Sản phẩm",
-        required=True
+        required=True,
+        index=True
     )
     
     name = fields.Text(
@@ -79,11 +88,32 @@ class ContractLine(models.Model):
         currency_field='currency_id'
     )
     
+    company_currency_id = fields.Many2one(
+        related='contract_id.company_id.currency_id',
+        string="Tiền tệ công ty"
+    )
+    price_subtotal_company = fields.Monetary(
+        string="Thành tiền (tiền tệ công ty)",
+        compute='_compute_price_subtotal_company',
+        store=True,
+        currency_field='company_currency_id'
+    )
+    
     # Link to sale order line
     sale_order_line_id = fields.Many2one(
         'sale.order.line',
         string="Dòng SO nguồn",
-        ondelete='set null'
+        ondelete='set null',
+        index='btree_not_null'
+    )
+    sale_order_line_ids = fields.Many2many(
+        'sale.order.line',
+        'contract_line_sale_order_line_rel',
+        'contract_line_id',
+        'sale_order_line_id',
+        string="Các dòng SO nguồn",
+        copy=False,
+        help="Mọi dòng SO đã nhập vào dòng này (nhiều dòng khi nhập gộp)."
     )
     
     sale_order_id = fields.Many2one(
@@ -95,14 +125,45 @@ class ContractLine(models.Model):
     )
 
     @api.depends('quantity', 'price_unit')
+    @profiled
     def _compute_price_subtotal(self):
         for line in self:
             line.price_subtotal = line.quantity * line.price_unit
 
+    @api.depends('price_subtotal', 'contract_id.currency_id', 'contract_id.company_id', 'contract_id.contract_date')
+    @profiled
+    def _compute_price_subtotal_company(self):
+        rates = CompanyRates(self.env)
+        contracts = self.contract_id
+        rates.prefetch((c.currency_id, c.company_id, c.contract_date) for c in contracts)
+        for line in self:
+            contract = line.contract_id
+            line.price_subtotal_company = rates.convert(
+                line.price_subtotal, contract.currency_id, contract.company_id, contract.contract_date,
+            )
+
     @api.onchange('product_id')
+    @instrumented
     def _onchange_product_id(self):
         if self.product_id:
             self.name = self.product_id.display_name
             self.uom_id = self.product_id.uom_id
             self.price_unit = self.product_id.list_price
 
+    # CRUD overrides
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        self.env['contract.kpi']._mark_dirty('contract.contract', lines.contract_id.ids)
+        return lines
+
+    def write(self, vals):
+        contracts = self.contract_id
+        res = super().write(vals)
+        self.env['contract.kpi']._mark_dirty('contract.contract', (contracts | self.contract_id).ids)
+        return res
+
+    def unlink(self):
+        self.env['contract.kpi']._mark_dirty('contract.contract', self.contract_id.ids)
+        return super().unlink()
+
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from odoo import api, fields, models
+from odoo.tools import SQL, split_every
+
+
+class ContractPartnerRefresh(models.Model):
+    """Hospitals and departments whose contact data changed.
+
+    The stored contact fields of their contracts (``partner_phone``,
+    ``partner_email``, ``department_representative``, and ``search_text``
+    with the hospital name) only depend on the partner ids, so that saving a
+    partner never recomputes thousands of contracts. Partners are queued
+    instead and their contracts, archived ones included, refreshed in chunks
+    by ``_cron_refresh_contracts``; the ``search_text`` of their appendices
+    follows.
+    """
+    _name = "contract.partner.refresh"
+    _description = "Contract Partner Refresh Queue"
+    _log_access = False
+    _sql_constraints = [
+        ('partner_uniq', 'unique(partner_id)', 'Đối tác đã có trong hàng đợi.'),
+    ]
+
+    partner_id = fields.Many2one(
+        'res.partner',
+        string="Đối tác",
+        required=True,
+        ondelete='cascade'
+    )
+
+    @api.model
+    def _enqueue(self, partner_ids):
+        """Queue the partners used on contracts and wake up the cron"""
+        if not partner_ids:
+            return
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO contract_partner_refresh (partner_id)
+            SELECT p.id
+              FROM unnest(%s::int[]) AS p(id)
+             WHERE EXISTS (SELECT 1 FROM contract_contract c WHERE c.partner_company_id = p.id)
+                OR EXISTS (SELECT 1 FROM contract_contract c WHERE c.partner_department_id = p.id)
+            ON CONFLICT (partner_id) DO NOTHING
+            """,
+            list(set(partner_ids)),
+        ))
+        if self.env.cr.rowcount:
+            self.env.ref('contract_mgmt.ir_cron_contract_partner_refresh').sudo()._trigger()
+
+    @api.model
+    def _cron_refresh_contracts(self):
+        """Recompute the contact fields of the contracts of queued partners.
+
+        Partners are dequeued ``contract_mgmt.partner_refresh_batch_size``
+        (system parameter) at a time with ``SKIP LOCKED``, their contracts are
+        recomputed in chunks of the same size, and every dequeued batch is
+        committed with its contracts.
+        """
+        batch_size = int(self.env['ir.config_parameter'].sudo().get_param(
+            'contract_mgmt.partner_refresh_batch_size', 1000
+        ))
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        Contract = self.env['contract.contract'].with_context(active_test=False)
+        contact_fields = [
+            Contract._fields[name]
+            for name in ('partner_phone', 'partner_email', 'department_representative', 'search_text')
+        ]
+        appendix_search_text = self.env['contract.appendix']._fields['search_text']
+        refreshed = 0
+        while True:
+            self.env.cr.execute(SQL(
+                """
+                DELETE FROM contract_partner_refresh
+                 WHERE id IN (
+                     SELECT id FROM contract_partner_refresh
+                      ORDER BY id
+                      LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                 )
+             RETURNING partner_id
+                """,
+                batch_size,
+            ))
+            partner_ids = [partner_id for partner_id, in self.env.cr.fetchall()]
+            if not partner_ids:
+                break
+            contracts = Contract.search([
+                '|',
+                ('partner_company_id', 'in', partner_ids),
+                ('partner_department_id', 'in', partner_ids),
+            ], order='id')
+            for ids in split_every(batch_size, contracts.ids):
+                batch = Contract.browse(ids)
+                for field in contact_fields:
+                    self.env.add_to_compute(field, batch)
+                # appendices embed the search text of their contract
+                self.env.add_to_compute(appendix_search_text, batch.appendix_ids)
+                batch.flush_recordset([field.name for field in contact_fields])
+                batch.appendix_ids.flush_recordset(['search_text'])
+                self.env.invalidate_all()
+            refreshed += len(contracts)
+            if auto_commit:
+                self.env.cr.commit()
+        return refreshed
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+
+from odoo import api, fields, models, _
+from odoo.tools import SQL
+
+
+class ContractPrintableMixin(models.AbstractModel):
+    """PDF of contracts and appendices, cached as attachments.
+
+    ``document_hash`` is a stored digest of everything the report prints; the
+    report action saves its output as ``<number>-<document_hash>.pdf`` with
+    ``attachment_use``, so a PDF is rendered again only after a printed value
+    changed. Inheriting models list the printed fields in
+    ``_document_depends`` and return their values from ``_document_payload``.
+    """
+    _name = "contract.printable.mixin"
+    _description = "Contract Printable Mixin"
+
+    # Report action rendering the records and field holding their number
+    _document_report = None
+    _document_number_field = None
+    # Field paths printed by the report
+    _document_depends = ()
+
+    document_hash = fields.Char(
+        string="Phiên bản tài liệu",
+        compute='_compute_document_hash',
+        store=True,
+        copy=False,
+        readonly=True
+    )
+
+    @api.depends(lambda self: self._document_depends)
+    def _compute_document_hash(self):
+        for rec in self:
+            data = json.dumps(rec._document_payload(), default=str, sort_keys=True, ensure_ascii=False)
+            rec.document_hash = hashlib.sha1(data.encode()).hexdigest()[:16]
+
+    def _document_payload(self):
+        """JSON-serializable values printed by the report for one record"""
+        raise NotImplementedError()
+
+    def _render_documents(self):
+        """Render the records missing from the PDF cache in one wkhtmltopdf
+        pass; the report stores one attachment per record
+        """
+        if self:
+            self.env['ir.actions.report']._render_qweb_pdf(self._document_report, self.ids)
+
+    def action_render_documents(self):
+        """Prepare the PDF of the selected records in a background job"""
+        job = self.env['contract.job']._enqueue(
+            self, '_render_documents', _('Tạo PDF'), chunk_size=50,
+        )
+        return job._notification_action()
+
+    @api.autovacuum
+    def _gc_document_cache(self):
+        """Delete the cached PDFs of outdated document versions"""
+        if self._abstract:
+            return
+        number = SQL.identifier('r', self._document_number_field)
+        self.env.cr.execute(SQL(
+            """
+            SELECT a.id
+              FROM ir_attachment a
+              JOIN %(table)s r ON r.id = a.res_id
+             WHERE a.res_model = %(model)s
+               AND a.res_field IS NULL
+               AND a.mimetype = 'application/pdf'
+               AND starts_with(a.name, %(number)s || '-')
+               AND a.name <> %(number)s || '-' || r.document_hash || '.pdf'
+            """,
+            table=SQL.identifier(self._table),
+            model=self._name,
+            number=number,
+        ))
+        attachment_ids = [row[0] for row in self.env.cr.fetchall()]
+        self.env['ir.attachment'].sudo().browse(attachment_ids).unlink()
@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
 from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+
+from ..tools import instrumented, profiled
 
 
 class SaleOrder(models.Model):
@@ -105,58 +109,102 @@ class SaleOrder(models.Model):
         'contract.contract',
         string="Hợp đồng",
         readonly=True,
-        copy=False
+        copy=False,
+        index='btree_not_null'
     )
 
-    # Action methods
-    def action_create_contract(self):
-        """Create contract from quotation"""
+    # Business methods
+    def _prepare_contract_vals(self):
+        """Values of the contract created from this quotation"""
         self.ensure_one()
-        
-        if self.contract_id:
-            return {
-                'name': _('Hợp đồng'),
-                'type': 'ir.actions.act_window',
-                'res_model': 'contract.contract',
-                'res_id': self.contract_id.id,
-                'view_mode': 'form',
-                'target': 'current',
-            }
-        
-        # Create new contract
-        contract_vals = {
+        return {
             'name': self.quotation_title or self.name,
             'partner_company_id': self.partner_id.id,
             'partner_department_id': self.department_id.id if self.department_id else False,
             'sale_order_id': self.id,
+            'company_signatory_id': self.user_id.id or self.env.user.id,
             'contract_date': fields.Date.today(),
             'end_date': self.validity_date or fields.Date.today(),
             'service_category': 'supply' if self.quotation_type == 'goods' else 'service',
         }
-        
-        contract = self.env['contract.contract'].create(contract_vals)
-        
-        # Create contract lines from SO lines
-        for line in self.order_line:
-            self.env['contract.line'].create({
-                'contract_id': contract.id,
-                'product_id': line.product_id.id,
-                'name': line.name,
-                'uom_id': line.product_uom.id,
-                'quantity': line.product_uom_qty,
-                'price_unit': line.price_unit,
-                'sale_order_line_id': line.id,
-            })
-        
-        # Link contract to SO
-        self.contract_id = contract.id
-        
+
+    @profiled
+    def _create_contracts(self):
+        """Create the contracts of quotations that have none yet.
+
+        Contracts and their lines are each created by one batched ``create``
+        and linked back to the quotations by a single UPDATE.
+        """
+        orders = self.filtered(lambda order: not order.contract_id)
+        if not orders:
+            return self.env['contract.contract']
+
+        contracts = self.env['contract.contract'].create([
+            order._prepare_contract_vals() for order in orders
+        ])
+        self.env['contract.line'].create([
+            line._prepare_contract_line_vals(contract)
+            for order, contract in zip(orders, contracts)
+            for line in order.order_line
+            if not line.display_type
+        ])
+        orders._link_contracts(contracts)
+        return contracts
+
+    def _link_contracts(self, contracts):
+        """Set contract_id of each order to the matching contract in one query"""
+        self.flush_recordset(['contract_id'])
+        self.env.cr.execute(SQL(
+            """
+            UPDATE sale_order AS so
+               SET contract_id = v.contract_id,
+                   write_uid = %s,
+                   write_date = %s
+              FROM (VALUES %s) AS v(id, contract_id)
+             WHERE so.id = v.id
+            """,
+            self.env.uid,
+            self.env.cr.now(),
+            SQL(", ").join(
+                SQL("(%s, %s)", order.id, contract.id)
+                for order, contract in zip(self, contracts)
+            ),
+        ))
+        self.invalidate_recordset(['contract_id', 'write_uid', 'write_date'])
+        self.modified(['contract_id'])
+
+    # Action methods
+    @instrumented
+    def action_create_contract(self):
+        """Create contracts from quotations, or open the existing ones"""
+        unconfirmed = self.filtered(
+            lambda order: not order.contract_id and order.state not in ('sale', 'done')
+        )
+        if unconfirmed:
+            raise UserError(_(
+                'Chỉ có thể tạo hợp đồng từ đơn bán đã xác nhận: %s'
+            ) % ', '.join(unconfirmed.mapped('name')))
+
+        Job = self.env['contract.job']
+        if Job._should_enqueue(self.filtered(lambda order: not order.contract_id)):
+            return Job._enqueue(self, '_create_contracts', _('Tạo hợp đồng từ báo giá'))._notification_action()
+        self._create_contracts()
+        contracts = self.contract_id
+        if len(contracts) == 1:
+            return {
+                'name': _('Hợp đồng'),
+                'type': 'ir.actions.act_window',
+                'res_model': 'contract.contract',
+                'res_id': contracts.id,
+                'view_mode': 'form',
+                'target': 'current',
+            }
         return {
             'name': _('Hợp đồng'),
             'type': 'ir.actions.act_window',
             'res_model': 'contract.contract',
-            'res_id': contract.id,
-            'view_mode': 'form',
+            'view_mode': 'list,form',
+            'domain': [('id', 'in', contracts.ids)],
             'target': 'current',
         }
 
@@ -169,3 +217,20 @@ class SaleOrder(models.Model):
         })
         return result
 
+
+class SaleOrderLine(models.Model):
+    _inherit = "sale.order.line"
+
+    def _prepare_contract_line_vals(self, contract):
+        """Values of the contract line created from this order line"""
+        self.ensure_one()
+        return {
+            'contract_id': contract.id,
+            'product_id': self.product_id.id,
+            'name': self.name,
+            'uom_id': self.product_uom.id,
+            'quantity': self.product_uom_qty,
+            'price_unit': self.price_unit,
+            'sale_order_line_id': self.id,
+            'sale_order_line_ids': [(4, self.id)],
+        }
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+
+# Partner fields copied on contracts of the partner itself
+CONTACT_FIELDS = {'name', 'phone', 'email'}
+# Contact fields deciding the representative of the parent department
+REPRESENTATIVE_FIELDS = {'name', 'type', 'parent_id', 'active'}
+
+
+class ResPartner(models.Model):
+    _inherit = 'res.partner'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        partners = super().create(vals_list)
+        self.env['contract.partner.refresh']._enqueue(partners.parent_id.ids)
+        return partners
+
+    def write(self, vals):
+        parents = self.parent_id if REPRESENTATIVE_FIELDS & vals.keys() else self.browse()
+        res = super().write(vals)
+        partner_ids = []
+        if CONTACT_FIELDS & vals.keys():
+            partner_ids += self.ids
+        if REPRESENTATIVE_FIELDS & vals.keys():
+            partner_ids += (parents | self.parent_id).ids
+        self.env['contract.partner.refresh']._enqueue(partner_ids)
+        return res
+
+    def unlink(self):
+        parent_ids = self.parent_id.ids
+        res = super().unlink()
+        self.env['contract.partner.refresh']._enqueue(parent_ids)
+        return res
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+from odoo import fields, models, tools
+from odoo.tools import SQL
+
+
+class ContractReport(models.Model):
+    """Contract value by hospital, product and month.
+
+    One row per contract line and per line of an active appendix, so totals
+    include the changes made by appendices; adjustments count as the
+    difference with the values they replace. Aggregation is done by
+    PostgreSQL on the ``contract_report`` view.
+    """
+    _name = "contract.report"
+    _description = "Contract Analysis"
+    _auto = False
+    _rec_name = 'contract_id'
+    _order = 'date desc'
+
+    line_type = fields.Selection(
+        [
+            ('contract', 'Hợp đồng'),
+            ('appendix', 'Phụ lục'),
+        ],
+        string="Nguồn",
+        readonly=True
+    )
+    contract_id = fields.Many2one('contract.contract', string="Hợp đồng", readonly=True)
+    appendix_id = fields.Many2one('contract.appendix', string="Phụ lục", readonly=True)
+    date = fields.Date(string="Ngày", readonly=True)
+    partner_company_id = fields.Many2one('res.partner', string="Bệnh viện", readonly=True)
+    partner_department_id = fields.Many2one('res.partner', string="Khoa / Phòng", readonly=True)
+    product_id = fields.Many2one('product.product', string="Sản phẩm/Dịch vụ", readonly=True)
+    product_tmpl_id = fields.Many2one('product.template', string="Mẫu sản phẩm", readonly=True)
+    categ_id = fields.Many2one('product.category', string="Nhóm sản phẩm", readonly=True)
+    uom_id = fields.Many2one('uom.uom', string="Đơn vị tính", readonly=True)
+    service_category = fields.Selection(
+        selection=lambda self: self.env['contract.contract']._fields['service_category'].selection,
+        string="Loại hợp đồng",
+        readonly=True
+    )
+    state = fields.Selection(
+        selection=lambda self: self.env['contract.contract']._fields['state'].selection,
+        string="Trạng thái hợp đồng",
+        readonly=True
+    )
+    responsible_user_id = fields.Many2one('res.users', string="Nhân viên phụ trách", readonly=True)
+    company_id = fields.Many2one('res.company', string="Pháp nhân phát hành", readonly=True)
+    currency_id = fields.Many2one('res.currency', string="Tiền tệ", readonly=True)
+    quantity = fields.Float(string="Số lượng", digits='Product Unit of Measure', readonly=True)
+    price_subtotal = fields.Monetary(string="Giá trị", currency_field='currency_id', readonly=True)
+
+    def _select_contract_lines(self):
+        return SQL(
+            """
+            SELECT l.id * 2 AS id,
+                   'contract' AS line_type,
+                   c.id AS contract_id,
+                   NULL::integer AS appendix_id,
+                   c.contract_date AS date,
+                   l.product_id,
+                   l.uom_id,
+                   l.quantity,
+                   l.price_subtotal
+              FROM contract_line l
+              JOIN contract_contract c ON c.id = l.contract_id
+            """
+        )
+
+    def _select_appendix_lines(self):
+        # the stored effect of each line, as replayed by the contract:
+        # removed goods count negatively and an adjustment counts as the
+        # difference with what it replaces
+        return SQL(
+            """
+            SELECT al.id * 2 + 1 AS id,
+                   'appendix' AS line_type,
+                   a.contract_id,
+                   a.id AS appendix_id,
+                   COALESCE(a.effective_date, c.contract_date) AS date,
+                   al.product_id,
+                   al.uom_id,
+                   al.quantity_effect AS quantity,
+                   al.price_subtotal_effect AS price_subtotal
+              FROM contract_appendix_line al
+              JOIN contract_appendix a ON a.id = al.appendix_id
+              JOIN contract_contract c ON c.id = a.contract_id
+             WHERE a.state = 'active' AND a.affects_contract_total
+            """
+        )
+
+    def _query(self):
+        return SQL(
+            """
+            SELECT r.id,
+                   r.line_type,
+                   r.contract_id,
+                   r.appendix_id,
+                   r.date,
+                   c.partner_company_id,
+                   c.partner_department_id,
+                   r.product_id,
+                   p.product_tmpl_id,
+                   t.categ_id,
+                   r.uom_id,
+                   c.service_category,
+                   c.state,
+                   c.responsible_user_id,
+                   c.company_id,
+                   c.currency_id,
+                   r.quantity,
+                   r.price_subtotal
+              FROM (%s UNION ALL %s) r
+              JOIN contract_contract c ON c.id = r.contract_id
+         LEFT JOIN product_product p ON p.id = r.product_id
+         LEFT JOIN product_template t ON t.id = p.product_tmpl_id
+            """,
+            self._select_contract_lines(),
+            self._select_appendix_lines(),
+        )
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(SQL(
+            "CREATE OR REPLACE VIEW %s AS (%s)",
+            SQL.identifier(self._table),
+            self._query(),
+        ))
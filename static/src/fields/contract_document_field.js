@@ -0,0 +1,20 @@
+/** @odoo-module **/
+
+import { registry } from "@web/core/registry";
+import {
+    Many2ManyBinaryField,
+    many2ManyBinaryField,
+} from "@web/views/fields/many2many_binary/many2many_binary_field";
+
+/**
+ * many2many_binary uploading through the streaming, deduplicating route of
+ * the contract documents.
+ */
+export class ContractDocumentField extends Many2ManyBinaryField {
+    static template = "contract_mgmt.ContractDocumentField";
+}
+
+registry.category("fields").add("contract_document_binary", {
+    ...many2ManyBinaryField,
+    component: ContractDocumentField,
+});
@@ -1,3 +1,8 @@
 # -*- coding: utf-8 -*-
 from . import test_contract
-
+from . import test_contract_appendix
+from . import test_quotation
+from . import test_contract_import
+from . import test_contract_report
+from . import test_index_plan
+from . import test_performance
@@ -2,6 +2,9 @@
 from odoo.tests.common import TransactionCase
 from odoo.exceptions import ValidationError
 from datetime import date, timedelta
+from io import BytesIO
+
+from odoo.addons.contract_mgmt.tools.metrics import METRICS, render
 
 
 class TestContract(TransactionCase):
@@ -82,6 +85,76 @@ class TestContract(TransactionCase):
         # Should find the contact person
         self.assertTrue(contract.department_representative)
     
+    def test_department_representative_batch(self):
+        """Test department representatives of many contracts stay in sync"""
+        other_department = self.env['res.partner'].create({
+            'name': 'Radiology Department',
+            'parent_id': self.hospital.id,
+            'type': 'contact',
+        })
+        contracts = self.env['contract.contract'].create([{
+            'name': 'Contract %s' % department.name,
+            'partner_company_id': self.hospital.id,
+            'partner_department_id': department.id,
+            'company_signatory_id': self.env.user.id,
+            'service_category': 'supply',
+            'contract_date': date.today(),
+            'end_date': date.today() + timedelta(days=365),
+        } for department in (self.department, other_department)])
+
+        # Without contacts, the department itself is the representative
+        self.assertEqual(
+            contracts.mapped('department_representative'),
+            ['Cardiology Department', 'Radiology Department'],
+        )
+
+        # A new department contact is picked up by the refresh cron
+        manager = self.env['res.partner'].create({
+            'name': 'Radiology Manager',
+            'parent_id': other_department.id,
+            'type': 'contact',
+        })
+        self.env['contract.partner.refresh']._cron_refresh_contracts()
+        self.assertEqual(contracts[1].department_representative, 'Radiology Manager')
+        self.assertEqual(contracts[0].department_representative, 'Cardiology Department')
+
+        manager.name = 'Radiology Head'
+        self.env['contract.partner.refresh']._cron_refresh_contracts()
+        self.assertEqual(contracts[1].department_representative, 'Radiology Head')
+
+    def test_partner_contact_propagation(self):
+        """Test partner contact changes reach contracts through the queue only"""
+        vals = {
+            'partner_company_id': self.hospital.id,
+            'company_signatory_id': self.env.user.id,
+            'service_category': 'supply',
+            'end_date': date.today() + timedelta(days=365),
+        }
+        hospital_contracts = self.env['contract.contract'].create([
+            dict(vals, name='Hospital contract %s' % i) for i in range(3)
+        ])
+        department_contract = self.env['contract.contract'].create(
+            dict(vals, name='Department contract', partner_department_id=self.department.id)
+        )
+        Queue = self.env['contract.partner.refresh']
+
+        self.hospital.write({'phone': '0999888777', 'email': 'new@hospital.com'})
+        self.env.flush_all()
+        # the partner save does not recompute the contracts
+        self.assertEqual(hospital_contracts.mapped('partner_phone'), ['0123456789'] * 3)
+        self.assertEqual(Queue.search([]).partner_id, self.hospital)
+
+        # a partner without contracts is not queued
+        self.env['res.partner'].create({'name': 'Unrelated', 'is_company': True}).phone = '1'
+        self.assertEqual(Queue.search_count([]), 1)
+
+        self.assertEqual(Queue._cron_refresh_contracts(), 4)
+        self.assertEqual(hospital_contracts.mapped('partner_phone'), ['0999888777'] * 3)
+        self.assertEqual(hospital_contracts.mapped('partner_email'), ['new@hospital.com'] * 3)
+        # the department contract keeps the department contact data
+        self.assertEqual(department_contract.partner_phone, '0987654321')
+        self.assertFalse(Queue.search([]))
+
     def test_contract_line_creation(self):
         """Test contract line creation"""
         contract = self.env['contract.contract'].create({
@@ -192,3 +265,412 @@ class TestContract(TransactionCase):
         self.assertEqual(contract.contact_phone, self.contact.phone)
         self.assertEqual(contract.contact_email, self.contact.email)
 
+    def test_cron_expire_contracts(self):
+        """Test the expiry cron honours extension days"""
+        vals = {
+            'partner_company_id': self.hospital.id,
+            'company_signatory_id': self.env.user.id,
+            'service_category': 'service',
+            'contract_date': date.today() - timedelta(days=400),
+            'start_date': date.today() - timedelta(days=400),
+            'end_date': date.today() - timedelta(days=5),
+        }
+        expired, extended, draft = self.env['contract.contract'].create([
+            dict(vals, name='Past end date'),
+            dict(vals, name='Extended', extension_days=30),
+            dict(vals, name='Still draft'),
+        ])
+        (expired | extended).action_set_active()
+
+        self.assertEqual(extended.effective_end_date, date.today() + timedelta(days=25))
+        self.env['contract.contract']._cron_expire_contracts()
+
+        self.assertEqual(expired.state, 'expired')
+        self.assertEqual(extended.state, 'active')
+        self.assertEqual(draft.state, 'draft')
+        self.assertIn('Hết hạn', expired.message_ids[0].body)
+
+    def test_fragment_search(self):
+        """Test contracts and appendices are found by identifier fragments"""
+        vals = {
+            'partner_company_id': self.hospital.id,
+            'company_signatory_id': self.env.user.id,
+            'service_category': 'supply',
+            'contract_date': date.today(),
+            'start_date': date.today(),
+            'end_date': date.today() + timedelta(days=365),
+        }
+        monitor, ventilator = self.env['contract.contract'].create([
+            dict(vals, name='Monitor supply', tender_code='GT-2024-0815', bid_notice_no='IB2400123456'),
+            dict(vals, name='Ventilator supply', tender_code='GT-2024-0990'),
+        ])
+        Contract = self.env['contract.contract']
+
+        def found(name):
+            return Contract.browse([id_ for id_, _name in Contract.name_search(name, limit=None)])
+
+        self.assertEqual(found('0815'), monitor)
+        self.assertEqual(found('400123'), monitor)
+        self.assertEqual(found('tilat'), ventilator)
+        self.assertEqual(found(monitor.contract_number), monitor)
+        self.assertIn(ventilator, found('test hosp'))
+
+        appendix = self.env['contract.appendix'].create({
+            'name': 'Extra monitors',
+            'contract_id': monitor.id,
+            'appendix_type': 'add_goods',
+            'appendix_scope': 'Adding more equipment',
+            'effective_date': date.today(),
+        })
+        Appendix = self.env['contract.appendix']
+        self.assertEqual(Appendix.search([('search_text', 'ilike', '2024-0815')]), appendix)
+        self.assertIn(appendix.id, [id_ for id_, _name in Appendix.name_search(appendix.appendix_number[-6:])])
+
+        # a renamed hospital reaches its contracts through the refresh queue
+        self.hospital.name = 'Bach Mai Hospital'
+        self.assertFalse(found('bach mai'))
+        self.env['contract.partner.refresh']._cron_refresh_contracts()
+        self.assertEqual(found('bach mai'), monitor | ventilator)
+        self.assertEqual(Appendix.search([('search_text', 'ilike', 'bach mai')]), appendix)
+
+    def test_document_deduplication(self):
+        """Test the same document uploaded twice is stored once, counted and
+        kept when its first owner is deleted
+        """
+        contract = self.env['contract.contract'].create({
+            'name': 'Document Contract',
+            'partner_company_id': self.hospital.id,
+            'company_signatory_id': self.env.user.id,
+            'service_category': 'supply',
+            'end_date': date.today() + timedelta(days=365),
+        })
+        appendix = self.env['contract.appendix'].create({
+            'contract_id': contract.id,
+            'appendix_type': 'add_goods',
+            'appendix_scope': 'Adding more equipment',
+            'effective_date': date.today(),
+        })
+        content = b'%PDF-1.4 tender dossier ' * 4096
+        first = appendix._store_document('tender.pdf', BytesIO(content), res_id=appendix.id)
+        self.assertEqual(first.raw, content)
+        self.assertEqual(first.file_size, len(content))
+        self.assertEqual(first.checksum, first._compute_checksum(content))
+
+        again = contract._store_document('copy.pdf', BytesIO(content), res_id=contract.id)
+        other = contract._store_document('other.pdf', BytesIO(content + b'!'), res_id=contract.id)
+        self.assertEqual(again, first)
+        self.assertNotEqual(other, first)
+        self.assertEqual(other.raw, content + b'!')
+
+        contract.write({
+            'attachment_ids': [(4, first.id)],
+            'handover_attachment_ids': [(4, first.id), (4, other.id)],
+        })
+        appendix.attachment_ids = again
+        self.assertEqual(contract.document_count, 2)
+        self.assertEqual(appendix.document_count, 1)
+
+        # the contract still links the blob: it takes it over from the appendix
+        appendix.unlink()
+        self.assertTrue(first.exists())
+        self.assertEqual((first.res_model, first.res_id), ('contract.contract', contract.id))
+        self.assertEqual(first.raw, content)
+
+    def test_compute_profiling(self):
+        """Test profiled computes are measured only when profiling is enabled"""
+        vals = {
+            'name': 'Profiled Contract',
+            'partner_company_id': self.hospital.id,
+            'company_signatory_id': self.env.user.id,
+            'service_category': 'supply',
+            'end_date': date.today() + timedelta(days=365),
+            'contract_line_ids': [(0, 0, {
+                'product_id': self.product.id,
+                'name': self.product.name,
+                'uom_id': self.product.uom_id.id,
+                'quantity': 2,
+                'price_unit': 10000.0,
+            }) for _i in range(3)],
+        }
+        self.env['contract.contract'].create(vals)
+        self.env.flush_all()
+        self.assertNotIn('contract_mgmt.profile', self.env.cr.precommit.data)
+
+        self.env['ir.config_parameter'].sudo().set_param('contract_mgmt.profile', 'True')
+        self.env['contract.contract'].create(vals)
+        self.env.flush_all()
+        stats = self.env.cr.precommit.data['contract_mgmt.profile']
+        calls, records, _queries, duration = stats[('contract.line', '_compute_price_subtotal')]
+        self.assertGreaterEqual(calls, 1)
+        self.assertEqual(records, 3)
+        self.assertGreaterEqual(duration, 0)
+        self.assertIn(('contract.contract', '_compute_amount_total'), stats)
+
+        profiles = self.env['contract.compute.profile']._record('test', stats)
+        self.assertEqual(len(profiles), len(stats))
+        self.assertEqual(
+            profiles.filtered(lambda p: p.method == '_compute_amount_total').model,
+            'contract.contract',
+        )
+
+    def test_metrics(self):
+        """Test instrumented methods feed the counters and the histogram"""
+        vals = {
+            'partner_company_id': self.hospital.id,
+            'company_signatory_id': self.env.user.id,
+            'service_category': 'supply',
+            'end_date': date.today() + timedelta(days=365),
+        }
+        before = METRICS.snapshot().get('contract.contract.create', {'calls': 0, 'records': 0})
+        self.env['contract.contract'].create([dict(vals, name='Metrics %s' % i) for i in range(3)])
+
+        entry = METRICS.snapshot()['contract.contract.create']
+        self.assertEqual(entry['calls'], before['calls'] + 1)
+        self.assertEqual(entry['records'], before['records'] + 3)
+        self.assertEqual(sum(entry['buckets']), entry['calls'])
+
+        text = render([METRICS.snapshot()])
+        self.assertIn('# TYPE contract_mgmt_duration_seconds histogram', text)
+        self.assertIn(
+            'contract_mgmt_duration_seconds_bucket{method="contract.contract.create",le="+Inf"} %s' % entry['calls'],
+            text,
+        )
+
+    def test_background_job(self):
+        """Test big selections are queued and run chunk by chunk by the cron"""
+        self.env['ir.config_parameter'].sudo().set_param('contract_mgmt.job_threshold', 2)
+        contracts = self.env['contract.contract'].create([{
+            'name': 'Job %s' % i,
+            'partner_company_id': self.hospital.id,
+            'company_signatory_id': self.env.user.id,
+            'service_category': 'supply',
+            'end_date': date.today() + timedelta(days=365),
+        } for i in range(5)])
+
+        action = contracts.action_set_active()
+        self.assertEqual(action['tag'], 'display_notification')
+        self.assertEqual(set(contracts.mapped('state')), {'draft'})
+        job = self.env['contract.job'].search([('method', '=', 'action_set_active')], limit=1)
+        self.assertEqual((job.state, job.total_count), ('pending', 5))
+
+        job.chunk_size = 2
+        self.env['contract.job']._cron_run_jobs()
+        self.assertEqual(set(contracts.mapped('state')), {'active'})
+        self.assertEqual(job.state, 'done')
+        self.assertEqual(job.done_count, 5)
+        self.assertEqual(job.progress, 100.0)
+
+        # a failing chunk keeps its checkpoint and is retried later
+        failing = self.env['contract.job']._enqueue(
+            contracts, 'action_set_active', 'Failing job', kwargs={'unexpected': True},
+        )
+        self.env['contract.job']._cron_run_jobs()
+        self.assertEqual((failing.state, failing.attempts, failing.done_count), ('pending', 1, 0))
+        self.assertTrue(failing.next_attempt and failing.error)
+
+        # only whitelisted methods are run, even when stored in a job
+        with self.assertRaises(ValueError):
+            self.env['contract.job']._enqueue(contracts, 'unlink', 'Forbidden job')
+        forged = self.env['contract.job'].sudo().create({
+            'name': 'Forged job',
+            'model': 'res.users',
+            'method': 'write',
+            'res_ids': self.env.user.ids,
+            'kwargs': {'active': False},
+            'total_count': 1,
+        })
+        forged._run(deadline=float('inf'), auto_commit=False)
+        self.assertEqual((forged.state, forged.done_count), ('failed', 0))
+        self.assertTrue(self.env.user.active)
+
+    def test_document_hash(self):
+        """Test the PDF cache key only changes with printed values"""
+        contract = self.env['contract.contract'].create({
+            'name': 'Printed Contract',
+            'partner_company_id': self.hospital.id,
+            'company_signatory_id': self.env.user.id,
+            'service_category': 'supply',
+            'end_date': date.today() + timedelta(days=365),
+            'contract_line_ids': [(0, 0, {
+                'product_id': self.product.id,
+                'name': self.product.name,
+                'uom_id': self.product.uom_id.id,
+                'quantity': 2,
+                'price_unit': 1000.0,
+            })],
+        })
+        version = contract.document_hash
+        self.assertTrue(version)
+
+        contract.private_note = 'Not printed'
+        self.assertEqual(contract.document_hash, version)
+
+        appendix = self.env['contract.appendix'].create({
+            'name': 'Printed Appendix',
+            'contract_id': contract.id,
+            'appendix_type': 'add_goods',
+            'appendix_scope': 'More equipment',
+        })
+        self.assertEqual(contract.document_hash, version, "draft appendices are not printed")
+        appendix.action_activate()
+        self.assertNotEqual(contract.document_hash, version)
+
+        version = contract.document_hash
+        contract.contract_line_ids.quantity = 3
+        self.assertNotEqual(contract.document_hash, version)
+
+        # Printed names and codes of related records are part of the version
+        for record, vals in [
+            (self.hospital, {'name': 'Renamed Hospital'}),
+            (self.product, {'default_code': 'RENAMED'}),
+            (contract.company_id, {'name': 'Renamed Company'}),
+        ]:
+            version = contract.document_hash
+            record.write(vals)
+            self.assertNotEqual(contract.document_hash, version)
+
+        # Outdated cached PDFs are garbage collected, the current one is kept
+        Attachment = self.env['ir.attachment']
+        outdated, current = Attachment.create([{
+            'name': '%s-%s.pdf' % (contract.contract_number, document_hash),
+            'raw': b'%PDF-1.4',
+            'mimetype': 'application/pdf',
+            'res_model': 'contract.contract',
+            'res_id': contract.id,
+        } for document_hash in (version, contract.document_hash)])
+        self.env.flush_all()
+        self.env['contract.contract']._gc_document_cache()
+        self.assertFalse(outdated.exists())
+        self.assertTrue(current.exists())
+
+    def test_reminder_activities(self):
+        """Test reminders are created once per contract and kind"""
+        today = date.today()
+        vals = {
+            'partner_company_id': self.hospital.id,
+            'company_signatory_id': self.env.user.id,
+            'service_category': 'supply',
+        }
+        expiring, delivered, accepted, quiet = self.env['contract.contract'].create([
+            dict(vals, name='Expiring', end_date=today + timedelta(days=10)),
+            dict(vals, name='Delivered', end_date=today + timedelta(days=365),
+                 delivery_date=today - timedelta(days=20)),
+            dict(vals, name='Accepted', end_date=today + timedelta(days=365),
+                 delivery_date=today - timedelta(days=60), acceptance_date=today - timedelta(days=40)),
+            dict(vals, name='Quiet', end_date=today + timedelta(days=365),
+                 delivery_date=today - timedelta(days=3)),
+        ])
+        (expiring | delivered | accepted | quiet).action_set_active()
+
+        def reminders(contract):
+            return contract.activity_ids.activity_type_id
+
+        self.env['contract.contract']._cron_schedule_reminders()
+        self.assertEqual(reminders(expiring), self.env.ref('contract_mgmt.mail_activity_contract_expiry'))
+        self.assertEqual(reminders(delivered), self.env.ref('contract_mgmt.mail_activity_contract_acceptance'))
+        self.assertEqual(reminders(accepted), self.env.ref('contract_mgmt.mail_activity_contract_liquidation'))
+        self.assertFalse(quiet.activity_ids)
+        self.assertEqual(expiring.activity_ids.date_deadline, expiring.effective_end_date)
+        self.assertEqual(delivered.activity_ids.date_deadline, delivered.delivery_date + timedelta(days=14))
+
+        # Open and done reminders are not created again
+        expiring.activity_ids.action_done()
+        self.assertEqual(self.env['contract.contract']._cron_schedule_reminders(), 0)
+        self.assertFalse(expiring.activity_ids)
+        self.assertEqual(len(delivered.activity_ids), 1)
+
+        # The lead time is configurable
+        self.env['ir.config_parameter'].sudo().set_param('contract_mgmt.reminder_acceptance_days', 2)
+        self.env['contract.contract']._cron_schedule_reminders()
+        self.assertEqual(reminders(quiet), self.env.ref('contract_mgmt.mail_activity_contract_acceptance'))
+
+    def test_archive_contracts(self):
+        """Test liquidated contracts are archived with their lines and stay reachable"""
+        today = date.today()
+        vals = {
+            'partner_company_id': self.hospital.id,
+            'company_signatory_id': self.env.user.id,
+            'service_category': 'supply',
+            'end_date': today - timedelta(days=1),
+            'contract_line_ids': [(0, 0, {
+                'product_id': self.product.id,
+                'name': self.product.name,
+                'uom_id': self.product.uom_id.id,
+                'quantity': 2,
+                'price_unit': 1000.0,
+            })],
+        }
+        old, recent, unliquidated = self.env['contract.contract'].create([
+            dict(vals, name='Old', liquidation_date=today - timedelta(days=100)),
+            dict(vals, name='Recent', liquidation_date=today - timedelta(days=10)),
+            dict(vals, name='Unliquidated'),
+        ])
+        (old | recent | unliquidated).write({'state': 'expired'})
+        admin = self.env.ref('base.user_admin')
+        old.with_user(admin).private_note = 'Checked by admin'
+
+        self.assertEqual(self.env['contract.contract']._cron_archive_contracts(), 1)
+        self.assertFalse(old.active)
+        # archiving is not a user change
+        self.assertEqual(old.updated_by, admin)
+        self.assertTrue(recent.active and unliquidated.active)
+
+        Contract = self.env['contract.contract']
+        self.assertNotIn(old, Contract.search([('partner_company_id', '=', self.hospital.id)]))
+        self.assertIn(old, Contract.search([('partner_company_id', '=', self.hospital.id), ('active', '=', False)]))
+        self.assertFalse(self.env['contract.line'].search([('contract_id', '=', old.id)]))
+
+        # Archived contracts keep their lines and values
+        self.assertEqual(len(old.contract_line_ids), 1)
+        self.assertFalse(old.contract_line_ids.active)
+        old.contract_line_ids.quantity = 3
+        self.assertEqual(old.amount_total, 3000.0)
+
+    def test_company_currency_amounts(self):
+        """Test amounts are converted at the contract and appendix dates"""
+        company = self.env.company
+        currency = self.env['res.currency'].create({
+            'name': 'TST',
+            'symbol': 'T',
+            'rounding': 0.01,
+        })
+        signed, effective = date(2024, 1, 10), date(2024, 6, 1)
+        # company currency units are worth 2 TST at signature, 4 TST later
+        self.env['res.currency.rate'].create([
+            {'name': date(2024, 1, 1), 'rate': 2.0, 'currency_id': currency.id, 'company_id': company.id},
+            {'name': date(2024, 5, 1), 'rate': 4.0, 'currency_id': currency.id, 'company_id': company.id},
+        ])
+        line_vals = {
+            'product_id': self.product.id,
+            'uom_id': self.product.uom_id.id,
+            'quantity': 1,
+            'price_unit': 1000.0,
+        }
+        contract = self.env['contract.contract'].create({
+            'name': 'Imported Equipment',
+            'partner_company_id': self.hospital.id,
+            'company_signatory_id': self.env.user.id,
+            'service_category': 'supply',
+            'currency_id': currency.id,
+            'contract_date': signed,
+            'start_date': signed,
+            'end_date': date(2025, 1, 10),
+            'contract_line_ids': [(0, 0, dict(line_vals, name='Line'))] * 2,
+        })
+        appendix = self.env['contract.appendix'].create({
+            'name': 'Imported Appendix',
+            'contract_id': contract.id,
+            'appendix_type': 'add_goods',
+            'appendix_scope': 'More equipment',
+            'effective_date': effective,
+            'appendix_line_ids': [(0, 0, dict(line_vals, change_action='add'))],
+        })
+
+        self.assertEqual(contract.company_currency_id, company.currency_id)
+        self.assertEqual(contract.amount_total_company, 1000.0)
+        self.assertEqual(contract.contract_line_ids.mapped('price_subtotal_company'), [500.0, 500.0])
+        self.assertEqual(appendix.amount_appendix_company, 250.0)
+
+        contract.contract_date = effective
+        self.assertEqual(contract.amount_total_company, 500.0)
+        self.assertEqual(contract.contract_line_ids.mapped('price_subtotal_company'), [250.0, 250.0])
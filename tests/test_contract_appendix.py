@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+import threading
+from datetime import date, timedelta
+
+from odoo import SUPERUSER_ID, api
+from odoo.service.model import retrying
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase, new_test_user
+
+
+def _contract_vals(env, hospital, **kw):
+    vals = {
+        'name': 'Test Contract',
+        'partner_company_id': hospital.id,
+        'company_signatory_id': env.user.id,
+        'service_category': 'supply',
+        'contract_date': date.today(),
+        'start_date': date.today(),
+        'end_date': date.today() + timedelta(days=365),
+    }
+    vals.update(kw)
+    return vals
+
+
+def _appendix_vals(contract, **kw):
+    vals = {
+        'name': 'Test Appendix',
+        'contract_id': contract.id,
+        'appendix_type': 'add_goods',
+        'appendix_scope': 'Adding more equipment',
+        'effective_date': date.today(),
+    }
+    vals.update(kw)
+    return vals
+
+
+class TestContractAppendix(TransactionCase):
+
+    def setUp(self):
+        super(TestContractAppendix, self).setUp()
+        self.hospital = self.env['res.partner'].create({
+            'name': 'Test Hospital',
+            'is_company': True,
+        })
+        self.contract = self.env['contract.contract'].create(
+            _contract_vals(self.env, self.hospital)
+        )
+
+    def test_appendix_numbering_shared_vals(self):
+        """Test a vals dict passed several times still gets one number per record"""
+        vals = _appendix_vals(self.contract)
+        appendices = self.env['contract.appendix'].create([vals] * 3)
+        self.assertEqual(len(set(appendices.mapped('appendix_number'))), 3)
+        self.assertNotIn('appendix_number', vals)
+
+    def test_appendix_numbering_batch(self):
+        """Test one create call numbers appendices of several contracts"""
+        other = self.env['contract.contract'].create(
+            _contract_vals(self.env, self.hospital, name='Other Contract')
+        )
+        appendices = self.env['contract.appendix'].create([
+            _appendix_vals(self.contract),
+            _appendix_vals(other),
+            _appendix_vals(self.contract),
+            _appendix_vals(self.contract),
+            _appendix_vals(other),
+        ])
+
+        prefix = f"PL-{self.contract.contract_number}-"
+        self.assertEqual(
+            appendices.filtered(lambda a: a.contract_id == self.contract).mapped('appendix_number'),
+            [prefix + '001', prefix + '002', prefix + '003'],
+        )
+        self.assertEqual(
+            appendices.filtered(lambda a: a.contract_id == other).mapped('appendix_number'),
+            [f"PL-{other.contract_number}-001", f"PL-{other.contract_number}-002"],
+        )
+        self.assertEqual(self.contract.next_appendix_seq, 4)
+
+    def test_appendix_numbering_after_unlink(self):
+        """Test numbers are not reused after an appendix is deleted"""
+        first, second = self.env['contract.appendix'].create([
+            _appendix_vals(self.contract),
+            _appendix_vals(self.contract),
+        ])
+        first.unlink()
+        third = self.env['contract.appendix'].create(_appendix_vals(self.contract))
+
+        self.assertNotEqual(third.appendix_number, second.appendix_number)
+        self.assertTrue(third.appendix_number.endswith('-003'))
+
+    def test_appendix_count_maintenance(self):
+        """Test appendix_count follows appendix creation and deletion"""
+        other = self.env['contract.contract'].create(
+            _contract_vals(self.env, self.hospital, name='Other Contract')
+        )
+        appendices = self.env['contract.appendix'].create([
+            _appendix_vals(self.contract),
+            _appendix_vals(self.contract),
+            _appendix_vals(other),
+        ])
+        self.assertEqual(self.contract.appendix_count, 2)
+        self.assertEqual(other.appendix_count, 1)
+
+        appendices.action_cancel()
+        self.assertEqual(self.contract.appendix_count, 2)
+
+        appendices.filtered(lambda a: a.contract_id == self.contract)[0].unlink()
+        self.assertEqual(self.contract.appendix_count, 1)
+        self.assertEqual(other.appendix_count, 1)
+
+    def test_amount_effective(self):
+        """Test active appendices affecting the total are added to the contract value"""
+        product = self.env['product.product'].create({'name': 'Medical Equipment X'})
+        self.env['contract.line'].create({
+            'contract_id': self.contract.id,
+            'product_id': product.id,
+            'name': product.name,
+            'uom_id': product.uom_id.id,
+            'quantity': 2,
+            'price_unit': 1000.0,
+        })
+        line_vals = {
+            'product_id': product.id,
+            'uom_id': product.uom_id.id,
+            'quantity': 1,
+            'price_unit': 500.0,
+        }
+        affecting, informative = self.env['contract.appendix'].create([
+            _appendix_vals(self.contract, appendix_line_ids=[(0, 0, line_vals)]),
+            _appendix_vals(
+                self.contract,
+                affects_contract_total=False,
+                appendix_line_ids=[(0, 0, line_vals)],
+            ),
+        ])
+        self.assertEqual(self.contract.amount_effective, 2000.0)
+
+        (affecting | informative).action_activate()
+        self.assertEqual(self.contract.amount_total, 2000.0)
+        self.assertEqual(self.contract.amount_appendix_total, 500.0)
+        self.assertEqual(self.contract.amount_effective, 2500.0)
+
+        affecting.action_cancel()
+        self.assertEqual(self.contract.amount_effective, 2000.0)
+
+    def test_effective_lines(self):
+        """Test active appendices are replayed onto the contract lines in date order"""
+        monitor, pump, bed = self.env['product.product'].create([
+            {'name': 'Monitor'}, {'name': 'Infusion Pump'}, {'name': 'Hospital Bed'},
+        ])
+        other = self.env['contract.contract'].create(
+            _contract_vals(self.env, self.hospital, name='Other Contract')
+        )
+
+        def line(product, qty, price):
+            return (0, 0, {
+                'product_id': product.id,
+                'name': product.name,
+                'uom_id': product.uom_id.id,
+                'quantity': qty,
+                'price_unit': price,
+            })
+
+        self.contract.write({'contract_line_ids': [line(monitor, 4, 100.0), line(pump, 10, 50.0)]})
+        monitor_line = self.contract.contract_line_ids.filtered(lambda contract_line: contract_line.product_id == monitor)
+
+        def appendix_line(product, qty, price, action, ref=False):
+            return (0, 0, {
+                'product_id': product.id,
+                'uom_id': product.uom_id.id,
+                'quantity': qty,
+                'price_unit': price,
+                'change_action': action,
+                'ref_contract_line_id': ref and ref.id,
+            })
+
+        today = date.today()
+        later, earlier, draft = self.env['contract.appendix'].create([
+            _appendix_vals(self.contract, effective_date=today + timedelta(days=10), appendix_line_ids=[
+                appendix_line(monitor, 3, 90.0, 'adjust', monitor_line),
+            ]),
+            _appendix_vals(self.contract, effective_date=today, appendix_line_ids=[
+                appendix_line(monitor, 2, 100.0, 'add', monitor_line),
+                appendix_line(pump, 10, 50.0, 'remove'),
+                appendix_line(bed, 1, 500.0, 'add'),
+            ]),
+            _appendix_vals(self.contract, appendix_line_ids=[
+                appendix_line(bed, 7, 500.0, 'add'),
+            ]),
+        ])
+        (later | earlier).action_activate()
+
+        lines = {
+            line['product_id']: (line['quantity'], line['price_unit'], line['price_subtotal'])
+            for line in self.contract.get_effective_lines()
+        }
+        # the later adjustment overrides the earlier addition, the pump is removed
+        self.assertEqual(lines, {monitor.id: (3, 90.0, 270.0), bed.id: (1, 500.0, 500.0)})
+        # the value follows the same replay: the adjustment counts 270 - 600
+        self.assertEqual(later.amount_effect, -330.0)
+        self.assertEqual(self.contract.amount_effective, 770.0)
+        self.assertEqual(draft.amount_effect, 3500.0)
+        self.assertFalse(self.contract.effective_lines_dirty)
+        self.assertEqual(
+            self.contract.effective_line_ids.filtered(lambda effective_line: effective_line.product_id == monitor).appendix_id,
+            later,
+        )
+
+        # Only the changed contract is invalidated; rebuilding is not an edit
+        reader = new_test_user(self.env, login='effective_reader', groups='base.group_user')
+        other.with_user(reader).get_effective_lines()
+        self.assertFalse(other.effective_lines_dirty)
+        self.assertNotEqual(other.updated_by, reader)
+        draft.appendix_line_ids.quantity = 8
+        draft.action_activate()
+        self.assertTrue(self.contract.effective_lines_dirty)
+        self.assertFalse(other.effective_lines_dirty)
+        self.assertEqual(
+            sum(line['quantity'] for line in self.contract.get_effective_lines() if line['product_id'] == bed.id),
+            9,
+        )
+        self.assertEqual(self.contract.amount_effective, 4770.0)
+
+
+@tagged('post_install', '-at_install')
+class TestAppendixNumberingConcurrency(TransactionCase):
+    """Create appendices of one contract from parallel, committed cursors"""
+
+    def setUp(self):
+        super(TestAppendixNumberingConcurrency, self).setUp()
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            hospital = env['res.partner'].create({
+                'name': 'Concurrency Hospital',
+                'is_company': True,
+            })
+            contract = env['contract.contract'].create(_contract_vals(env, hospital))
+            self.hospital_id, self.contract_id = hospital.id, contract.id
+        self.addCleanup(self._cleanup_committed_data)
+
+    def _cleanup_committed_data(self):
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env['contract.appendix'].search([('contract_id', '=', self.contract_id)]).unlink()
+            env['contract.contract'].browse(self.contract_id).unlink()
+            env['res.partner'].browse(self.hospital_id).unlink()
+
+    def test_parallel_appendix_numbering(self):
+        """Test parallel transactions never hand out the same number"""
+        workers, per_worker = 4, 5
+        barrier = threading.Barrier(workers)
+        numbers, errors = [], []
+
+        def work():
+            try:
+                with self.registry.cursor() as cr:
+                    env = api.Environment(cr, SUPERUSER_ID, {})
+                    contract = env['contract.contract'].browse(self.contract_id)
+                    barrier.wait(timeout=30)
+
+                    def create_appendices():
+                        return env['contract.appendix'].create(
+                            [_appendix_vals(contract) for _i in range(per_worker)]
+                        ).mapped('appendix_number')
+
+                    numbers.extend(retrying(create_appendices, env))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=work) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertFalse(errors)
+        self.assertEqual(len(numbers), workers * per_worker)
+        self.assertEqual(
+            sorted(int(number.rsplit('-', 1)[1]) for number in numbers),
+            list(range(1, workers * per_worker + 1)),
+        )
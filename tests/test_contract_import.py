@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import base64
+
+from odoo.tests.common import TransactionCase
+
+
+CONTRACT_CSV = """contract_number,name,contract_date,end_date,service_category,state,hospital_ref,tender_code
+HĐ-2015-042,Monitor BV 115,2015-03-01,2016-03-01,supply,expired,BV115,TB-01
+HĐ-2015-043,Máy thở BV 115,2015-04-01,2016-04-01,supply,active,BV115,
+HĐ-2015-044,Unknown hospital,2015-05-01,2016-05-01,supply,draft,BV999,
+"""
+
+LINE_CSV = """contract_number,product_code,uom,quantity,price_unit
+HĐ-2015-042,MED-001,{uom},2,10000
+HĐ-2015-042,MED-404,{uom},1,500
+HĐ-2015-043,MED-001,{uom},3,9000
+"""
+
+
+class TestContractImport(TransactionCase):
+
+    def setUp(self):
+        super(TestContractImport, self).setUp()
+        self.hospital = self.env['res.partner'].create({
+            'name': 'Test Hospital',
+            'is_company': True,
+            'ref': 'BV115',
+        })
+        self.product = self.env['product.product'].create({
+            'name': 'Medical Equipment X',
+            'default_code': 'MED-001',
+        })
+
+    def _create_job(self, import_type, content, chunk_size=1):
+        return self.env['contract.import.job'].create({
+            'name': 'Import %s' % import_type,
+            'import_type': import_type,
+            'file': base64.b64encode(content.encode()),
+            'file_name': '%s.csv' % import_type,
+            'chunk_size': chunk_size,
+        })
+
+    def test_import_contracts_and_lines(self):
+        """Test historical contracts keep their numbers and lines resolve references"""
+        job = self._create_job('contract', CONTRACT_CSV)
+        job._run()
+
+        self.assertEqual(job.state, 'done')
+        self.assertEqual(job.rows_done, 3)
+        self.assertEqual(job.rows_skipped, 1)
+        self.assertEqual(job.records_created, 2)
+        self.assertIn('BV999', job.error_log)
+
+        contract = self.env['contract.contract'].search([('contract_number', '=', 'HĐ-2015-042')])
+        self.assertEqual(contract.partner_company_id, self.hospital)
+        self.assertEqual(contract.state, 'expired')
+        self.assertEqual(contract.tender_code, 'TB-01')
+        self.assertFalse(contract.message_ids)
+
+        job = self._create_job('line', LINE_CSV.format(uom=self.product.uom_id.name), chunk_size=2)
+        job._run()
+
+        self.assertEqual(job.records_created, 2)
+        self.assertEqual(job.rows_skipped, 1)
+        self.assertEqual(contract.amount_total, 20000.0)
+
+    def test_import_resume_from_checkpoint(self):
+        """Test a resumed import skips the rows already committed"""
+        job = self._create_job('contract', CONTRACT_CSV)
+        job.rows_done = 1
+        job._run()
+
+        numbers = self.env['contract.contract'].search([
+            ('contract_number', 'in', ['HĐ-2015-042', 'HĐ-2015-043']),
+        ]).mapped('contract_number')
+        self.assertEqual(numbers, ['HĐ-2015-043'])
+        self.assertEqual(job.rows_done, 3)
+
+    def test_import_rejects_rows_failing_constraints(self):
+        """Test rows failing a model constraint are rejected, not the chunk"""
+        content = """contract_number,name,contract_date,start_date,end_date,service_category,hospital_ref
+HĐ-2016-001,Valid,2016-01-01,2016-01-01,2017-01-01,supply,BV115
+HĐ-2016-002,Ends before start,2016-01-01,2016-06-01,2016-03-01,supply,BV115
+HĐ-2016-003,Bad category,2016-01-01,2016-01-01,2017-01-01,no_such_category,BV115
+HĐ-2016-004,Valid too,2016-01-01,2016-01-01,2017-01-01,supply,BV115
+"""
+        job = self._create_job('contract', content, chunk_size=10)
+        job._run()
+
+        self.assertEqual(job.state, 'done')
+        self.assertEqual((job.records_created, job.rows_skipped), (2, 2))
+        self.assertIn('Dòng 3', job.error_log)
+        self.assertIn('Dòng 4', job.error_log)
+        numbers = self.env['contract.contract'].search([
+            ('contract_number', 'like', 'HĐ-2016-'),
+        ]).mapped('contract_number')
+        self.assertEqual(sorted(numbers), ['HĐ-2016-001', 'HĐ-2016-004'])
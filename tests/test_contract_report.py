@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+from datetime import date, timedelta
+
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.contract_mgmt.models.contract_export import COLUMNS
+
+
+class TestContractReport(TransactionCase):
+
+    def setUp(self):
+        super(TestContractReport, self).setUp()
+        self.hospital = self.env['res.partner'].create({
+            'name': 'Test Hospital',
+            'is_company': True,
+        })
+        self.product = self.env['product.product'].create({'name': 'Medical Equipment X'})
+        self.other_product = self.env['product.product'].create({'name': 'Medical Equipment Y'})
+        self.contract = self.env['contract.contract'].create({
+            'name': 'Test Contract',
+            'partner_company_id': self.hospital.id,
+            'company_signatory_id': self.env.user.id,
+            'service_category': 'supply',
+            'contract_date': date.today(),
+            'start_date': date.today(),
+            'end_date': date.today() + timedelta(days=365),
+            'contract_line_ids': [
+                (0, 0, {
+                    'product_id': product.id,
+                    'name': product.name,
+                    'uom_id': product.uom_id.id,
+                    'quantity': qty,
+                    'price_unit': price,
+                }) for product, qty, price in [
+                    (self.product, 2, 1000.0),
+                    (self.other_product, 5, 100.0),
+                ]
+            ],
+        })
+
+    def _totals_by_product(self):
+        self.env.flush_all()
+        return {
+            product: (quantity, amount)
+            for product, quantity, amount in self.env['contract.report']._read_group(
+                [('contract_id', '=', self.contract.id)],
+                ['product_id'],
+                ['quantity:sum', 'price_subtotal:sum'],
+            )
+        }
+
+    def test_report_includes_active_appendices(self):
+        """Test the analysis adds active appendix lines to the contract lines"""
+        appendix = self.env['contract.appendix'].create({
+            'name': 'Test Appendix',
+            'contract_id': self.contract.id,
+            'appendix_type': 'add_goods',
+            'appendix_scope': 'Changing equipment',
+            'effective_date': date.today(),
+            'appendix_line_ids': [
+                (0, 0, {
+                    'product_id': self.product.id,
+                    'uom_id': self.product.uom_id.id,
+                    'quantity': 1,
+                    'price_unit': 1000.0,
+                    'change_action': 'add',
+                }),
+                (0, 0, {
+                    'product_id': self.other_product.id,
+                    'uom_id': self.other_product.uom_id.id,
+                    'quantity': 2,
+                    'price_unit': 100.0,
+                    'change_action': 'remove',
+                }),
+            ],
+        })
+        self.assertEqual(self._totals_by_product(), {
+            self.product: (2, 2000.0),
+            self.other_product: (5, 500.0),
+        })
+
+        appendix.action_activate()
+        self.assertEqual(self._totals_by_product(), {
+            self.product: (3, 3000.0),
+            self.other_product: (3, 300.0),
+        })
+
+    def test_report_adjustments_replace_lines(self):
+        """Test adjustments count as the difference with what they replace"""
+        line = self.contract.contract_line_ids.filtered(lambda line: line.product_id == self.product)
+
+        def adjust(quantity, price, days, **line_vals):
+            appendix = self.env['contract.appendix'].create({
+                'name': 'Adjustment',
+                'contract_id': self.contract.id,
+                'appendix_type': 'add_goods',
+                'appendix_scope': 'Adjusting equipment',
+                'effective_date': date.today() + timedelta(days=days),
+                'appendix_line_ids': [(0, 0, dict({
+                    'product_id': self.product.id,
+                    'uom_id': self.product.uom_id.id,
+                    'quantity': quantity,
+                    'price_unit': price,
+                    'change_action': 'adjust',
+                }, **line_vals))],
+            })
+            appendix.action_activate()
+
+        adjust(1, 1500.0, 1, ref_contract_line_id=line.id)
+        self.assertEqual(self._totals_by_product()[self.product], (1, 1500.0))
+        # a later adjustment of the same product replaces the previous one
+        adjust(4, 1000.0, 2)
+        self.assertEqual(self._totals_by_product()[self.product], (4, 4000.0))
+        effective = {vals['product_id']: vals['price_subtotal'] for vals in self.contract.get_effective_lines()}
+        self.assertEqual(effective[self.product.id], 4000.0)
+        self.assertEqual(self.contract.amount_effective, 4500.0)
+
+    def test_finance_export(self):
+        """Test the CSV export lists contract lines then active appendix lines"""
+        self.env['contract.appendix'].create({
+            'name': 'Test Appendix',
+            'contract_id': self.contract.id,
+            'appendix_type': 'add_goods',
+            'appendix_scope': 'More equipment',
+            'appendix_line_ids': [(0, 0, {
+                'product_id': self.product.id,
+                'uom_id': self.product.uom_id.id,
+                'quantity': 1,
+                'price_unit': 1000.0,
+                'change_action': 'add',
+            })],
+        }).action_activate()
+        draft = self.env['contract.contract'].create({
+            'name': 'Draft Contract',
+            'partner_company_id': self.hospital.id,
+            'company_signatory_id': self.env.user.id,
+            'service_category': 'supply',
+            'end_date': date.today() + timedelta(days=365),
+            'contract_line_ids': [(0, 0, {
+                'product_id': self.product.id,
+                'name': self.product.name,
+                'uom_id': self.product.uom_id.id,
+                'quantity': 1,
+                'price_unit': 1000.0,
+            })],
+        })
+        self.contract.action_set_active()
+
+        wizard = self.env['contract.export.wizard'].create({
+            'file_format': 'csv',
+            'partner_company_ids': [(6, 0, self.hospital.ids)],
+        })
+        content = b''.join(wizard._stream_export()).decode('utf-8-sig')
+        rows = list(csv.DictReader(io.StringIO(content)))
+
+        self.assertEqual(list(rows[0]), COLUMNS)
+        self.assertNotIn(draft.contract_number, {row['contract_number'] for row in rows})
+        self.assertEqual(
+            [(row['line_source'], row['quantity'], row['price_subtotal']) for row in rows],
+            [('contract', '2.0', '2000.0'), ('contract', '5.0', '500.0'), ('appendix', '1.0', '1000.0')],
+        )
+        self.assertEqual(rows[0]['hospital'], 'Test Hospital')
+        self.assertEqual(rows[2]['appendix_effective_date'], date.today().isoformat())
+
+        # "all" includes draft and archived (liquidated) contracts
+        draft.action_archive()
+        wizard.contract_state = 'all'
+        content = b''.join(wizard._stream_export()).decode('utf-8-sig')
+        numbers = {row['contract_number'] for row in csv.DictReader(io.StringIO(content))}
+        self.assertEqual(numbers, {self.contract.contract_number, draft.contract_number})
+
+        wizard.file_format = 'xlsx'
+        self.assertTrue(b''.join(wizard._stream_export()).startswith(b'PK'))
+
+    def _kpi(self, kpi, key):
+        """(count, amount) of a snapshot row once pending changes are applied"""
+        self.env.flush_all()
+        self.env.cr.precommit.run()
+        Kpi = self.env['contract.kpi']
+        Kpi.invalidate_model()
+        row = Kpi.search([
+            ('company_id', '=', self.contract.company_id.id), ('kpi', '=', kpi), ('key', '=', key),
+        ])
+        return row.count, row.amount
+
+    def test_kpi_snapshot(self):
+        """Test the snapshot follows contract, line and appendix changes by deltas"""
+        hospital = str(self.hospital.id)
+        active = self._kpi('state', 'active')
+        draft = self._kpi('state', 'draft')
+        self.assertEqual(self._kpi('hospital', hospital), (0, 0.0))
+
+        self.contract.end_date = date.today() + timedelta(days=45)
+        self.contract.action_set_active()
+        self.assertEqual(self._kpi('state', 'active'), (active[0] + 1, active[1] + 2500.0))
+        self.assertEqual(self._kpi('state', 'draft'), (draft[0] - 1, draft[1] - 2500.0))
+        self.assertEqual(self._kpi('hospital', hospital), (1, 2500.0))
+        expiring_30, expiring_60 = self._kpi('expiry', '30'), self._kpi('expiry', '60')
+
+        pending = self._kpi('appendix', 'draft')
+        appendix = self.env['contract.appendix'].create({
+            'name': 'Test Appendix',
+            'contract_id': self.contract.id,
+            'appendix_type': 'add_goods',
+            'appendix_scope': 'More equipment',
+            'appendix_line_ids': [(0, 0, {
+                'product_id': self.product.id,
+                'uom_id': self.product.uom_id.id,
+                'quantity': 1,
+                'price_unit': 1000.0,
+            })],
+        })
+        self.assertEqual(self._kpi('appendix', 'draft'), (pending[0] + 1, pending[1] + 1000.0))
+        appendix.action_activate()
+        self.assertEqual(self._kpi('appendix', 'draft'), pending)
+        self.assertEqual(self._kpi('hospital', hospital), (1, 3500.0))
+
+        self.contract.contract_line_ids[0].quantity = 3
+        self.assertEqual(self._kpi('hospital', hospital), (1, 4500.0))
+        self.assertEqual(self._kpi('expiry', '60'), (expiring_60[0], expiring_60[1] + 2000.0))
+        self.assertEqual(self._kpi('expiry', '30'), expiring_30)
+
+        # The reconcile repairs a drifted snapshot from the ledger
+        self.env.cr.execute("UPDATE contract_kpi SET count = 99, amount = 0 WHERE kpi = 'hospital'")
+        self.env['contract.kpi']._cron_reconcile()
+        self.assertEqual(self._kpi('hospital', hospital), (1, 4500.0))
+
+        # Amounts are booked in the company currency
+        currency = self.env['res.currency'].create({'name': 'TST', 'symbol': 'T', 'rounding': 0.01})
+        self.env['res.currency.rate'].create({
+            'name': date(2000, 1, 1),
+            'rate': 2.0,
+            'currency_id': currency.id,
+            'company_id': self.contract.company_id.id,
+        })
+        self.contract.currency_id = currency
+        self.assertEqual(self._kpi('hospital', hospital), (1, 2250.0))
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""Query plans of the contract hot queries, with and without the module indexes.
+
+Seeds a realistic volume with plain SQL inside the test transaction, then
+EXPLAINs every hot query twice: once as installed, once after dropping all
+secondary indexes of the contract tables in a savepoint. Both plans are
+logged side by side. Not part of the standard run::
+
+    odoo-bin -d <db> -u contract_mgmt --test-tags contract_bench --stop-after-init
+"""
+import logging
+from datetime import date
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+CONTRACTS = 100000
+LINES_PER_CONTRACT = 3
+APPENDIX_EVERY = 5
+HOSPITALS = 200
+PRODUCTS = 500
+TABLES = ('contract_contract', 'contract_line', 'contract_appendix', 'contract_appendix_line')
+
+
+@tagged('-standard', 'contract_bench', 'post_install', '-at_install')
+class TestIndexPlan(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.hospitals = cls.env['res.partner'].create([
+            {'name': 'Bench Hospital %s' % i, 'is_company': True} for i in range(HOSPITALS)
+        ])
+        cls.products = cls.env['product.product'].create([
+            {'name': 'Bench Product %s' % i, 'default_code': 'BENCH-%s' % i} for i in range(PRODUCTS)
+        ])
+        cls.env.flush_all()
+        cls._seed()
+
+    @classmethod
+    def _seed(cls):
+        cr = cls.env.cr
+        today = date.today()
+        hospital_ids = cls.hospitals.ids
+        product_ids = cls.products.ids
+        # 80% of the history is expired or cancelled, like production
+        cr.execute(SQL(
+            """
+            INSERT INTO contract_contract (
+                contract_number, name, contract_date, end_date, effective_end_date,
+                service_category, state, company_id, company_signatory_id,
+                responsible_user_id, partner_company_id, currency_id, tender_code,
+                extension_days, next_appendix_seq, amount_total, active
+            )
+            SELECT 'BENCH-' || i, 'Bench contract ' || i,
+                   %(today)s - (i %% 3650),
+                   %(today)s - (i %% 3650) + 365,
+                   %(today)s - (i %% 3650) + 365,
+                   (ARRAY['supply', 'service', 'rental', 'other'])[1 + i %% 4],
+                   (ARRAY['expired', 'expired', 'expired', 'expired', 'cancelled',
+                          'cancelled', 'cancelled', 'cancelled', 'active', 'draft'])[1 + i %% 10],
+                   %(company)s, %(user)s, %(user)s,
+                   (%(hospitals)s::int[])[1 + i %% %(nb_hospitals)s],
+                   %(currency)s,
+                   CASE WHEN i %% 4 = 0 THEN 'TB-' || i END,
+                   0, 1, 0, TRUE
+              FROM generate_series(1, %(contracts)s) AS i
+            """,
+            today=today, company=cls.env.company.id, user=cls.env.uid,
+            hospitals=hospital_ids, nb_hospitals=len(hospital_ids),
+            currency=cls.env.company.currency_id.id, contracts=CONTRACTS,
+        ))
+        cr.execute(SQL(
+            """
+            INSERT INTO contract_line (
+                contract_id, sequence, product_id, name, uom_id, quantity,
+                price_unit, price_subtotal, active
+            )
+            SELECT c.id, n, (%(products)s::int[])[1 + (c.id * n) %% %(nb_products)s],
+                   'Bench line', %(uom)s, n, 1000, 1000 * n, TRUE
+              FROM contract_contract c, generate_series(1, %(lines)s) AS n
+             WHERE c.contract_number LIKE 'BENCH-%%'
+            """,
+            products=product_ids, nb_products=len(product_ids),
+            uom=cls.products[0].uom_id.id, lines=LINES_PER_CONTRACT,
+        ))
+        cr.execute(SQL(
+            """
+            INSERT INTO contract_appendix (
+                appendix_number, contract_id, appendix_type, appendix_scope,
+                effective_date, state, affects_contract_total, amount_appendix
+            )
+            SELECT 'PL-' || c.contract_number || '-001', c.id, 'add_goods', 'Bench',
+                   c.contract_date + 30,
+                   (ARRAY['draft', 'active', 'active', 'cancelled'])[1 + c.id %% 4],
+                   c.id %% 3 <> 0, 5000
+              FROM contract_contract c
+             WHERE c.contract_number LIKE 'BENCH-%%' AND c.id %% %(every)s = 0
+            """,
+            every=APPENDIX_EVERY,
+        ))
+        for table in TABLES:
+            cr.execute(SQL("ANALYZE %s", SQL.identifier(table)))
+        cls.today = today
+        cls.env.invalidate_all()
+
+    def _hot_queries(self):
+        """(name, SQL) of the queries behind the views, filters and computes"""
+        Contract = self.env['contract.contract']
+        hospital = self.hospitals[7]
+        return [
+            ('list: active contracts, default order', Contract._search(
+                [('state', '=', 'active')], order=Contract._order, limit=80,
+            ).select()),
+            ('filter: my active contracts', Contract._search(
+                [('responsible_user_id', '=', self.env.uid), ('state', '=', 'active')], limit=80,
+            ).select()),
+            ('filter: contracts of a hospital', Contract._search(
+                [('partner_company_id', '=', hospital.id)],
+            ).select()),
+            ('search: tender code', Contract._search(
+                [('tender_code', '=', 'TB-4000')],
+            ).select()),
+            ('cron: overdue active contracts', Contract._search(
+                [('state', '=', 'active'), ('effective_end_date', '<', self.today)],
+            ).select()),
+            ('group by: hospital, active only', SQL(
+                """
+                SELECT partner_company_id, count(*), sum(amount_total)
+                  FROM contract_contract
+                 WHERE state = 'active'
+              GROUP BY partner_company_id
+                """
+            )),
+            ('compute: effective appendix total', SQL(
+                """
+                SELECT contract_id, sum(amount_appendix)
+                  FROM contract_appendix
+                 WHERE contract_id IN (SELECT id FROM contract_contract WHERE partner_company_id = %s)
+                   AND state = 'active' AND affects_contract_total
+              GROUP BY contract_id
+                """,
+                hospital.id,
+            )),
+            ('lines: by product', self.env['contract.line']._search(
+                [('product_id', '=', self.products[3].id)],
+            ).select()),
+            ('lines: by sale order line', self.env['contract.line']._search(
+                [('sale_order_line_id', '=', 1)],
+            ).select()),
+        ]
+
+    def _explain(self, query):
+        self.env.cr.execute(SQL("EXPLAIN (ANALYZE, FORMAT JSON) %s", query))
+        plan = self.env.cr.fetchone()[0][0]
+        nodes = []
+
+        def walk(node):
+            relation = node.get('Relation Name') or node.get('Index Name') or ''
+            nodes.append(f"{node['Node Type']} {relation}".strip())
+            for child in node.get('Plans', []):
+                walk(child)
+
+        walk(plan['Plan'])
+        return plan['Execution Time'], nodes
+
+    def _drop_secondary_indexes(self):
+        self.env.cr.execute(SQL(
+            """
+            SELECT i.relname
+              FROM pg_index x
+              JOIN pg_class i ON i.oid = x.indexrelid
+              JOIN pg_class t ON t.oid = x.indrelid
+             WHERE t.relname IN %s AND NOT x.indisunique AND NOT x.indisprimary
+            """,
+            TABLES,
+        ))
+        for name, in self.env.cr.fetchall():
+            self.env.cr.execute(SQL("DROP INDEX %s", SQL.identifier(name)))
+
+    def test_index_plan(self):
+        queries = self._hot_queries()
+        after = {name: self._explain(query) for name, query in queries}
+
+        self.env.cr.execute("SAVEPOINT contract_index_plan")
+        try:
+            self._drop_secondary_indexes()
+            before = {name: self._explain(query) for name, query in queries}
+        finally:
+            self.env.cr.execute("ROLLBACK TO SAVEPOINT contract_index_plan")
+
+        report = ["Contract index plan (%s contracts, %s lines)" % (CONTRACTS, CONTRACTS * LINES_PER_CONTRACT)]
+        for name, _query in queries:
+            (time_before, plan_before), (time_after, plan_after) = before[name], after[name]
+            report.append(f"- {name}: {time_before:.1f} ms -> {time_after:.1f} ms")
+            report.append(f"    before: {' / '.join(plan_before)}")
+            report.append(f"    after:  {' / '.join(plan_after)}")
+        _logger.info("\n".join(report))
+
+        # Selective lookups must not scan the tables any more
+        for name in (
+            'filter: contracts of a hospital',
+            'search: tender code',
+            'cron: overdue active contracts',
+            'lines: by product',
+            'lines: by sale order line',
+        ):
+            self.assertFalse(
+                [node for node in after[name][1] if node.startswith('Seq Scan')],
+                "%s still scans a table: %s" % (name, after[name][1]),
+            )
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import json
+import logging
+import os
+import time
+from datetime import date, timedelta
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+_logger = logging.getLogger(__name__)
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'benchmark_baselines.json')
+
+
+def _load_baselines():
+    with open(BASELINE_FILE, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class ContractBenchmarkCase(TransactionCase):
+    """Query count and wall time of the main contract flows at several scales.
+
+    Query counts are checked against the committed baselines of
+    ``benchmark_baselines.json`` through ``assertQueryCount``; a flow without
+    a recorded baseline is skipped, not passed. Flows that must stay batched
+    also fail when their query count grows by one query or more per extra
+    record.
+
+    Set ``CONTRACT_BENCH_RECORD=<path>`` to only measure the flows and write
+    their counts and timings to a JSON file in the baseline format, e.g.
+    ``tests/benchmark_baselines.json`` itself to record new baselines.
+    """
+
+    SCALES = ()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.baselines = _load_baselines()
+        cls.results = {}
+        # measure the flows inline, not their background job
+        cls.env['ir.config_parameter'].sudo().set_param('contract_mgmt.job_threshold', 10 ** 9)
+        cls.hospital = cls.env['res.partner'].create({
+            'name': 'Benchmark Hospital',
+            'is_company': True,
+        })
+        cls.product = cls.env['product.product'].create({
+            'name': 'Benchmark Equipment',
+            'default_code': 'BENCH-001',
+            'list_price': 1000.0,
+        })
+
+    @classmethod
+    def tearDownClass(cls):
+        path = os.environ.get('CONTRACT_BENCH_RECORD')
+        if path and cls.results:
+            recorded = {}
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    recorded = json.load(f)
+            for flow, scales in cls.results.items():
+                recorded.setdefault(flow, {}).update(scales)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(recorded, f, indent=2, sort_keys=True)
+        super().tearDownClass()
+
+    # Helpers
+    def _contract_vals(self, **kw):
+        vals = {
+            'name': 'Benchmark Contract',
+            'partner_company_id': self.hospital.id,
+            'company_signatory_id': self.env.user.id,
+            'service_category': 'supply',
+            'contract_date': date.today(),
+            'start_date': date.today(),
+            'end_date': date.today() + timedelta(days=365),
+        }
+        vals.update(kw)
+        return vals
+
+    def _line_commands(self, count, name_field='name'):
+        return [(0, 0, {
+            'product_id': self.product.id,
+            name_field: 'Line %s' % index,
+            'uom_id': self.product.uom_id.id,
+            'quantity': 1 + index % 5,
+            'price_unit': 1000.0,
+        }) for index in range(count)]
+
+    def _create_order(self, count):
+        order = self.env['sale.order'].create({
+            'partner_id': self.hospital.id,
+            'order_line': [(0, 0, {
+                'product_id': self.product.id,
+                'product_uom_qty': 1 + index % 5,
+                'price_unit': 1000.0,
+            }) for index in range(count)],
+        })
+        order.action_confirm()
+        return order
+
+    def _measure(self, flow, scale, func):
+        """Run ``func`` on a clean cache and return its query count"""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        baseline = (self.baselines.get(flow) or {}).get(str(scale), {}).get('queries')
+        if os.environ.get('CONTRACT_BENCH_RECORD'):
+            check = contextlib.nullcontext()
+        elif baseline is None:
+            self.skipTest(
+                "No query baseline for %s @%s in %s: record it with CONTRACT_BENCH_RECORD"
+                % (flow, scale, os.path.basename(BASELINE_FILE))
+            )
+        else:
+            check = self.assertQueryCount(baseline)
+        with check:
+            queries = self.cr.sql_log_count
+            started = time.perf_counter()
+            func()
+            self.env.flush_all()
+            elapsed = (time.perf_counter() - started) * 1000
+            queries = self.cr.sql_log_count - queries
+        self.results.setdefault(flow, {})[str(scale)] = {
+            'queries': queries,
+            'ms': round(elapsed, 1),
+        }
+        _logger.info("Benchmark %s @%s: %s queries, %.1f ms", flow, scale, queries, elapsed)
+        return queries
+
+    def _run_flow(self, flow, prepare, run, batched=True):
+        """Measure ``run(prepare(scale))`` at every scale of the case"""
+        counts = {}
+        for scale in self.SCALES:
+            data = prepare(scale)
+            counts[scale] = self._measure(flow, scale, lambda: run(data))
+        if batched and len(counts) > 1:
+            smallest, largest = min(counts), max(counts)
+            self.assertLess(
+                counts[largest] - counts[smallest], largest - smallest,
+                "%s issues queries per record: %s" % (flow, counts),
+            )
+
+    # Flows
+    def _test_contract_create(self):
+        self._run_flow(
+            'contract_create',
+            lambda scale: self._contract_vals(contract_line_ids=self._line_commands(scale)),
+            lambda vals: self.env['contract.contract'].create(vals),
+        )
+
+    def _test_quotation_conversion(self):
+        self._run_flow(
+            'quotation_conversion',
+            self._create_order,
+            lambda order: order.action_create_contract(),
+        )
+
+    def _test_appendix_create(self):
+        contract = self.env['contract.contract'].create(self._contract_vals())
+
+        def prepare(scale):
+            return {
+                'name': 'Benchmark Appendix',
+                'contract_id': contract.id,
+                'appendix_type': 'add_goods',
+                'appendix_scope': 'Benchmark',
+                'appendix_line_ids': self._line_commands(scale, name_field='description'),
+            }
+
+        self._run_flow(
+            'appendix_create',
+            prepare,
+            lambda vals: self.env['contract.appendix'].create(vals),
+        )
+
+    def _test_appendix_activate(self):
+        contract = self.env['contract.contract'].create(
+            self._contract_vals(contract_line_ids=self._line_commands(10))
+        )
+
+        def prepare(scale):
+            return self.env['contract.appendix'].create({
+                'name': 'Benchmark Appendix',
+                'contract_id': contract.id,
+                'appendix_type': 'add_goods',
+                'appendix_scope': 'Benchmark',
+                'appendix_line_ids': [(0, 0, {
+                    'product_id': self.product.id,
+                    'uom_id': self.product.uom_id.id,
+                    'quantity': 1,
+                    'price_unit': 1000.0,
+                }) for _i in range(scale)],
+            })
+
+        self._run_flow('appendix_activate', prepare, lambda appendix: appendix.action_activate())
+
+    def _test_sale_order_line_import(self):
+        def prepare(scale):
+            order = self._create_order(scale)
+            return self.env['contract.contract'].create(self._contract_vals(sale_order_id=order.id))
+
+        self._run_flow(
+            'sale_order_line_import',
+            prepare,
+            lambda contract: contract.action_import_sale_order_lines(),
+        )
+
+    def _test_mass_state_transition(self):
+        def prepare(scale):
+            return self.env['contract.contract'].create([
+                self._contract_vals(name='Benchmark %s' % index) for index in range(scale)
+            ])
+
+        def run(contracts):
+            contracts.action_set_active()
+            contracts.action_set_expired()
+
+        # state changes are tracked in the chatter of every record
+        self._run_flow('mass_state_transition', prepare, run, batched=False)
+
+
+@tagged('post_install', '-at_install')
+class TestContractBenchmark(ContractBenchmarkCase):
+    """Scales 1 and 100, part of the standard run"""
+
+    SCALES = (1, 100)
+
+    def test_contract_create(self):
+        self._test_contract_create()
+
+    def test_quotation_conversion(self):
+        self._test_quotation_conversion()
+
+    def test_appendix_create(self):
+        self._test_appendix_create()
+
+    def test_appendix_activate(self):
+        self._test_appendix_activate()
+
+    def test_sale_order_line_import(self):
+        self._test_sale_order_line_import()
+
+    def test_mass_state_transition(self):
+        self._test_mass_state_transition()
+
+
+@tagged('-standard', 'contract_bench', 'post_install', '-at_install')
+class TestContractBenchmarkLarge(TestContractBenchmark):
+    """Scale 10k, run with ``--test-tags contract_bench``"""
+
+    SCALES = (10000,)
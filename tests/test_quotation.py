@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+from odoo import fields
+from odoo.tests.common import TransactionCase
+from odoo.exceptions import UserError
+
+
+class TestQuotation(TransactionCase):
+
+    def setUp(self):
+        super(TestQuotation, self).setUp()
+
+        self.hospital = self.env['res.partner'].create({
+            'name': 'Test Hospital',
+            'is_company': True,
+        })
+        self.product = self.env['product.product'].create({
+            'name': 'Medical Equipment X',
+            'default_code': 'MED-001',
+            'list_price': 10000.0,
+        })
+        self.other_product = self.env['product.product'].create({
+            'name': 'Medical Equipment Y',
+            'default_code': 'MED-002',
+            'list_price': 2500.0,
+        })
+
+    def _create_order(self, title, lines):
+        return self.env['sale.order'].create({
+            'partner_id': self.hospital.id,
+            'quotation_title': title,
+            'quotation_type': 'goods',
+            'order_line': [(0, 0, {
+                'product_id': product.id,
+                'product_uom_qty': qty,
+                'price_unit': price,
+            }) for product, qty, price in lines],
+        })
+
+    def test_create_contract_from_quotation(self):
+        """Test single quotation conversion and reopening"""
+        order = self._create_order('Tender A', [
+            (self.product, 2, 10000.0),
+            (self.other_product, 4, 2500.0),
+        ])
+        order.action_confirm()
+
+        action = order.action_create_contract()
+        contract = order.contract_id
+        self.assertEqual(action['res_id'], contract.id)
+        self.assertEqual(contract.name, 'Tender A')
+        self.assertEqual(contract.sale_order_id, order)
+        self.assertEqual(len(contract.contract_line_ids), 2)
+        self.assertEqual(contract.amount_total, 30000.0)
+
+        # A second call opens the same contract
+        self.assertEqual(order.action_create_contract()['res_id'], contract.id)
+        self.assertEqual(self.env['contract.contract'].search_count([('sale_order_id', '=', order.id)]), 1)
+
+    def test_create_contracts_bulk(self):
+        """Test converting many quotations in one call"""
+        orders = self.env['sale.order']
+        for index in range(3):
+            orders |= self._create_order('Tender %s' % index, [
+                (self.product, index + 1, 10000.0),
+            ])
+        orders.action_confirm()
+
+        action = orders.action_create_contract()
+        contracts = orders.contract_id
+        self.assertEqual(len(contracts), 3)
+        self.assertEqual(action['domain'], [('id', 'in', contracts.ids)])
+        self.assertEqual(len(set(contracts.mapped('contract_number'))), 3)
+        for order in orders:
+            self.assertEqual(order.contract_id.sale_order_id, order)
+            self.assertEqual(
+                order.contract_id.contract_line_ids.sale_order_line_id,
+                order.order_line,
+            )
+
+    def test_create_contract_requires_confirmation(self):
+        """Test draft quotations cannot be converted"""
+        order = self._create_order('Draft Tender', [(self.product, 1, 10000.0)])
+        with self.assertRaises(UserError):
+            order.action_create_contract()
+
+    def test_import_lines_from_linked_orders(self):
+        """Test importing the lines of every linked sale order"""
+        first = self._create_order('Tender A', [
+            (self.product, 2, 10000.0),
+            (self.other_product, 1, 2500.0),
+        ])
+        second = self._create_order('Tender B', [
+            (self.product, 3, 10000.0),
+            (self.product, 1, 9000.0),
+        ])
+        contract = self.env['contract.contract'].create({
+            'name': 'Framework Contract',
+            'partner_company_id': self.hospital.id,
+            'company_signatory_id': self.env.user.id,
+            'service_category': 'supply',
+            'end_date': fields.Date.today(),
+            'sale_order_id': first.id,
+            'sale_order_ids': [(6, 0, second.ids)],
+        })
+
+        contract.with_context(merge_sale_order_lines=True).action_import_sale_order_lines()
+        lines = contract.contract_line_ids
+        self.assertEqual(len(lines), 3)
+        merged = lines.filtered(lambda line: line.product_id == self.product and line.price_unit == 10000.0)
+        self.assertEqual(merged.quantity, 5)
+        self.assertEqual(contract.amount_total, 61500.0)
+
+        self.assertEqual(merged.sale_order_line_ids, (first | second).order_line.filtered(
+            lambda line: line.product_id == self.product and line.price_unit == 10000.0
+        ))
+
+        # Lines already on the contract are not imported again, merged or not
+        contract.with_context(merge_sale_order_lines=True).action_import_sale_order_lines()
+        self.assertEqual(contract.contract_line_ids, lines)
+        contract.action_import_sale_order_lines()
+        self.assertEqual(contract.contract_line_ids, lines)
+
+    def test_import_lines_skips_imported(self):
+        """Test unmerged import skips order lines already linked"""
+        order = self._create_order('Tender A', [
+            (self.product, 2, 10000.0),
+            (self.other_product, 1, 2500.0),
+        ])
+        order.action_confirm()
+        order.action_create_contract()
+        contract = order.contract_id
+
+        contract.action_import_sale_order_lines()
+        self.assertEqual(len(contract.contract_line_ids), 2)
+        self.assertEqual(contract.contract_line_ids.sale_order_line_id, order.order_line)
+
+    def test_import_lines_merges_into_existing(self):
+        """Test merged import adds to a matching contract line"""
+        order = self._create_order('Tender A', [(self.product, 3, 10000.0)])
+        contract = self.env['contract.contract'].create({
+            'name': 'Framework Contract',
+            'partner_company_id': self.hospital.id,
+            'company_signatory_id': self.env.user.id,
+            'service_category': 'supply',
+            'end_date': fields.Date.today(),
+            'sale_order_id': order.id,
+        })
+        line = self.env['contract.line'].create({
+            'contract_id': contract.id,
+            'product_id': self.product.id,
+            'name': self.product.name,
+            'uom_id': self.product.uom_id.id,
+            'quantity': 2,
+            'price_unit': 10000.0,
+        })
+
+        contract.with_context(merge_sale_order_lines=True).action_import_sale_order_lines()
+        self.assertEqual(contract.contract_line_ids, line)
+        self.assertEqual(line.quantity, 5)
+        self.assertEqual(line.sale_order_line_ids, order.order_line)
+
+        # The merged order line counts as imported
+        contract.action_import_sale_order_lines()
+        self.assertEqual(contract.contract_line_ids, line)
+        self.assertEqual(line.quantity, 5)
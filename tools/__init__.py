@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+from .currency import CompanyRates
+from .metrics import instrumented
+from .profiling import profiled
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Batched conversion of record amounts to the company currency.
+
+``res.currency._convert`` reads the rates of both currencies on every call.
+``CompanyRates`` reads them once per (company, date) for every currency of a
+batch and keeps them per (currency, company, date), so recomputing a large
+recordset costs one rate query per distinct date instead of one per record.
+"""
+from collections import defaultdict
+
+from odoo import fields
+
+
+class CompanyRates:
+
+    def __init__(self, env):
+        self.env = env
+        self._rates = {}
+
+    def prefetch(self, keys):
+        """Fetch the rates of the (currency, company, date) ``keys``"""
+        missing = defaultdict(set)
+        for currency, company, date in keys:
+            if currency and company and currency != company.currency_id:
+                date = date or fields.Date.context_today(company)
+                if (currency.id, company.id, date) not in self._rates:
+                    missing[company, date].add(currency.id)
+        for (company, date), currency_ids in missing.items():
+            currencies = self.env['res.currency'].browse(currency_ids) | company.currency_id
+            rates = currencies._get_rates(company, date)
+            company_rate = rates[company.currency_id.id]
+            for currency_id in currency_ids:
+                self._rates[currency_id, company.id, date] = company_rate / rates[currency_id]
+
+    def convert(self, amount, currency, company, date):
+        """``amount`` in ``currency`` converted to the currency of ``company``
+        at ``date`` (today if empty), rounded
+        """
+        if not currency or not company or currency == company.currency_id:
+            return amount
+        date = date or fields.Date.context_today(company)
+        key = (currency.id, company.id, date)
+        if key not in self._rates:
+            self.prefetch([(currency, company, date)])
+        return company.currency_id.round(amount * self._rates[key])
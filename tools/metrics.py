@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Counters and latency histograms of the contract hot paths.
+
+Methods decorated with ``instrumented`` count their calls, errors and
+records and observe their duration in a histogram, per ``model.method``.
+The overhead is a clock read and a short locked update, so it stays on in
+production; ``contract_metrics = False`` in odoo.conf turns it off.
+
+Metrics live in the memory of each server process. When
+``contract_metrics_dir`` is set in odoo.conf, every process dumps its
+metrics there as JSON at most every ``DUMP_INTERVAL`` seconds and writes
+the merged Prometheus text to ``contract_mgmt.prom`` for the node_exporter
+textfile collector. ``/contract_mgmt/metrics`` serves the same merged text.
+"""
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+from odoo.models import BaseModel
+from odoo.tools import config, str2bool
+
+_logger = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DUMP_INTERVAL = 10
+PREFIX = 'contract_mgmt'
+
+
+class Metrics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+        self._last_dump = time.monotonic()
+
+    def observe(self, name, seconds, records=1, error=False):
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None:
+                entry = self._data[name] = {
+                    'calls': 0, 'errors': 0, 'records': 0, 'sum': 0.0,
+                    'buckets': [0] * (len(BUCKETS) + 1),
+                }
+            entry['calls'] += 1
+            entry['errors'] += error
+            entry['records'] += records
+            entry['sum'] += seconds
+            entry['buckets'][bisect.bisect_left(BUCKETS, seconds)] += 1
+            dump = time.monotonic() - self._last_dump > DUMP_INTERVAL
+            if dump:
+                self._last_dump = time.monotonic()
+        if dump and config.get('contract_metrics_dir'):
+            self.dump(config['contract_metrics_dir'])
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self._data))
+
+    def dump(self, directory):
+        """Write the metrics of this process, then the merged textfile"""
+        try:
+            os.makedirs(directory, exist_ok=True)
+            _write_atomic(
+                os.path.join(directory, f'{PREFIX}-{os.getpid()}.json'),
+                json.dumps(self.snapshot()),
+            )
+            _write_atomic(os.path.join(directory, f'{PREFIX}.prom'), render(collect(directory)))
+        except OSError:
+            _logger.warning("Cannot write contract metrics to %s", directory, exc_info=True)
+
+    def reset(self):
+        with self._lock:
+            self._data.clear()
+
+
+METRICS = Metrics()
+
+
+def _write_atomic(path, content):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def collect(directory=None):
+    """Snapshots of every process: this one live, the others from their dump"""
+    snapshots = [METRICS.snapshot()]
+    if directory and os.path.isdir(directory):
+        own = f'{PREFIX}-{os.getpid()}.json'
+        for name in sorted(os.listdir(directory)):
+            if name.startswith(f'{PREFIX}-') and name.endswith('.json') and name != own:
+                try:
+                    with open(os.path.join(directory, name), encoding='utf-8') as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+    return snapshots
+
+
+def _merge(snapshots):
+    merged = {}
+    for snapshot in snapshots:
+        for name, entry in snapshot.items():
+            total = merged.setdefault(name, {
+                'calls': 0, 'errors': 0, 'records': 0, 'sum': 0.0,
+                'buckets': [0] * (len(BUCKETS) + 1),
+            })
+            for key in ('calls', 'errors', 'records', 'sum'):
+                total[key] += entry[key]
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], entry['buckets'])]
+    return merged
+
+
+def render(snapshots):
+    """Prometheus text exposition format of the merged snapshots"""
+    merged = _merge(snapshots)
+    lines = []
+    for metric, key, help_text in (
+        ('calls_total', 'calls', "Calls of instrumented contract methods"),
+        ('errors_total', 'errors', "Calls that raised an exception"),
+        ('records_total', 'records', "Records processed by the calls"),
+    ):
+        lines.append(f'# HELP {PREFIX}_{metric} {help_text}')
+        lines.append(f'# TYPE {PREFIX}_{metric} counter')
+        lines.extend(
+            f'{PREFIX}_{metric}{{method="{name}"}} {entry[key]}'
+            for name, entry in sorted(merged.items())
+        )
+    lines.append(f'# HELP {PREFIX}_duration_seconds Duration of instrumented contract methods')
+    lines.append(f'# TYPE {PREFIX}_duration_seconds histogram')
+    for name, entry in sorted(merged.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), entry['buckets']):
+            cumulative += count
+            lines.append(f'{PREFIX}_duration_seconds_bucket{{method="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'{PREFIX}_duration_seconds_sum{{method="{name}"}} {entry["sum"]:.6f}')
+        lines.append(f'{PREFIX}_duration_seconds_count{{method="{name}"}} {entry["calls"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_enabled():
+    return str2bool(str(config.get('contract_metrics', True)), True)
+
+
+def instrumented(method):
+    """Count and time the calls of ``method`` as ``<model>.<method>``"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not metrics_enabled():
+            return method(self, *args, **kwargs)
+        started, error, result = time.perf_counter(), True, None
+        try:
+            result = method(self, *args, **kwargs)
+            error = False
+            return result
+        finally:
+            records = len(result) if isinstance(result, BaseModel) and result._name == self._name else len(self)
+            METRICS.observe(
+                f'{self._name}.{method.__name__}',
+                time.perf_counter() - started,
+                records=records,
+                error=error,
+            )
+    return wrapper
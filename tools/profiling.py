@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Opt-in profiling of compute methods.
+
+Methods decorated with ``profiled`` record their call count, record count,
+SQL query count and elapsed time when profiling is enabled by one of:
+
+- the ``contract_profile`` context key
+- ``contract_profile = True`` in the Odoo configuration file
+- the ``contract_mgmt.profile`` system parameter
+
+Measures are inclusive (nested computes count in their caller too). They are
+accumulated per transaction and, once it is committed, stored as
+``contract.compute.profile`` rows and logged as one JSON line on the
+``odoo.addons.contract_mgmt.profile`` logger.
+"""
+import functools
+import threading
+import time
+
+from odoo import SUPERUSER_ID, api
+from odoo.modules.registry import Registry
+from odoo.tools import config, str2bool
+
+STATS_KEY = 'contract_mgmt.profile'
+
+
+def profiling_enabled(env):
+    if env.context.get('contract_profile'):
+        return True
+    if str2bool(config.get('contract_profile') or '0', False):
+        return True
+    return str2bool(env['ir.config_parameter'].sudo().get_param(STATS_KEY) or '0', False)
+
+
+def _origin():
+    thread = threading.current_thread()
+    return getattr(thread, 'url', None) or thread.name
+
+
+def _flush(dbname, origin, stats):
+    with Registry(dbname).cursor() as cr:
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        env['contract.compute.profile']._record(origin, stats)
+
+
+def _transaction_stats(cr):
+    """Stats of the current transaction, flushed after its commit"""
+    stats = cr.precommit.data.get(STATS_KEY)
+    if stats is None:
+        stats = cr.precommit.data[STATS_KEY] = {}
+        cr.postcommit.add(functools.partial(_flush, cr.dbname, _origin(), stats))
+    return stats
+
+
+def profiled(method):
+    """Record the cost of ``method`` when profiling is enabled"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not profiling_enabled(self.env):
+            return method(self, *args, **kwargs)
+        cr = self.env.cr
+        queries, started = cr.sql_log_count, time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            entry = _transaction_stats(cr).setdefault(
+                (self._name, method.__name__), [0, 0, 0, 0.0],
+            )
+            entry[0] += 1
+            entry[1] += len(self)
+            entry[2] += cr.sql_log_count - queries
+            entry[3] += (time.perf_counter() - started) * 1000
+    return wrapper
@@ -1,164 +1,451 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-Validation script for contract_mgmt module
-This script validates that all related fields reference existing fields
+Static analyzer for contract_mgmt and sibling addons
+
+Parses the model files with ``ast`` and builds the field graph of every model
+(fields, comodels, ``related``, ``compute`` and ``@api.depends``), then checks:
+
+- ``related`` and ``@api.depends`` paths resolve to existing fields
+- compute methods exist and stored computes declare their dependencies
+- compute fan-out: dependencies the compute method never reads, which
+  recompute the field for nothing on every change. Flag computes, which only
+  assign constants (e.g. a "needs rebuild" marker), are not reported: their
+  dependencies are the changes they track.
+
+Usage::
+
+    python validate_module.py [ADDON_OR_ADDONS_DIR ...] [--jobs N] [--no-cache]
+
+Per-file results are cached by content hash in ``.validate_module_cache.json``
+and new files are parsed in parallel, so the script can run as a pre-commit
+hook over a whole addons directory. Exit code is 1 when errors are found.
 """
 
+import argparse
 import ast
+import hashlib
+import json
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
-# Fields available on res.partner in Odoo 18
-VALID_PARTNER_FIELDS = {
-    'name', 'phone', 'mobile', 'email', 'function', 'comment', 'website',
-    'vat', 'ref', 'street', 'street2', 'city', 'zip', 'state_id', 'country_id',
-    'parent_id', 'child_ids', 'is_company', 'company_type', 'title', 'lang',
-    'category_id', 'user_id', 'company_id', 'color', 'active', 'employee',
-    'type', 'barcode', 'company_name', 'industry_id', 'bank_ids',
-    'partner_latitude', 'partner_longitude', 'email_formatted', 'partner_share',
-    'commercial_partner_id', 'commercial_company_name', 'parent_name',
-    'company_registry', 'vat_label', 'same_vat_partner_id',
-}
+ANALYZER_VERSION = 3
+CACHE_FILE = '.validate_module_cache.json'
+SKIP_DIRS = {'tests', 'migrations', 'static', '__pycache__'}
+RELATIONAL = {'Many2one', 'One2many', 'Many2many'}
 
-# Fields available on product.product
-VALID_PRODUCT_FIELDS = {
-    'name', 'default_code', 'list_price', 'standard_price', 'type',
-    'categ_id', 'uom_id', 'uom_po_id', 'description', 'description_sale',
-    'description_purchase', 'active', 'barcode', 'weight', 'volume',
+# Fields every model has
+MAGIC_FIELDS = {
+    'id', 'display_name', 'create_uid', 'create_date', 'write_uid', 'write_date',
 }
 
-# Fields available on sale.order
-VALID_SALE_ORDER_FIELDS = {
-    'name', 'partner_id', 'date_order', 'validity_date', 'state',
-    'amount_total', 'amount_untaxed', 'amount_tax', 'order_line',
-    'user_id', 'team_id', 'company_id', 'currency_id', 'pricelist_id',
+# Known fields of the models this module uses from other addons in Odoo 18:
+# {model: {field: comodel or None}}. They are not exhaustive, so a missing
+# field on them is only reported as a warning.
+KNOWN_MODELS = {
+    'res.partner': {
+        'name': None, 'phone': None, 'mobile': None, 'email': None, 'function': None,
+        'comment': None, 'website': None, 'vat': None, 'ref': None, 'street': None,
+        'street2': None, 'city': None, 'zip': None, 'state_id': 'res.country.state',
+        'country_id': 'res.country', 'parent_id': 'res.partner', 'child_ids': 'res.partner',
+        'is_company': None, 'company_type': None, 'title': 'res.partner.title', 'lang': None,
+        'category_id': 'res.partner.category', 'user_id': 'res.users',
+        'company_id': 'res.company', 'color': None, 'active': None, 'employee': None,
+        'type': None, 'barcode': None, 'company_name': None,
+        'industry_id': 'res.partner.industry', 'bank_ids': 'res.partner.bank',
+        'partner_latitude': None, 'partner_longitude': None, 'email_formatted': None,
+        'partner_share': None, 'commercial_partner_id': 'res.partner',
+        'commercial_company_name': None, 'parent_name': None, 'company_registry': None,
+        'vat_label': None, 'same_vat_partner_id': 'res.partner',
+    },
+    'product.product': {
+        'name': None, 'default_code': None, 'list_price': None, 'standard_price': None,
+        'type': None, 'categ_id': 'product.category', 'uom_id': 'uom.uom',
+        'uom_po_id': 'uom.uom', 'description': None, 'description_sale': None,
+        'description_purchase': None, 'active': None, 'barcode': None, 'weight': None,
+        'volume': None, 'product_tmpl_id': 'product.template',
+    },
+    'sale.order': {
+        'name': None, 'partner_id': 'res.partner', 'date_order': None,
+        'validity_date': None, 'state': None, 'amount_total': None,
+        'amount_untaxed': None, 'amount_tax': None, 'order_line': 'sale.order.line',
+        'user_id': 'res.users', 'team_id': 'crm.team', 'company_id': 'res.company',
+        'currency_id': 'res.currency', 'pricelist_id': 'product.pricelist',
+        'opportunity_id': 'crm.lead',
+    },
+    'sale.order.line': {
+        'order_id': 'sale.order', 'product_id': 'product.product', 'name': None,
+        'product_uom_qty': None, 'product_uom': 'uom.uom', 'price_unit': None,
+        'price_subtotal': None, 'price_total': None, 'tax_id': 'account.tax',
+        'discount': None, 'display_type': None, 'sequence': None,
+    },
+    'mail.thread': {
+        'message_ids': 'mail.message', 'message_follower_ids': 'mail.followers',
+        'message_partner_ids': 'res.partner', 'message_is_follower': None,
+        'message_needaction': None, 'message_has_error': None,
+        'message_attachment_count': None, 'has_message': None,
+    },
+    'mail.activity.mixin': {
+        'activity_ids': 'mail.activity', 'activity_state': None,
+        'activity_user_id': 'res.users', 'activity_type_id': 'mail.activity.type',
+        'activity_date_deadline': None, 'activity_summary': None,
+    },
 }
 
-# Fields available on sale.order.line
-VALID_SALE_ORDER_LINE_FIELDS = {
-    'order_id', 'product_id', 'name', 'product_uom_qty', 'product_uom',
-    'price_unit', 'price_subtotal', 'price_total', 'tax_id', 'discount',
-}
 
-# Fields available on contract.contract (our model)
-VALID_CONTRACT_FIELDS = {
-    'contract_number', 'name', 'currency_id', 'amount_total', 'state',
-    'partner_company_id', 'partner_department_id', 'contract_date',
-    'start_date', 'end_date', 'appendix_count',
-}
+# ---------------------------------------------------------------------------
+# Per-file extraction (runs in worker processes, results are cached as JSON)
+# ---------------------------------------------------------------------------
 
-# Fields available on contract.appendix (our model)
-VALID_APPENDIX_FIELDS = {
-    'appendix_number', 'name', 'currency_id', 'amount_appendix', 'state',
-    'contract_id', 'effective_date', 'end_date',
-}
+def _literal(node):
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError):
+        return None
 
 
-def check_related_field(field_name, related_path, model_name):
-    """Check if a related field path is valid"""
-    parts = related_path.split('.')
-    
-    if len(parts) < 2:
-        print(f"⚠️  Warning: Related field '{field_name}' in {model_name} has invalid path: {related_path}")
-        return False
-    
-    field_ref = parts[0]
-    target_field = parts[-1]
-    
-    # Determine which field set to check based on the reference field
-    if 'partner' in field_ref or field_ref in ['investor_id', 'contact_person_id']:
-        valid_fields = VALID_PARTNER_FIELDS
-        target_model = 'res.partner'
-    elif 'product' in field_ref:
-        valid_fields = VALID_PRODUCT_FIELDS
-        target_model = 'product.product'
-    elif 'sale_order_line' in field_ref:
-        valid_fields = VALID_SALE_ORDER_LINE_FIELDS
-        target_model = 'sale.order.line'
-    elif 'sale_order' in field_ref or field_ref == 'order_id':
-        valid_fields = VALID_SALE_ORDER_FIELDS
-        target_model = 'sale.order'
-    elif 'contract' in field_ref:
-        valid_fields = VALID_CONTRACT_FIELDS
-        target_model = 'contract.contract'
-    elif 'appendix' in field_ref:
-        valid_fields = VALID_APPENDIX_FIELDS
-        target_model = 'contract.appendix'
-    else:
-        print(f"⚠️  Warning: Unknown reference field '{field_ref}' in {model_name}.{field_name}")
-        return True  # Skip validation for unknown models
-    
-    if target_field not in valid_fields:
-        print(f"❌ ERROR: Related field '{field_name}' in {model_name} references non-existent field '{target_field}' on {target_model}")
-        print(f"   Path: {related_path}")
-        return False
-    
-    print(f"✅ OK: {model_name}.{field_name} -> {related_path}")
-    return True
-
-
-def validate_python_file(filepath, model_name):
-    """Validate related fields in a Python model file"""
-    print(f"\n📄 Validating {filepath}...")
-    
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Simple regex-based check for related fields
-    import re
-    pattern = r"(\w+)\s*=\s*fields\.\w+\([^)]*related\s*=\s*['\"]([^'\"]+)['\"]"
-    matches = re.findall(pattern, content)
-    
-    if not matches:
-        print(f"   No related fields found")
-        return True
-    
-    all_valid = True
-    for field_name, related_path in matches:
-        if not check_related_field(field_name, related_path, model_name):
-            all_valid = False
-    
-    return all_valid
-
-
-def main():
-    """Main validation function"""
-    print("=" * 70)
-    print("CONTRACT MANAGEMENT MODULE - RELATED FIELDS VALIDATION")
-    print("=" * 70)
-    
-    base_path = os.path.dirname(os.path.abspath(__file__))
-    models_path = os.path.join(base_path, 'models')
-    
-    files_to_check = [
-        ('contract.py', 'contract.contract'),
-        ('contract_line.py', 'contract.line'),
-        ('contract_appendix.py', 'contract.appendix'),
-        ('contract_appendix_line.py', 'contract.appendix.line'),
-        ('quotation.py', 'sale.order'),
-    ]
-    
-    all_valid = True
-    for filename, model_name in files_to_check:
-        filepath = os.path.join(models_path, filename)
-        if os.path.exists(filepath):
-            if not validate_python_file(filepath, model_name):
-                all_valid = False
+def _parse_field(call):
+    """Field definition from a ``fields.X(...)`` call"""
+    ftype = call.func.attr
+    kwargs = {kw.arg: kw.value for kw in call.keywords if kw.arg}
+    field = {'type': ftype, 'lineno': call.lineno}
+    if ftype in RELATIONAL:
+        comodel = kwargs.get('comodel_name') or (call.args[0] if call.args else None)
+        field['comodel'] = _literal(comodel) if comodel is not None else None
+    for key in ('related', 'compute', 'store'):
+        if key in kwargs:
+            value = _literal(kwargs[key])
+            # compute=lambda/method reference: keep the method name if any
+            if value is None and key == 'compute' and isinstance(kwargs[key], ast.Name):
+                value = kwargs[key].id
+            field[key] = value
+    return field
+
+
+def _parse_method(func):
+    depends = None
+    for decorator in func.decorator_list:
+        if (isinstance(decorator, ast.Call) and isinstance(decorator.func, ast.Attribute)
+                and decorator.func.attr == 'depends'):
+            depends = [
+                arg for arg in (_literal(node) for node in decorator.args)
+                if isinstance(arg, str)
+            ]
+    reads = set()
+    for node in (node for stmt in func.body for node in ast.walk(stmt)):
+        if isinstance(node, ast.Attribute):
+            reads.add(node.attr)
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+            reads.add(node.value)
+            reads.update(node.value.split('.'))
+    return {'lineno': func.lineno, 'depends': depends, 'reads': sorted(reads), 'flag': _is_flag(func)}
+
+
+def _is_flag(func):
+    """Whether the method only assigns constants, besides its docstring"""
+    body = func.body
+    if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant):
+        body = body[1:]
+    return bool(body) and all(
+        isinstance(stmt, ast.Assign) and isinstance(stmt.value, ast.Constant)
+        for stmt in body
+    )
+
+
+def extract_file(path):
+    """Models, fields and methods defined in one Python file"""
+    with open(path, 'rb') as f:
+        source = f.read()
+    try:
+        tree = ast.parse(source, path)
+    except SyntaxError as e:
+        return {'error': f"{e.msg} (line {e.lineno})", 'models': []}
+
+    models = []
+    for cls in tree.body:
+        if not isinstance(cls, ast.ClassDef):
+            continue
+        info = {'class': cls.name, 'lineno': cls.lineno, 'name': None, 'inherit': [],
+                'fields': {}, 'methods': {}}
+        for stmt in cls.body:
+            if isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 \
+                    and isinstance(stmt.targets[0], ast.Name):
+                target, value = stmt.targets[0].id, stmt.value
+                if target == '_name':
+                    info['name'] = _literal(value)
+                elif target == '_inherit':
+                    inherit = _literal(value)
+                    info['inherit'] = [inherit] if isinstance(inherit, str) else list(inherit or [])
+                elif (isinstance(value, ast.Call) and isinstance(value.func, ast.Attribute)
+                        and isinstance(value.func.value, ast.Name)
+                        and value.func.value.id == 'fields'):
+                    info['fields'][target] = _parse_field(value)
+            elif isinstance(stmt, ast.FunctionDef):
+                info['methods'][stmt.name] = _parse_method(stmt)
+        if info['name'] or info['inherit']:
+            models.append(info)
+    return {'error': None, 'models': models}
+
+
+# ---------------------------------------------------------------------------
+# Model graph
+# ---------------------------------------------------------------------------
+
+class Model:
+    def __init__(self, name):
+        self.name = name
+        self.defined = False   # _name declared in the analyzed addons
+        self.parents = []
+        self.fields = {}       # name -> (field dict, path)
+        self.methods = {}      # name -> (method dict, path)
+
+    def closed(self, registry):
+        """Whether every field of the model is known"""
+        if not self.defined:
+            return False
+        return all(
+            parent in KNOWN_MODELS or (parent in registry and registry[parent].closed(registry))
+            for parent in self.parents
+        )
+
+    def get_field(self, fname, registry, seen=()):
+        if fname in self.fields:
+            return self.fields[fname][0]
+        if fname in KNOWN_MODELS.get(self.name, {}):
+            return {'type': 'Many2one' if KNOWN_MODELS[self.name][fname] else 'Char',
+                    'comodel': KNOWN_MODELS[self.name][fname]}
+        for parent in self.parents:
+            if parent in seen:
+                continue
+            if parent in registry:
+                field = registry[parent].get_field(fname, registry, seen + (self.name,))
+            else:
+                comodel = KNOWN_MODELS.get(parent, {}).get(fname, False)
+                field = None if comodel is False else {
+                    'type': 'Many2one' if comodel else 'Char', 'comodel': comodel,
+                }
+            if field:
+                return field
+        return None
+
+    def get_method(self, mname, registry, seen=()):
+        if mname in self.methods:
+            return self.methods[mname][0]
+        for parent in self.parents:
+            if parent in registry and parent not in seen:
+                method = registry[parent].get_method(mname, registry, seen + (self.name,))
+                if method:
+                    return method
+        return None
+
+
+def build_registry(file_results):
+    registry = {}
+    for path, result in file_results:
+        for info in result['models']:
+            name = info['name'] or info['inherit'][0]
+            model = registry.setdefault(name, Model(name))
+            if info['name']:
+                model.defined = True
+            model.parents.extend(p for p in info['inherit'] if p != name and p not in model.parents)
+            for fname, field in info['fields'].items():
+                model.fields[fname] = (field, path)
+            for mname, method in info['methods'].items():
+                model.methods[mname] = (method, path)
+    for name, fields in KNOWN_MODELS.items():
+        if name not in registry:
+            registry[name] = Model(name)
+    return registry
+
+
+# ---------------------------------------------------------------------------
+# Checks
+# ---------------------------------------------------------------------------
+
+class Report:
+    def __init__(self):
+        self.issues = []
+
+    def add(self, level, path, lineno, message):
+        self.issues.append((level, path, lineno, message))
+
+    @property
+    def errors(self):
+        return [issue for issue in self.issues if issue[0] == 'error']
+
+
+def resolve_path(registry, model, dotted):
+    """Walk ``dotted`` from ``model``.
+
+    :return: (level, message) of the first problem, or None
+    """
+    current = model
+    parts = dotted.split('.')
+    for index, part in enumerate(parts):
+        if current is None:
+            return None
+        field = current.get_field(part, registry) or (
+            {'type': 'Integer'} if part in MAGIC_FIELDS else None
+        )
+        if field is None:
+            level = 'error' if current.closed(registry) else 'warning'
+            return level, f"'{part}' is not a field of {current.name}"
+        if index < len(parts) - 1:
+            if field.get('type') not in RELATIONAL:
+                return 'error', f"'{part}' of {current.name} is not relational"
+            comodel = field.get('comodel')
+            current = registry.get(comodel) if comodel else None
+    return None
+
+
+def check_model(registry, model, report):
+    for fname, (field, path) in sorted(model.fields.items()):
+        lineno = field['lineno']
+        related = field.get('related')
+        if related:
+            problem = resolve_path(registry, model, related)
+            if problem:
+                report.add(problem[0], path, lineno,
+                           f"{model.name}.{fname}: related '{related}': {problem[1]}")
+
+        compute = field.get('compute')
+        if not compute:
+            continue
+        method = model.get_method(compute, registry)
+        if method is None:
+            if model.closed(registry):
+                report.add('error', path, lineno,
+                           f"{model.name}.{fname}: compute method {compute} not found")
+            continue
+        depends = method['depends']
+        if depends is None:
+            if field.get('store'):
+                report.add('error', path, lineno,
+                           f"{model.name}.{fname}: stored compute {compute} has no @api.depends "
+                           f"and is never recomputed")
+            continue
+        reads = set(method['reads'])
+        unread = []
+        for dep in depends:
+            problem = resolve_path(registry, model, dep)
+            if problem:
+                report.add(problem[0], path, method['lineno'],
+                           f"{model.name}.{compute}: depends '{dep}': {problem[1]}")
+                continue
+            root = model.get_field(dep.split('.')[0], registry) or {}
+            if not (set(dep.split('.')) & reads or root.get('comodel') in reads):
+                unread.append(dep)
+        if unread and not method.get('flag'):
+            report.add('warning', path, method['lineno'],
+                       f"{model.name}.{compute}: depends on {', '.join(unread)} without reading "
+                       f"it; every change recomputes {fname} (fan-out)")
+
+
+def analyze(file_results):
+    report = Report()
+    for path, result in file_results:
+        if result['error']:
+            report.add('error', path, 0, f"syntax error: {result['error']}")
+    registry = build_registry(file_results)
+    for name in sorted(registry):
+        check_model(registry, registry[name], report)
+    return report
+
+
+# ---------------------------------------------------------------------------
+# Files, cache and parallel parsing
+# ---------------------------------------------------------------------------
+
+def find_addons(paths):
+    addons = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isfile(os.path.join(path, '__manifest__.py')):
+            addons.append(path)
+            continue
+        for entry in sorted(os.listdir(path)):
+            if os.path.isfile(os.path.join(path, entry, '__manifest__.py')):
+                addons.append(os.path.join(path, entry))
+    return addons
+
+
+def find_python_files(addon):
+    files = []
+    for root, dirs, names in os.walk(addon):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS and not d.startswith('.'))
+        files.extend(os.path.join(root, name) for name in sorted(names) if name.endswith('.py'))
+    return files
+
+
+def _file_key(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def load_cache(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache.get('files', {}) if cache.get('version') == ANALYZER_VERSION else {}
+
+
+def save_cache(path, entries):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'version': ANALYZER_VERSION, 'files': entries}, f)
+
+
+def extract_all(files, cache, jobs):
+    """Extraction results of ``files``, parsing only the changed ones"""
+    keys = {path: _file_key(path) for path in files}
+    results, todo = {}, []
+    for path in files:
+        entry = cache.get(path)
+        if entry and entry['key'] == keys[path]:
+            results[path] = entry['result']
         else:
-            print(f"⚠️  Warning: File not found: {filepath}")
-    
-    print("\n" + "=" * 70)
-    if all_valid:
-        print("✅ VALIDATION PASSED: All related fields are valid!")
-        print("=" * 70)
-        return 0
+            todo.append(path)
+    if len(todo) > 4 and jobs != 1:
+        with ProcessPoolExecutor(max_workers=jobs or None) as executor:
+            parsed = dict(zip(todo, executor.map(extract_file, todo, chunksize=8)))
     else:
-        print("❌ VALIDATION FAILED: Some related fields reference non-existent fields")
-        print("=" * 70)
-        return 1
+        parsed = {path: extract_file(path) for path in todo}
+    results.update(parsed)
+    entries = {path: {'key': keys[path], 'result': results[path]} for path in files}
+    return [(path, results[path]) for path in files], entries, len(todo)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Static checks of Odoo model fields")
+    parser.add_argument('paths', nargs='*', help="addon or addons directories")
+    parser.add_argument('--jobs', '-j', type=int, default=0, help="parser processes (default: CPU count)")
+    parser.add_argument('--no-cache', action='store_true', help="ignore and do not write the cache")
+    parser.add_argument('--cache-file', default=CACHE_FILE)
+    parser.add_argument('--quiet', '-q', action='store_true', help="only print errors")
+    args = parser.parse_args(argv)
+
+    addons = find_addons(args.paths or [os.path.dirname(os.path.abspath(__file__))])
+    files = [path for addon in addons for path in find_python_files(addon)]
+    cache = {} if args.no_cache else load_cache(args.cache_file)
+    file_results, entries, parsed = extract_all(files, cache, args.jobs)
+    if not args.no_cache:
+        save_cache(args.cache_file, entries)
+
+    report = analyze(file_results)
+    cwd = os.getcwd()
+    for level, path, lineno, message in sorted(report.issues, key=lambda i: (i[1], i[2])):
+        if args.quiet and level != 'error':
+            continue
+        print(f"{os.path.relpath(path, cwd)}:{lineno}: {level}: {message}")
+
+    errors = len(report.errors)
+    if not args.quiet:
+        print(f"{len(addons)} addon(s), {len(files)} file(s) ({parsed} parsed): "
+              f"{errors} error(s), {len(report.issues) - errors} warning(s)")
+    return 1 if errors else 0
 
 
 if __name__ == '__main__':
     sys.exit(main())
-